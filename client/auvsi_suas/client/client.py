@@ -6,12 +6,15 @@ Users should use the AsyncClient to manage the interface, as it has performance
 features. A simpler Client is also given as a base implementation.
 """
 
-import json
 import requests
 from auvsi_suas.client.exceptions import InteropError
 from auvsi_suas.proto import interop_api_pb2
 from concurrent.futures import ThreadPoolExecutor
 from google.protobuf import json_format
+from google.protobuf.internal import decoder
+
+# Content type of the binary protobuf wire format.
+PROTOBUF_CONTENT_TYPE = 'application/x-protobuf'
 
 
 class Client(object):
@@ -30,7 +33,8 @@ class Client(object):
                  password,
                  timeout=10,
                  max_concurrent=128,
-                 max_retries=10):
+                 max_retries=10,
+                 binary=False):
         """Create a new Client and login.
 
         Args:
@@ -41,11 +45,16 @@ class Client(object):
             timeout: Individual session request timeout (seconds).
             max_concurrent: Maximum number of concurrent requests.
             max_retries: Maximum attempts to establish a connection.
+            binary: Whether to use the binary protobuf format rather than
+                JSON for requests and responses.
         """
         self.url = url
         self.username = username
         self.timeout = timeout
         self.max_concurrent = 128
+        self.binary = binary
+        # Responses with an ETag by URI, reused if unchanged on the server.
+        self.etag_cache = {}
 
         self.session = requests.Session()
         self.session.mount(
@@ -59,6 +68,68 @@ class Client(object):
         creds.password = password
         self.post('/api/login', data=json_format.MessageToJson(creds))
 
+        if self.binary:
+            self.session.headers['Accept'] = PROTOBUF_CONTENT_TYPE
+
+    def serialize(self, proto):
+        """Builds the arguments to send the proto in a request body.
+
+        Args:
+            proto: The proto to send.
+        Returns:
+            Dict of arguments to the requests.Session methods.
+        """
+        if self.binary:
+            return {
+                'data': proto.SerializeToString(),
+                'headers': {
+                    'Content-Type': PROTOBUF_CONTENT_TYPE
+                },
+            }
+        return {'data': json_format.MessageToJson(proto)}
+
+    def parse(self, r, proto):
+        """Parses the response body into the proto.
+
+        Args:
+            r: The response.
+            proto: The proto to parse into.
+        Returns:
+            The parsed proto.
+        """
+        if self.binary:
+            proto.ParseFromString(r.content)
+        else:
+            json_format.Parse(r.text, proto)
+        return proto
+
+    def parse_list(self, r, proto_type):
+        """Parses the response body into a list of protos.
+
+        Args:
+            r: The response.
+            proto_type: The proto class of the list elements.
+        Returns:
+            List of parsed protos.
+        """
+        protos = []
+        if self.binary:
+            # Protos are each prefixed by their varint encoded length.
+            data = r.content
+            pos = 0
+            while pos < len(data):
+                size, pos = decoder._DecodeVarint(data, pos)
+                proto = proto_type()
+                proto.ParseFromString(data[pos:pos + size])
+                protos.append(proto)
+                pos += size
+        else:
+            for proto_dict in r.json():
+                proto = proto_type()
+                json_format.ParseDict(proto_dict, proto)
+                protos.append(proto)
+        return protos
+
     def get(self, uri, **kwargs):
         """GET request to server.
 
@@ -74,6 +145,29 @@ class Client(object):
             raise InteropError(r)
         return r
 
+    def get_cached(self, uri):
+        """GET request to server, reusing the last response if unchanged.
+
+        The server validates the ETag of the last response, and only sends a
+        new response if it has changed.
+
+        Args:
+            uri: Server URI to access (without base URL).
+        Raises:
+            InteropError: Error from server.
+            requests.Timeout: Request timeout.
+        """
+        cached = self.etag_cache.get(uri)
+        headers = {}
+        if cached is not None:
+            headers['If-None-Match'] = cached.headers['ETag']
+        r = self.get(uri, headers=headers)
+        if r.status_code == 304 and cached is not None:
+            return cached
+        if 'ETag' in r.headers:
+            self.etag_cache[uri] = r
+        return r
+
     def post(self, uri, **kwargs):
         """POST request to server.
 
@@ -128,13 +222,8 @@ class Client(object):
             requests.Timeout: Request timeout.
             ValueError or AttributeError: Malformed response from server.
         """
-        r = self.get('/api/teams')
-        teams = []
-        for team_dict in r.json():
-            team_proto = interop_api_pb2.TeamStatus()
-            json_format.Parse(json.dumps(team_dict), team_proto)
-            teams.append(team_proto)
-        return teams
+        r = self.get_cached('/api/teams')
+        return self.parse_list(r, interop_api_pb2.TeamStatus)
 
     def get_mission(self, mission_id):
         """GET a mission by ID.
@@ -146,10 +235,8 @@ class Client(object):
             requests.Timeout: Request timeout.
             ValueError or AttributeError: Malformed response from server.
         """
-        r = self.get('/api/missions/%d' % mission_id)
-        mission = interop_api_pb2.Mission()
-        json_format.Parse(r.text, mission)
-        return mission
+        r = self.get_cached('/api/missions/%d' % mission_id)
+        return self.parse(r, interop_api_pb2.Mission())
 
     def post_telemetry(self, telem):
         """POST new telemetry.
@@ -160,7 +247,22 @@ class Client(object):
             InteropError: Error from server.
             requests.Timeout: Request timeout.
         """
-        self.post('/api/telemetry', data=json_format.MessageToJson(telem))
+        self.post('/api/telemetry', **self.serialize(telem))
+
+    def post_telemetry_batch(self, batch):
+        """POST a batch of telemetry.
+
+        Args:
+            batch: TelemetryBatch object containing telemetry states.
+        Returns:
+            TelemetryBatchResult with the acceptance of each telemetry.
+        Raises:
+            InteropError: Error from server.
+            requests.Timeout: Request timeout.
+            ValueError or AttributeError: Malformed response from server.
+        """
+        r = self.post('/api/telemetry/batch', **self.serialize(batch))
+        return self.parse(r, interop_api_pb2.TelemetryBatchResult())
 
     def get_odlcs(self, mission=None):
         """GET odlcs.
@@ -178,12 +280,7 @@ class Client(object):
         if mission:
             url += '?mission=%d' % mission
         r = self.get(url)
-        odlcs = []
-        for odlc_dict in r.json():
-            odlc_proto = interop_api_pb2.Odlc()
-            json_format.Parse(json.dumps(odlc_dict), odlc_proto)
-            odlcs.append(odlc_proto)
-        return odlcs
+        return self.parse_list(r, interop_api_pb2.Odlc)
 
     def get_odlc(self, odlc_id):
         """GET odlc.
@@ -198,9 +295,7 @@ class Client(object):
             ValueError or AttributeError: Malformed response from server.
         """
         r = self.get('/api/odlcs/%d' % odlc_id)
-        odlc = interop_api_pb2.Odlc()
-        json_format.Parse(r.text, odlc)
-        return odlc
+        return self.parse(r, interop_api_pb2.Odlc())
 
     def post_odlc(self, odlc):
         """POST odlc.
@@ -214,10 +309,8 @@ class Client(object):
             requests.Timeout: Request timeout.
             ValueError or AttributeError: Malformed response from server.
         """
-        r = self.post('/api/odlcs', data=json_format.MessageToJson(odlc))
-        odlc = interop_api_pb2.Odlc()
-        json_format.Parse(r.text, odlc)
-        return odlc
+        r = self.post('/api/odlcs', **self.serialize(odlc))
+        return self.parse(r, interop_api_pb2.Odlc())
 
     def put_odlc(self, odlc_id, odlc):
         """PUT odlc.
@@ -232,11 +325,8 @@ class Client(object):
             requests.Timeout: Request timeout.
             ValueError or AttributeError: Malformed response from server.
         """
-        r = self.put('/api/odlcs/%d' % odlc_id,
-                     data=json_format.MessageToJson(odlc))
-        odlc = interop_api_pb2.Odlc()
-        json_format.Parse(r.text, odlc)
-        return odlc
+        r = self.put('/api/odlcs/%d' % odlc_id, **self.serialize(odlc))
+        return self.parse(r, interop_api_pb2.Odlc())
 
     def delete_odlc(self, odlc_id):
         """DELETE odlc.
@@ -355,7 +445,8 @@ class AsyncClient(object):
                  password,
                  timeout=10,
                  max_concurrent=128,
-                 max_retries=10):
+                 max_retries=10,
+                 binary=False):
         """Create a new AsyncClient and login.
 
         Args:
@@ -366,9 +457,11 @@ class AsyncClient(object):
             timeout: Individual session request timeout (seconds)
             max_concurrent: Maximum number of concurrent requests.
             max_retries: Maximum attempts to establish a connection.
+            binary: Whether to use the binary protobuf format rather than
+                JSON for requests and responses.
         """
         self.client = Client(url, username, password, timeout, max_concurrent,
-                             max_retries)
+                             max_retries, binary)
         self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
 
     def get_teams(self):
@@ -400,6 +493,17 @@ class AsyncClient(object):
         """
         return self.executor.submit(self.client.post_telemetry, telem)
 
+    def post_telemetry_batch(self, batch):
+        """POST a batch of telemetry.
+
+        Args:
+            batch: TelemetryBatch object containing telemetry states.
+        Returns:
+            Future object which contains the return value or error from the
+            underlying Client.
+        """
+        return self.executor.submit(self.client.post_telemetry_batch, batch)
+
     def get_odlcs(self, mission=None):
         """GET odlcs.
 
@@ -75,6 +75,16 @@ class TestClient(unittest.TestCase):
         self.assertEqual(1, mission.id)
         self.assertEqual(1, async_mission.id)
 
+    def test_get_mission_unchanged(self):
+        """Test getting an unchanged mission reuses the last response."""
+        mission = self.client.get_mission(1)
+        cached = self.client.etag_cache['/api/missions/1']
+        r = self.client.get('/api/missions/1',
+                            headers={'If-None-Match': cached.headers['ETag']})
+        self.assertEqual(304, r.status_code)
+        self.assertIs(cached, self.client.get_cached('/api/missions/1'))
+        self.assertEqual(mission, self.client.get_mission(1))
+
     def test_post_telemetry(self):
         """Test sending some telemetry."""
         t = interop_api_pb2.Telemetry()
@@ -99,6 +109,22 @@ class TestClient(unittest.TestCase):
         with self.assertRaises(InteropError):
             self.async_client.post_telemetry(t).result()
 
+    def test_post_telemetry_batch(self):
+        """Test sending a batch of telemetry."""
+        batch = interop_api_pb2.TelemetryBatch()
+        for i in range(2):
+            t = batch.telemetry.add()
+            t.latitude = 38
+            t.longitude = -76
+            t.altitude = 100
+            t.heading = 90 + 400 * i  # Second out of range.
+            batch.telemetry_age_sec.append(0.1 - 0.1 * i)
+
+        result = self.client.post_telemetry_batch(batch)
+        async_result = self.async_client.post_telemetry_batch(batch).result()
+        self.assertEqual([True, False], list(result.accepted))
+        self.assertEqual([True, False], list(async_result.accepted))
+
     def test_odlcs(self):
         """Test odlc workflow."""
         # Post a odlc gets an updated odlc.
@@ -196,3 +222,14 @@ class TestClient(unittest.TestCase):
         get_image = self.async_client.get_map_image(1).result()
         self.assertEqual(image_data, get_image)
         self.async_client.delete_map_image(1).result()
+
+
+class TestClientBinary(TestClient):
+    """Test the Client class using the binary protobuf format."""
+    def setUp(self):
+        """Create a logged in Client in binary mode."""
+        self.client = Client(server, username, password, binary=True)
+        self.async_client = AsyncClient(server,
+                                        username,
+                                        password,
+                                        binary=True)
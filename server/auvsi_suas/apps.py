@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class AuvsiSuasConfig(AppConfig):
     name = 'auvsi_suas'
+
+    def ready(self):
+        # Connect the receivers which maintain the team status snapshot, live
+        # evaluations and live alerts.
+        import auvsi_suas.models.live_alerts  # noqa
+        import auvsi_suas.models.live_evaluation  # noqa
+        import auvsi_suas.models.team_status  # noqa
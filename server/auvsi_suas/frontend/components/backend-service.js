@@ -20,11 +20,33 @@ Backend = function($resource) {
      */
     this.missionResource = $resource('/api/missions/:id', {id: '@id'});
 
+    /**
+     * @export @const {!Object} Evaluation jobs interface.
+     */
+    this.evaluationJobsResource = $resource(
+            '/api/missions/:missionId/evaluations/:id');
+
+    /**
+     * @export @const {string} URL of the stream of live alerts of teams.
+     */
+    this.alertsStreamUrl = '/api/stream/alerts';
+
+    /**
+     * @export @const {!Object} Live evaluations interface.
+     */
+    this.liveEvaluationsResource = $resource(
+            '/api/missions/:missionId/live_evaluations');
+
     /**
      * @export @const {!Object} Teams interface.
      */
     this.teamsResource = $resource('/api/teams');
 
+    /**
+     * @export @const {string} URL of the stream of changes to team status.
+     */
+    this.teamsStreamUrl = '/api/stream/teams';
+
     /**
      * @export @const {!Object} Odlc review interface.
      */
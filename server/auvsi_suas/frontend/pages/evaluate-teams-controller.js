@@ -5,14 +5,16 @@
 
 /**
  * Controller for the Evaluate Teams page.
- * @param {!angular.$window} $window The window service.
+ * @param {!angular.$routeParams} $routeParams The route parameter service.
+ * @param {!angular.$interval} $interval The interval service.
+ * @param {!angular.Scope} $scope The scope of the controller to listen for events.
  * @param {!Object} Backend The backend service.
  * @final
  * @constructor
  * @struct
  * @ngInject
  */
-EvaluateTeamsCtrl = function($window, $routeParams, Backend) {
+EvaluateTeamsCtrl = function($routeParams, $interval, $scope, Backend) {
     /**
      * @export {?Array<Object>} The teams for evaluation.
      */
@@ -24,15 +26,31 @@ EvaluateTeamsCtrl = function($window, $routeParams, Backend) {
     this.selectedTeamId = "-1";
 
     /**
-     * @private @const {!angular.$window} The window service.
+     * @export {?Object} The status of the running or finished evaluation.
      */
-    this.window_ = $window;
+    this.job = null;
+
+    /**
+     * @private @const {!angular.$interval} The interval service.
+     */
+    this.interval_ = $interval;
+
+    /**
+     * @private @const {!Object} The backend service.
+     */
+    this.backend_ = Backend;
 
     /**
      * @private @const {integer} The mission ID for evaluation.
      */
     this.missionId_ = $routeParams['missionId'];
 
+    /**
+     * @private {?Object} Interval to poll the status of the evaluation.
+     */
+    this.pollInterval_ = null;
+    $scope.$on("$destroy", angular.bind(this, this.stopPolling_));
+
     // Get the teams to display.
     Backend.teamsResource.query({}).$promise.then(
             angular.bind(this, this.setTeams_));
@@ -40,20 +58,97 @@ EvaluateTeamsCtrl = function($window, $routeParams, Backend) {
 
 
 /**
- * Evaluates the teams and renders the result.
+ * Starts evaluating the teams, and polls for the progress of the evaluation.
  * @export
  */
 EvaluateTeamsCtrl.prototype.evaluate = function() {
     // Determine query from selected team.
+    var params = {missionId: this.missionId_};
     var id = parseInt(this.selectedTeamId, 10);
-    var query = '';
     if (id != -1) {
-        query = '?team=' + id;
+        params['team'] = id;
+    }
+
+    this.stopPolling_();
+    this.backend_.evaluationJobsResource.save(params, {}).$promise.then(
+            angular.bind(this, function(job) {
+                this.setJob_(job);
+                this.pollInterval_ = this.interval_(
+                        angular.bind(this, this.poll_), 1000);
+            }));
+};
+
+
+/**
+ * Whether the evaluation is running.
+ * @return {boolean} Whether running.
+ * @export
+ */
+EvaluateTeamsCtrl.prototype.running = function() {
+    return !!this.job && (this.job.state == 'QUEUED' ||
+                          this.job.state == 'RUNNING');
+};
+
+
+/**
+ * Gets the number of teams evaluated.
+ * @return {number} The number of teams evaluated.
+ * @export
+ */
+EvaluateTeamsCtrl.prototype.evaluatedCount = function() {
+    if (!this.job || !this.job.teams) {
+        return 0;
+    }
+    return this.job.teams.filter(function(t) {
+        return t.evaluated;
+    }).length;
+};
+
+
+/**
+ * Gets the URL of the result of the evaluation.
+ * @return {string} The URL of the zip file.
+ * @export
+ */
+EvaluateTeamsCtrl.prototype.resultUrl = function() {
+    return '/api/missions/' + this.missionId_ + '/evaluations/' +
+            this.job.id + '/evaluate.zip';
+};
+
+
+/**
+ * Polls the status of the evaluation.
+ * @private
+ */
+EvaluateTeamsCtrl.prototype.poll_ = function() {
+    this.backend_.evaluationJobsResource.get(
+            {missionId: this.missionId_, id: this.job.id}).$promise.then(
+            angular.bind(this, this.setJob_));
+};
+
+
+/**
+ * Sets the status of the evaluation, stopping polling once finished.
+ * @param {!Object} job The status of the evaluation.
+ * @private
+ */
+EvaluateTeamsCtrl.prototype.setJob_ = function(job) {
+    this.job = job;
+    if (!this.running()) {
+        this.stopPolling_();
     }
+};
+
 
-    // Open evaluation in new tab.
-    this.window_.open('/api/missions/' + this.missionId_ + '/evaluate.zip'+ query,
-                      '_blank');
+/**
+ * Stops polling the status of the evaluation.
+ * @private
+ */
+EvaluateTeamsCtrl.prototype.stopPolling_ = function() {
+    if (this.pollInterval_) {
+        this.interval_.cancel(this.pollInterval_);
+        this.pollInterval_ = null;
+    }
 };
 
 
@@ -69,8 +164,9 @@ EvaluateTeamsCtrl.prototype.setTeams_ = function(teams) {
 
 // Register controller with app.
 angular.module('auvsiSuasApp').controller('EvaluateTeamsCtrl', [
-    '$window',
     '$routeParams',
+    '$interval',
+    '$scope',
     'Backend',
     EvaluateTeamsCtrl
 ]);
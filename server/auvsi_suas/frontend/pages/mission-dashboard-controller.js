@@ -20,6 +20,16 @@ MissionDashboardCtrl = function($routeParams, $interval, $scope, Backend) {
      */
     this.teams = null;
 
+    /**
+     * @export {?Array<Object>} The live evaluations of the teams.
+     */
+    this.liveEvaluations = null;
+
+    /**
+     * @export {!Array<Object>} The recent live alerts of teams, newest first.
+     */
+    this.alerts = [];
+
     /**
      * @private @const {!angular.$routeParams} The route params service.
      */
@@ -30,42 +40,180 @@ MissionDashboardCtrl = function($routeParams, $interval, $scope, Backend) {
      */
     this.interval_ = $interval;
 
+    /**
+     * @private @const {!angular.Scope} The scope of the controller.
+     */
+    this.scope_ = $scope;
+
     /**
      * @private @const {!Object} The backend service.
      */
     this.backend_ = Backend;
 
     /**
-     * @private @const {!Object} Data sync every 1s.
+     * @private {?EventSource} Stream of changes to team status.
      */
-    this.updateInterval_ = this.interval_(
-            angular.bind(this, this.update_), 1000);
+    this.teamsStream_ = new EventSource(this.backend_.teamsStreamUrl);
+    this.teamsStream_.onmessage = angular.bind(this, this.updateTeams_);
+
+    /**
+     * @private {?EventSource} Stream of live alerts of teams in the mission.
+     */
+    this.alertsStream_ = new EventSource(
+            this.backend_.alertsStreamUrl + '?mission=' +
+            encodeURIComponent(this.routeParams_['missionId']));
+    this.alertsStream_.onmessage = angular.bind(this, this.updateAlerts_);
+
+    /**
+     * @private @const {!Object} Refresh every 1s, as team activity depends on
+     *     the current time.
+     */
+    this.updateInterval_ = this.interval_(function() {}, 1000);
+
+    /**
+     * @private @const {!Object} Refresh the live evaluations every 5s.
+     */
+    this.liveEvaluationsInterval_ = this.interval_(
+            angular.bind(this, this.updateLiveEvaluations_), 5000);
+    this.updateLiveEvaluations_();
+
     $scope.$on("$destroy", angular.bind(this, function() {
+        this.teamsStream_.close();
+        this.teamsStream_ = null;
+        this.alertsStream_.close();
+        this.alertsStream_ = null;
         this.interval_.cancel(this.updateInterval_);
         this.updateInterval_ = null;
+        this.interval_.cancel(this.liveEvaluationsInterval_);
+        this.liveEvaluationsInterval_ = null;
     }));
 };
 
+
 /**
- * Executes asynchronous updates for data.
+ * Updates the live evaluations of the teams.
  * @private
  */
-MissionDashboardCtrl.prototype.update_ = function() {
-    this.backend_.teamsResource.query({}).$promise
-        .then(angular.bind(this, this.setTeams_));
+MissionDashboardCtrl.prototype.updateLiveEvaluations_ = function() {
+    var params = {missionId: this.routeParams_['missionId']};
+    this.backend_.liveEvaluationsResource.query(params).$promise.then(
+            angular.bind(this, function(evaluations) {
+                this.liveEvaluations = evaluations;
+            }));
 };
 
 
 /**
- * Sets the teams.
+ * Gets the number of waypoints scored in a live evaluation.
+ * @param {!Object} evaluation The live evaluation of a team.
+ * @return {number} The number of waypoints with a score.
+ * @export
+ */
+MissionDashboardCtrl.prototype.waypointsScored = function(evaluation) {
+    return (evaluation.feedback.waypoints || []).filter(function(w) {
+        return w.scoreRatio > 0;
+    }).length;
+};
+
+
+/**
+ * Gets the number of obstacles hit in a live evaluation.
+ * @param {!Object} evaluation The live evaluation of a team.
+ * @return {number} The number of obstacles hit.
+ * @export
+ */
+MissionDashboardCtrl.prototype.obstaclesHit = function(evaluation) {
+    return (evaluation.feedback.stationaryObstacles || []).filter(function(o) {
+        return o.hit;
+    }).length;
+};
+
+
+/**
+ * Adds the alerts from an event of the live alert stream.
+ *
+ * Alerts already shown are skipped, in case a reconnected stream resends them.
+ * @param {!MessageEvent} event The event with a list of new alerts.
+ * @private
+ */
+MissionDashboardCtrl.prototype.updateAlerts_ = function(event) {
+    var alertKey = function(alert) {
+        return alert.team.id + ':' + alert.id;
+    };
+    var shown = {};
+    this.alerts.forEach(function(alert) {
+        shown[alertKey(alert)] = true;
+    });
+    var alerts = angular.fromJson(event.data).filter(function(alert) {
+        return !shown[alertKey(alert)];
+    });
+    this.scope_.$apply(angular.bind(this, function() {
+        this.alerts = alerts.reverse().concat(this.alerts).slice(
+                0, MissionDashboardCtrl.ALERTS_MAX);
+    }));
+};
+
+
+/**
+ * Gets a description of what a live alert is of.
+ * @param {!Object} alert The live alert.
+ * @return {string} The event and boundary of the alert.
+ * @export
+ */
+MissionDashboardCtrl.prototype.alertDescription = function(alert) {
+    var description = (alert.event == 'EXIT' ? 'Exited ' : 'Entered ');
+    if (alert.boundary == 'STATIONARY_OBSTACLE') {
+        return description + 'obstacle ' + alert.stationaryObstacle;
+    }
+    return description + 'fly zone';
+};
+
+
+/**
+ * Updates the teams from an event of the team status stream.
+ * @param {!MessageEvent} event The event with a list of changed teams.
+ * @private
+ */
+MissionDashboardCtrl.prototype.updateTeams_ = function(event) {
+    var changed = angular.fromJson(event.data);
+    this.scope_.$apply(angular.bind(this, function() {
+        this.setTeams_(changed);
+    }));
+};
+
+
+/**
+ * Sets the teams, replacing existing teams with the same ID.
  * @param {Array<Object>} teams The teams to set.
  * @private
  */
 MissionDashboardCtrl.prototype.setTeams_ = function(teams) {
-    this.teams = teams;
+    if (!this.teams) {
+        this.teams = [];
+    }
+    for (var i = 0; i < teams.length; i++) {
+        var team = teams[i];
+        var found = false;
+        for (var j = 0; j < this.teams.length; j++) {
+            if (this.teams[j].team.id == team.team.id) {
+                this.teams[j] = team;
+                found = true;
+                break;
+            }
+        }
+        if (!found) {
+            this.teams.push(team);
+        }
+    }
 };
 
 
+/**
+ * @const {number} Max number of alerts shown.
+ */
+MissionDashboardCtrl.ALERTS_MAX = 100;
+
+
 // Register controller with app.
 angular.module('auvsiSuasApp').controller('MissionDashboardCtrl', [
     '$routeParams',
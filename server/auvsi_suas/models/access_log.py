@@ -1,14 +1,59 @@
 """Model for an access log."""
 
-import functools
+import datetime
 import logging
 import numpy as np
 from django.conf import settings
+from django.db import connection
 from django.db import models
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# The epoch of timestamps in integer microseconds.
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Query for the max, sum and count of the time between logs of a user in
+# periods, including the time from the start and to the end of each period, in
+# integer microseconds. The periods are rows of (index, start, end) values.
+RATES_SQL = """
+WITH periods (ix, start_time, end_time) AS (VALUES {periods}),
+times AS (
+    SELECT periods.ix, log."timestamp" AS time
+    FROM periods JOIN {table} AS log
+        ON log."timestamp" >= periods.start_time
+        AND log."timestamp" < periods.end_time
+    WHERE log.user_id = %s
+    UNION ALL SELECT ix, start_time FROM periods
+    UNION ALL SELECT ix, end_time FROM periods
+),
+gaps AS (
+    SELECT ROUND(EXTRACT(EPOCH FROM
+        time - LAG(time) OVER (PARTITION BY ix ORDER BY time)) * 1000000
+    )::bigint AS gap_us
+    FROM times
+)
+SELECT MAX(gap_us), SUM(gap_us), COUNT(gap_us) FROM gaps
+"""
+
+
+def timestamp_us(timestamp):
+    """Converts the aware datetime to integer microseconds since the epoch."""
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def gap_rates(max_us, sum_us, count):
+    """Converts the time between logs to rates.
+
+    Args:
+        max_us: The max time between logs in integer microseconds.
+        sum_us: The sum of the time between logs in integer microseconds.
+        count: The number of times between logs.
+    Returns:
+        A (max, avg) tuple of the time between logs in seconds.
+    """
+    return (max_us / 1e6, sum_us / 1e6 / count)
+
 
 class AccessLogMixin(models.Model):
     """Base class which logs access of information."""
@@ -59,6 +104,20 @@ class AccessLogMixin(models.Model):
         """
         return cls.by_user(user, start_time, end_time).last()
 
+    @classmethod
+    def last_for_users(cls, users):
+        """Gets the last access log for each of the users with one query.
+
+        Args:
+            users: The users to get the access log for.
+        Returns:
+            Dict from user ID to the last access log for the user. Users
+            without an access log are omitted.
+        """
+        query = cls.objects.filter(user_id__in=[u.pk for u in users])
+        query = query.order_by('user_id', '-timestamp').distinct('user_id')
+        return {log.user_id: log for log in query}
+
     @classmethod
     def by_time_period(cls, user, time_periods):
         """Gets a list of time-sorted lists of access logs for each time period.
@@ -76,6 +135,18 @@ class AccessLogMixin(models.Model):
         """
         return [cls.by_user(user, p.start, p.end) for p in time_periods]
 
+    @classmethod
+    def timestamps_us(cls, logs):
+        """Gets the timestamps of the logs in microseconds since the epoch.
+
+        Args:
+            logs: A sequence of access logs.
+        Returns:
+            An int64 array of the timestamp of each log.
+        """
+        return np.array([timestamp_us(l.timestamp) for l in logs],
+                        dtype=np.int64)
+
     @classmethod
     def rates(cls, user, time_periods, time_period_logs=None):
         """Gets the access log rates.
@@ -87,8 +158,8 @@ class AccessLogMixin(models.Model):
                 time periods are non-overlapping.
             time_period_logs: Optional. A sequence of AccessLogMixin sequences,
                 where each AccessLogMixin sequence contains all AccessLogMixins
-                corresponding to the related TimePeriod. If None, will obtain
-                by calling by_time_period().
+                corresponding to the related TimePeriod. If None, the rates
+                are computed in the database by rates_sql().
         Returns:
             A (max, avg) tuple. The max is the max time between logs, and avg
             is the avg time between logs.
@@ -102,22 +173,54 @@ class AccessLogMixin(models.Model):
             if time_period.duration() is None:
                 return (None, None)
 
-        # If logs were not provided, obtain.
+        # If logs were not provided, compute in the database.
         if not time_period_logs:
-            time_period_logs = cls.by_time_period(user, time_periods)
-
-        # Utility generator for time durations.
-        def time_between_logs(time_periods, time_period_logs):
-            for ix, period in enumerate(time_periods):
-                prev_time = period.start
-                for log in time_period_logs[ix]:
-                    yield (log.timestamp - prev_time).total_seconds()
-                    prev_time = log.timestamp
-                yield (period.end - prev_time).total_seconds()
-
-        # Calculate max, sum, count for time durations.
-        (m, s, c) = functools.reduce(
-            lambda r, d: (max(r[0], d), r[1] + d, r[2] + 1),
-            time_between_logs(time_periods, time_period_logs), (0.0, 0.0, 0))
-        # Convert to max and average.
-        return (m, s / c)
+            return cls.rates_sql(user, time_periods)
+        return cls.rates_from_times(
+            time_periods,
+            [cls.timestamps_us(logs) for logs in time_period_logs])
+
+    @classmethod
+    def rates_from_times(cls, time_periods, time_period_times):
+        """Gets the access log rates from the timestamps of the logs.
+
+        Args:
+            time_periods: A list of closed TimePeriod objects.
+            time_period_times: A list with a sorted array of the timestamps of
+                the logs in each TimePeriod, as given by timestamps_us.
+        Returns:
+            A (max, avg) tuple, as for rates.
+        """
+        gaps_us = np.concatenate([
+            np.diff(
+                np.concatenate([[timestamp_us(period.start)], times,
+                                [timestamp_us(period.end)]]))
+            for period, times in zip(time_periods, time_period_times)
+        ])
+        return gap_rates(int(gaps_us.max()), int(gaps_us.sum()), len(gaps_us))
+
+    @classmethod
+    def rates_sql(cls, user, time_periods):
+        """Gets the access log rates with a single query.
+
+        The time between logs is computed by the database with LAG() over the
+        logs ordered by (user, timestamp), so logs aren't fetched.
+
+        Args:
+            user: The user to get the access log rates for.
+            time_periods: A list of closed TimePeriod objects.
+        Returns:
+            A (max, avg) tuple, as for rates.
+        """
+        params = []
+        for ix, period in enumerate(time_periods):
+            params += [ix, period.start, period.end]
+        params.append(user.pk)
+        sql = RATES_SQL.format(periods=', '.join(
+            ['(%s, %s::timestamptz, %s::timestamptz)'] * len(time_periods)),
+                               table=connection.ops.quote_name(
+                                   cls._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            max_us, sum_us, count = cursor.fetchone()
+        return gap_rates(max_us, int(sum_us), count)
@@ -1,6 +1,7 @@
 """Tests for the access_log module."""
 
 import datetime
+import random
 from auvsi_suas.models.access_log import AccessLogMixin
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.time_period import TimePeriod
@@ -161,6 +162,19 @@ class TestAccessLogMixinBasic(TestAccessLogMixinCommon):
         log = UasTelemetry.last_for_user(self.user1, end_time=start - delta)
         self.assertIsNone(log)
 
+    def test_last_for_users(self):
+        user3 = User.objects.create_user('user3', 'email@example.com', 'pass')
+        start = timezone.now()
+        logs1 = self.create_logs(self.user1, num=3, start=start)
+        logs2 = self.create_logs(self.user2, num=5, start=start)
+
+        with self.assertNumQueries(1):
+            logs = UasTelemetry.last_for_users([self.user1, self.user2, user3])
+        self.assertEqual({
+            self.user1.pk: logs1[-1],
+            self.user2.pk: logs2[-1],
+        }, logs)
+
 
 class TestAccessLogMixinByTimePeriod(TestAccessLogMixinCommon):
     """Test AccessLogMixin.by_time_period()"""
@@ -348,3 +362,57 @@ class TestAccessLogMixinRates(TestAccessLogMixinCommon):
 
         self.assertAlmostEqual(1.0, rates[0])  # max
         self.assertAlmostEqual(0.75, rates[1], delta=0.001)  # avg
+
+    def reference_rates(self, periods, period_logs):
+        """Reduces the rates over the time between each log."""
+        m, s, c = 0.0, 0.0, 0
+        for period, logs in zip(periods, period_logs):
+            times = [period.start] + [l.timestamp for l in logs] + [period.end]
+            for prev, time in zip(times, times[1:]):
+                d = (time - prev).total_seconds()
+                m, s, c = max(m, d), s + d, c + 1
+        return (m, s / c)
+
+    def test_array_and_sql_rates(self):
+        """Rates from arrays and the database match each other."""
+        rand = random.Random(5)
+        user_logs = {}
+        for user in (self.user1, self.user2):
+            time = self.year2000
+            logs = []
+            for _ in range(300):
+                time += datetime.timedelta(
+                    microseconds=rand.randint(0, 3000000))
+                logs.append(
+                    UasTelemetry(user=user,
+                                 timestamp=time,
+                                 latitude=0,
+                                 longitude=0,
+                                 altitude_msl=0,
+                                 uas_heading=0))
+            UasTelemetry.objects.bulk_create(logs)
+            user_logs[user.pk] = logs
+
+        # Periods with and without logs, and starting and ending at logs.
+        logs = user_logs[self.user1.pk]
+        periods = [
+            TimePeriod(self.year2000, logs[50].timestamp),
+            TimePeriod(logs[100].timestamp,
+                       logs[200].timestamp + datetime.timedelta(seconds=1)),
+            TimePeriod(self.year2001, self.year2001),
+            TimePeriod(self.year2001, self.year2002),
+        ]
+        period_logs = UasTelemetry.by_time_period(self.user1, periods)
+        period_times = [UasTelemetry.timestamps_us(l) for l in period_logs]
+
+        with self.assertNumQueries(1):
+            sql_rates = UasTelemetry.rates_sql(self.user1, periods)
+        array_rates = UasTelemetry.rates_from_times(periods, period_times)
+        self.assertEqual(sql_rates, array_rates)
+        self.assertEqual(sql_rates, UasTelemetry.rates(self.user1, periods))
+        self.assertEqual(array_rates,
+                         UasTelemetry.rates(self.user1, periods, period_logs))
+
+        expected = self.reference_rates(periods, period_logs)
+        self.assertEqual(expected[0], array_rates[0])
+        self.assertAlmostEqual(expected[1], array_rates[1], places=9)
@@ -1,5 +1,6 @@
 """Functions for computing distance."""
 
+import functools
 import logging
 import math
 import numpy as np
@@ -45,6 +46,43 @@ def haversine(lon1, lat1, lon2, lat2):
     return dist_km
 
 
+def haversine_many(lon1, lat1, lon2, lat2):
+    """
+    Calculate the great circle distance between points
+    on the earth (specified in decimal degrees).
+
+    Arguments may be scalars or arrays, which are broadcast together. For
+    example, pass arrays of shape (N, 1) and (M,) for an N by M matrix of
+    distances between two sets of points.
+
+    Reference:
+    http://stackoverflow.com/questions/4913349/haversine-formula-in-python-bearing-and-distance-between-two-gps-points
+
+    Args:
+        lon1, lat1: The latitudes and longitudes of the first positions
+        lon2, lat2: The latitudes and longitudes of the second positions
+
+    Returns:
+        The distances in kilometers
+    """
+    # convert decimal degrees to radians
+    lon1 = np.radians(lon1)
+    lat1 = np.radians(lat1)
+    lon2 = np.radians(lon2)
+    lat2 = np.radians(lat2)
+
+    # haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    hav_a = (np.sin(dlat / 2)**2 +
+             np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2)
+    hav_c = 2 * np.arcsin(np.sqrt(hav_a))
+
+    # 6367 km is the radius of the Earth
+    dist_km = 6371 * hav_c
+    return dist_km
+
+
 def distance_to(latitude_1, longitude_1, altitude_1, latitude_2, longitude_2,
                 altitude_2):
     """Get the distance in feet between the two positions.
@@ -63,15 +101,110 @@ def distance_to(latitude_1, longitude_1, altitude_1, latitude_2, longitude_2,
     return math.hypot(gps_dist_ft, alt_dist_ft)
 
 
-def proj_utm(lat, lon):
-    """Proj instance for the given zone.
+def distance_to_many(latitude_1, longitude_1, altitude_1, latitude_2,
+                     longitude_2, altitude_2):
+    """Get the distances in feet between positions.
+
+    Arguments may be scalars or arrays, which are broadcast together as in
+    haversine_many.
+
+    Args:
+        latitude_1: The latitudes of the first positions.
+        longitude_1: The longitudes of the first positions.
+        altitude_1: The altitudes in feet of the first positions.
+        latitude_2: The latitudes of the second positions.
+        longitude_2: The longitudes of the second positions.
+        altitude_2: The altitudes in feet of the second positions.
+    """
+    gps_dist_km = haversine_many(longitude_1, latitude_1, longitude_2,
+                                 latitude_2)
+    gps_dist_ft = units.kilometers_to_feet(gps_dist_km)
+    alt_dist_ft = np.abs(np.subtract(altitude_1, altitude_2))
+    return np.hypot(gps_dist_ft, alt_dist_ft)
+
+
+def project_utm_ft(origin_lat, origin_lon, lats, lons):
+    """Projects positions to the UTM zone of an origin.
+
+    Args:
+        origin_lat: Latitude of the origin.
+        origin_lon: Longitude of the origin.
+        lats: Latitudes of the positions.
+        lons: Longitudes of the positions.
+
+    Returns:
+        Tuple of arrays of the easting and northing in feet of the positions
+    """
+    return UtmFrame(origin_lat, origin_lon).project(lats, lons)
+
+
+class UtmFrame(object):
+    """Frame of feet in the UTM zone of an origin, to project positions.
+
+    The transformer of each zone is built once per process, and shared.
+    """
+    def __init__(self, origin_lat, origin_lon):
+        self.origin_lat = origin_lat
+        self.origin_lon = origin_lon
+        self.transformer = wgs_to_utm(*utm_zone(origin_lat, origin_lon))
+
+    def __reduce__(self):
+        # Transformers can't be pickled, so rebuild from the origin.
+        return (UtmFrame, (self.origin_lat, self.origin_lon))
+
+    @classmethod
+    def around(cls, origin):
+        """Gets the frame of an origin.
+
+        Args:
+            origin: A UtmFrame, which is returned as is, or a position with
+                a latitude and longitude.
+        Returns:
+            The UtmFrame.
+        """
+        if isinstance(origin, cls):
+            return origin
+        return cls(origin.latitude, origin.longitude)
+
+    def project(self, lats, lons):
+        """Projects positions to the frame.
+
+        Args:
+            lats: Latitudes of the positions.
+            lons: Longitudes of the positions.
+        Returns:
+            Tuple of arrays of the easting and northing in feet of the
+            positions.
+        """
+        x, y = self.transformer.transform(np.asarray(lons, dtype=np.float64),
+                                          np.asarray(lats, dtype=np.float64))
+        return units.meters_to_feet(x), units.meters_to_feet(y)
+
+    def project_positions(self, positions):
+        """Projects aerial positions to the frame.
+
+        Args:
+            positions: A list of positions with a latitude, longitude and
+                altitude_msl.
+        Returns:
+            An array with a row for each position of its easting, northing and
+            altitude in feet.
+        """
+        x, y = self.project([p.latitude for p in positions],
+                            [p.longitude for p in positions])
+        z = np.array([p.altitude_msl for p in positions], dtype=np.float64)
+        return np.stack([x, y, z], axis=-1).reshape(-1, 3)
+
+
+def utm_zone(lat, lon):
+    """Gets the UTM zone of a position.
 
     Args:
         lat: Latitude
         lon: Longitude
 
     Returns:
-        pyproj.Proj instance for the given zone
+        Tuple of the zone number, and whether the zone is north.
     """
     zone = math.floor((lon + 180) / 6.0) + 1
     # Special cases for Norway and Svalbard
@@ -88,8 +221,40 @@ def proj_utm(lat, lon):
             zone = 37
 
     north = (lat > 0)
+    return zone, north
+
 
+def proj_utm(lat, lon):
+    """Proj instance for the given zone.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+
+    Returns:
+        pyproj.Proj instance for the given zone
+    """
+    return proj_utm_zone(*utm_zone(lat, lon))
+
+
+@functools.lru_cache(maxsize=None)
+def proj_utm_zone(zone, north):
+    """Proj instance for the zone number, built once per zone."""
     ref = "+proj=utm +zone=%d +ellps=WGS84" % zone
     if not north:
         ref += " +south"
     return pyproj.Proj(ref)
+
+
+@functools.lru_cache(maxsize=None)
+def wgs_to_utm(zone, north):
+    """Transformer from WGS84 to the zone, built once per zone."""
+    return pyproj.transformer.Transformer.from_proj(proj_wgs84,
+                                                    proj_utm_zone(zone, north))
+
+
+@functools.lru_cache(maxsize=None)
+def wgs_to_web_mercator():
+    """Transformer from WGS84 to Web Mercator, built once."""
+    return pyproj.transformer.Transformer.from_proj(proj_wgs84,
+                                                    proj_web_mercator)
@@ -1,6 +1,11 @@
 """Tests for the distance module."""
 
+import collections
+import numpy as np
+import pickle
+import pyproj
 from auvsi_suas.models import distance
+from auvsi_suas.models import units
 from django.test import TestCase
 
 
@@ -51,3 +56,113 @@ class TestHaversine(TestCase):
             (-76.428537, 38.145399, -76.427818, 38.144686, 0.10045),
             (-76.434261, 38.142471, -76.418876, 38.147838, 1.46914),
         ])  # yapf: disable
+
+
+class TestDistanceMany(TestCase):
+    """Tests the vectorized distance functions."""
+
+    # (lat, lon, alt) of positions.
+    POSITIONS = [
+        (38.145306, -76.428709, 0),
+        (38.146146, -76.426375, 100),
+        (38.144686, -76.427818, 200),
+    ]  # yapf: disable
+    # (lat, lon, alt) of targets.
+    TARGETS = [
+        (38.145399, -76.428537, 50),
+        (38.147838, -76.418876, 300),
+    ]  # yapf: disable
+
+    def test_haversine_matrix(self):
+        """Tests the matrix of distances matches the scalar distances."""
+        lats, lons, _ = np.array(self.POSITIONS).T
+        t_lats, t_lons, _ = np.array(self.TARGETS).T
+        dists = distance.haversine_many(lons[:, np.newaxis],
+                                        lats[:, np.newaxis], t_lons, t_lats)
+        self.assertEqual((3, 2), dists.shape)
+        for i, (lat, lon, _) in enumerate(self.POSITIONS):
+            for j, (t_lat, t_lon, _) in enumerate(self.TARGETS):
+                self.assertEqual(distance.haversine(lon, lat, t_lon, t_lat),
+                                 dists[i, j])
+
+    def test_distance_to_one(self):
+        """Tests the distances to one target match the scalar distances."""
+        lats, lons, alts = np.array(self.POSITIONS).T
+        (t_lat, t_lon, t_alt) = self.TARGETS[0]
+        dists = distance.distance_to_many(lats, lons, alts, t_lat, t_lon,
+                                          t_alt)
+        self.assertEqual((3, ), dists.shape)
+        for i, (lat, lon, alt) in enumerate(self.POSITIONS):
+            self.assertEqual(
+                distance.distance_to(lat, lon, alt, t_lat, t_lon, t_alt),
+                dists[i])
+
+    def test_distance_to_matrix(self):
+        """Tests the matrix of distances matches the scalar distances."""
+        lats, lons, alts = np.array(self.POSITIONS).T
+        t_lats, t_lons, t_alts = np.array(self.TARGETS).T
+        dists = distance.distance_to_many(lats[:,
+                                               np.newaxis], lons[:,
+                                                                 np.newaxis],
+                                          alts[:, np.newaxis], t_lats, t_lons,
+                                          t_alts)
+        self.assertEqual((3, 2), dists.shape)
+        for i, (lat, lon, alt) in enumerate(self.POSITIONS):
+            for j, (t_lat, t_lon, t_alt) in enumerate(self.TARGETS):
+                self.assertEqual(
+                    distance.distance_to(lat, lon, alt, t_lat, t_lon, t_alt),
+                    dists[i, j])
+
+
+class TestUtmFrame(TestCase):
+    """Tests the UtmFrame class."""
+
+    # (lat, lon, alt) of positions.
+    POSITIONS = TestDistanceMany.POSITIONS
+
+    def test_project(self):
+        """Tests projection matches a transformer built for the zone."""
+        lats, lons, _ = np.array(self.POSITIONS).T
+        transformer = pyproj.transformer.Transformer.from_proj(
+            distance.proj_wgs84, distance.proj_utm(lats[0], lons[0]))
+        expect_x, expect_y = transformer.transform(lons, lats)
+
+        frame = distance.UtmFrame(lats[0], lons[0])
+        x, y = frame.project(lats, lons)
+        np.testing.assert_array_almost_equal(units.meters_to_feet(expect_x), x,
+                                             3)
+        np.testing.assert_array_almost_equal(units.meters_to_feet(expect_y), y,
+                                             3)
+
+        np.testing.assert_array_equal(
+            (x, y), distance.project_utm_ft(lats[0], lons[0], lats, lons))
+
+    def test_project_positions(self):
+        """Tests projection of aerial positions."""
+        Position = collections.namedtuple(
+            'Position', ['latitude', 'longitude', 'altitude_msl'])
+        positions = [Position(*p) for p in self.POSITIONS]
+        lats, lons, alts = np.array(self.POSITIONS).T
+
+        frame = distance.UtmFrame(lats[0], lons[0])
+        points = frame.project_positions(positions)
+        self.assertEqual((3, 3), points.shape)
+        np.testing.assert_array_equal(frame.project(lats, lons),
+                                      points[:, :2].T)
+        np.testing.assert_array_equal(alts, points[:, 2])
+        self.assertEqual((0, 3), frame.project_positions([]).shape)
+
+    def test_shared_transformer(self):
+        """Tests frames in a zone share a transformer, and can be pickled."""
+        lat, lon, _ = self.POSITIONS[0]
+        frame = distance.UtmFrame(lat, lon)
+        self.assertIs(frame.transformer,
+                      distance.UtmFrame(lat + 1, lon + 1).transformer)
+        self.assertIsNot(frame.transformer,
+                         distance.UtmFrame(lat, lon + 6).transformer)
+        self.assertIs(frame, distance.UtmFrame.around(frame))
+
+        unpickled = pickle.loads(pickle.dumps(frame))
+        self.assertEqual((lat, lon),
+                         (unpickled.origin_lat, unpickled.origin_lon))
+        self.assertIs(frame.transformer, unpickled.transformer)
@@ -4,6 +4,7 @@ import datetime
 import logging
 import numpy as np
 from auvsi_suas.models import aerial_position
+from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.models.waypoint import Waypoint
 from django.contrib import admin
 from django.core import exceptions
@@ -58,44 +59,7 @@ class FlyZone(models.Model):
         Returns:
             A list storing whether each position is inside the boundary.
         """
-        # Get boundary points
-        ordered_pts = self.boundary_pts.order_by('order')
-        path_pts = [[wpt.latitude, wpt.longitude] for wpt in ordered_pts]
-        # First check enough points to define a polygon
-        if len(path_pts) < 3:
-            return [False] * len(aerial_pos_list)
-
-        # Create path to use for testing polygon inclusion
-        path_pts.append(path_pts[0])
-        path = mplpath.Path(np.array(path_pts))
-
-        # Test each aerial position for altitude
-        results = []
-        for aerial_pos in aerial_pos_list:
-            # Check altitude bounds
-            alt = aerial_pos.altitude_msl
-            altitude_check = (alt <= self.altitude_msl_max
-                              and alt >= self.altitude_msl_min)
-            results.append(altitude_check)
-
-        # Create a list of positions to test whether inside polygon
-        polygon_test_point_ids = [
-            cur_id for cur_id in range(len(aerial_pos_list)) if results[cur_id]
-        ]
-        if len(polygon_test_point_ids) == 0:
-            return results
-        polygon_test_points = [[
-            aerial_pos_list[cur_id].latitude, aerial_pos_list[cur_id].longitude
-        ] for cur_id in polygon_test_point_ids]
-
-        # Test each point for inside polygon
-        polygon_test_results = path.contains_points(
-            np.array(polygon_test_points))
-        for test_id in range(len(polygon_test_point_ids)):
-            cur_id = polygon_test_point_ids[test_id]
-            results[cur_id] = polygon_test_results[test_id]
-
-        return results
+        return FlyZoneGeometry([self]).contains_many_pos(aerial_pos_list)
 
     @classmethod
     def out_of_bounds(cls, fly_zones, uas_telemetry_logs):
@@ -103,62 +67,168 @@ class FlyZone(models.Model):
 
         Args:
             fly_zones: The list of FlyZone that the UAS must be in.
-            uas_telemetry_logs: A list of UasTelemetry logs sorted by timestamp
-                which demonstrate the flight of the UAS.
+            uas_telemetry_logs: A list of UasTelemetry logs, or a telemetry
+                array, sorted by timestamp which demonstrate the flight of the
+                UAS.
         Returns:
             num_violations: The number of times fly zone boundaries violated.
             total_time: The timedelta for time spent out of bounds
                 as indicated by the telemetry logs.
         """
-        # Get the aerial positions for the logs
-        aerial_pos_list = uas_telemetry_logs
-        log_ids_to_process = range(len(aerial_pos_list))
+        return FlyZoneGeometry(fly_zones).out_of_bounds(uas_telemetry_logs)
 
-        # Evaluate zones against the logs, eliminating satisfied ones, until
-        # only the out of boundary ids remain
+
+class FlyZoneGeometry(object):
+    """Geometry of a set of fly zones, built once to test many positions.
+
+    The geometry doesn't change with later edits to the fly zones.
+    """
+    def __init__(self, fly_zones):
+        """Builds the geometry of the fly zones.
+
+        Args:
+            fly_zones: The list of FlyZone that the UAS must be in.
+        """
+        # Tuples of polygon path, min altitude and max altitude of each zone.
+        self.zones = []
         for zone in fly_zones:
-            # Stop processing if no ids
-            if len(log_ids_to_process) == 0:
+            ordered_pts = zone.boundary_pts.order_by('order')
+            path_pts = [[wpt.latitude, wpt.longitude] for wpt in ordered_pts]
+            # Zones need enough points to define a polygon.
+            if len(path_pts) < 3:
+                continue
+            path_pts.append(path_pts[0])
+            self.zones.append((mplpath.Path(np.array(path_pts)),
+                               zone.altitude_msl_min, zone.altitude_msl_max))
+
+    def contains(self, latitudes, longitudes, altitudes_msl):
+        """Whether each of the positions is inside any of the zones.
+
+        Args:
+            latitudes: Array of the latitudes of the positions.
+            longitudes: Array of the longitudes of the positions.
+            altitudes_msl: Array of the altitudes of the positions in feet.
+        Returns:
+            Boolean array of whether each position is inside a zone.
+        """
+        points = np.stack([latitudes, longitudes], axis=-1).reshape(-1, 2)
+        altitudes_msl = np.asarray(altitudes_msl, dtype=np.float64)
+        inside = np.zeros(len(points), dtype=bool)
+        for path, alt_min, alt_max in self.zones:
+            # Only test positions within altitude, and not yet inside.
+            test = ~inside & (altitudes_msl >= alt_min) & (altitudes_msl <=
+                                                           alt_max)
+            if not np.any(test):
+                continue
+            inside[test] = path.contains_points(points[test])
+        return inside
+
+    def contains_many_pos(self, aerial_pos_list):
+        """Evaluates whether each of the positions is inside any of the zones.
+
+        Args:
+            aerial_pos_list: A list of AerialPositions to test.
+        Returns:
+            A list storing whether each position is inside the boundary.
+        """
+        return self.contains(
+            np.array([p.latitude for p in aerial_pos_list], dtype=np.float64),
+            np.array([p.longitude for p in aerial_pos_list], dtype=np.float64),
+            np.array([p.altitude_msl for p in aerial_pos_list],
+                     dtype=np.float64)).tolist()
+
+    def out_of_bounds(self, uas_telemetry_logs):
+        """Determines amount of time spent out of bounds.
+
+        See FlyZone.out_of_bounds.
+        """
+        logs = UasTelemetry.as_array(uas_telemetry_logs)
+        bounds = OutOfBounds()
+        bounds.add(UasTelemetry.timestamps_us(logs), self.outside(logs))
+        return (bounds.violations, bounds.time())
+
+    def outside(self, uas_telemetry_logs):
+        """Whether each of the telemetry is outside all of the zones.
+
+        Args:
+            uas_telemetry_logs: A telemetry array.
+        Returns:
+            Boolean array of whether each telemetry is out of bounds.
+        """
+        logs = uas_telemetry_logs
+        return ~self.contains(logs['latitude'], logs['longitude'],
+                              logs['altitude_msl'])
+
+
+class OutOfBounds(object):
+    """Running count and time of fly zone violations during a flight.
+
+    The telemetry of the flight may be added in parts, as it's stored.
+    """
+    def __init__(self):
+        # Number of violations so far.
+        self.violations = 0
+        # Time out of bounds of ended violations, in integer microseconds.
+        self.out_of_bounds_us = 0
+        # Tuple of the time of the telemetry which started the violation in
+        # progress, and the time it's counted from, or None if not violating.
+        self.violation = None
+        # Time of the last telemetry, or None if no telemetry.
+        self.last_us = None
+
+    def add(self, times, outside):
+        """Adds telemetry of the flight, after the telemetry already added.
+
+        Args:
+            times: Sorted array of the timestamps of the telemetry in integer
+                microseconds.
+            outside: Boolean array of whether each telemetry is out of bounds.
+        """
+        if not len(times):
+            return
+        debounce = int(OUT_OF_BOUNDS_DEBOUNCE_SEC * 1e6)
+        outside_ids = np.flatnonzero(outside)
+        inside_ids = np.flatnonzero(~outside)
+        # Time of the telemetry before each, or the first if none before.
+        before = np.concatenate(
+            [[times[0] if self.last_us is None else self.last_us], times[:-1]])
+
+        # As soon as there is one telemetry log out of bounds, we count it as
+        # a violation. The violation lasts until the first telemetry in bounds
+        # after the debounce time has passed.
+        i = 0
+        while True:
+            if self.violation is None:
+                ix = np.searchsorted(outside_ids, i)
+                if ix >= len(outside_ids):
+                    break
+                violation = outside_ids[ix]
+                self.violations += 1
+                # Time out of bounds from the log before the violation.
+                self.violation = (int(times[violation]),
+                                  int(before[violation]))
+                i = violation + 1
+            violation_us, from_us = self.violation
+            debounced = max(i, np.searchsorted(times, violation_us + debounce))
+            ix = np.searchsorted(inside_ids, debounced)
+            if ix >= len(inside_ids):
                 break
-            # Evaluate the positions still not satisfied
-            cur_positions = [
-                aerial_pos_list[cur_id] for cur_id in log_ids_to_process
-            ]
-            satisfied_positions = zone.contains_many_pos(cur_positions)
-            # Retain those which were not satisfied in this pass
-            log_ids_to_process = [
-                log_ids_to_process[cur_id]
-                for cur_id in range(len(log_ids_to_process))
-                if not satisfied_positions[cur_id]
-            ]
-
-        out_of_bounds_time = datetime.timedelta()
-        violations = 0
-        prev_event_id = -1
-        currently_in_bounds = True
-        out_of_bounds_ids = set(log_ids_to_process)
-        for i in range(len(aerial_pos_list)):
-            i_in_bounds = i not in out_of_bounds_ids
-            if currently_in_bounds and not i_in_bounds:
-                # As soon as there is one telemetry log out of bounds, we count
-                # it as a violation.
-                currently_in_bounds = False
-                violations += 1
-                prev_event_id = i
-            elif not currently_in_bounds and i_in_bounds:
-                # A switch of state needs to happen. But first make sure
-                # enough time has passed.
-                time_diff = (uas_telemetry_logs[i].timestamp -
-                             uas_telemetry_logs[prev_event_id].timestamp)
-                currently_in_bounds = (time_diff.total_seconds() >=
-                                       OUT_OF_BOUNDS_DEBOUNCE_SEC)
-
-            if not currently_in_bounds and i > 0:
-                time_diff = (uas_telemetry_logs[i].timestamp -
-                             uas_telemetry_logs[i - 1].timestamp)
-                out_of_bounds_time += time_diff
-
-        return (violations, out_of_bounds_time)
+            end = inside_ids[ix]
+            self.out_of_bounds_us += int(before[end]) - from_us
+            self.violation = None
+            i = end
+        self.last_us = int(times[-1])
+
+    def time(self):
+        """Gets the time out of bounds, including any violation in progress.
+
+        Returns:
+            The timedelta of time spent out of bounds.
+        """
+        out_of_bounds_us = self.out_of_bounds_us
+        if self.violation is not None:
+            out_of_bounds_us += self.last_us - self.violation[1]
+        return datetime.timedelta(microseconds=out_of_bounds_us)
 
 
 @admin.register(FlyZone)
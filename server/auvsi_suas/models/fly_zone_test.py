@@ -1,8 +1,12 @@
 """Tests for the fly_zone module."""
 
 import datetime
+import numpy as np
+import time
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.fly_zone import FlyZone
+from auvsi_suas.models.fly_zone import FlyZoneGeometry
+from auvsi_suas.models.fly_zone import OutOfBounds
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.models.waypoint import Waypoint
 from django.contrib.auth.models import User
@@ -226,6 +230,16 @@ class TestFlyZone(TestCase):
             self.assertEqual(zone.contains_many_pos(aerial_pos_list),
                              expected_results)
 
+    def test_geometry_contains(self):
+        """Tests the geometry tests arrays of positions."""
+        for (zone, test_pos) in self.testdata_containspos:
+            lats, lons, alts = np.array([pos for (pos, _) in test_pos],
+                                        dtype=np.float64).reshape(-1, 3).T
+            expected_results = [inside for (_, inside) in test_pos]
+            self.assertEqual(
+                FlyZoneGeometry([zone]).contains(lats, lons, alts).tolist(),
+                expected_results)
+
     def test_out_of_bounds(self):
         """Tests the UAS out of bounds method."""
         (zone_details, uas_details) = TESTDATA_FLYZONE_EVALBOUNDS
@@ -280,3 +294,57 @@ class TestFlyZone(TestCase):
             self.assertEqual(num_violations, exp_violations)
             self.assertAlmostEqual(out_of_bounds_time.total_seconds(),
                                    exp_out_of_bounds_time)
+
+    def test_out_of_bounds_in_parts(self):
+        """Tests out of bounds of telemetry added in parts."""
+        rng = np.random.default_rng(3)
+        times = np.cumsum(rng.integers(1, 4000000, size=200))
+        outside = rng.random(200) < 0.2
+
+        whole = OutOfBounds()
+        whole.add(times, outside)
+        self.assertGreater(whole.violations, 0)
+        for split in range(0, 200, 7):
+            parts = OutOfBounds()
+            parts.add(times[:split], outside[:split])
+            parts.add(times[split:split + 5], outside[split:split + 5])
+            parts.add(times[split + 5:], outside[split + 5:])
+            self.assertEqual(whole.violations, parts.violations)
+            self.assertEqual(whole.time(), parts.time())
+
+    def test_out_of_bounds_loadtest(self):
+        """Tests the max number of logs the out of bounds can process."""
+        zone = FlyZone(altitude_msl_min=0, altitude_msl_max=1000)
+        zone.save()
+        for ix, (lat, lon) in enumerate([(38, -76), (39, -76), (39, -77),
+                                         (38, -77)]):
+            wpt = Waypoint(order=ix,
+                           latitude=lat,
+                           longitude=lon,
+                           altitude_msl=0)
+            wpt.save()
+            zone.boundary_pts.add(wpt)
+        user = User.objects.create_user('testuser', 'testemail@x.com',
+                                        'testpass')
+
+        # Leave the zone for 1s of every 60s.
+        total_logs = 36000
+        now = timezone.now()
+        logs = [
+            UasTelemetry(user=user,
+                         timestamp=now + datetime.timedelta(seconds=i * 0.1),
+                         latitude=38.5 if i % 600 < 590 else 40,
+                         longitude=-76.5,
+                         altitude_msl=100,
+                         uas_heading=0) for i in range(total_logs)
+        ]
+
+        start_t = time.perf_counter()
+        violations, out_of_bounds_time = FlyZone.out_of_bounds([zone], logs)
+        end_t = time.perf_counter()
+        self.assertEqual(60, violations)
+        # Each violation lasts the debounce time, except the last which lasts
+        # until the end of the flight.
+        self.assertAlmostEqual(59 * 10 + 1, out_of_bounds_time.total_seconds())
+        log_rate = total_logs / (end_t - start_t)
+        self.assertGreaterEqual(log_rate, 20000)
@@ -0,0 +1,395 @@
+"""Live alerts of teams crossing the boundaries of the missions they fly.
+
+As telemetry is stored, it's checked against the fly zones and stationary
+obstacles of the mission the team is flying. Each time the UAS enters or exits
+the fly zones or an obstacle, an alert is added to the team's recent alerts.
+
+The state and recent alerts of each team are kept in the cache shared by all
+server processes, and the geometry of missions is built once per process, so
+checking telemetry doesn't query the database. Alerts are best effort: alerts
+of concurrent updates of a team may be lost, and telemetry stored out of order
+is ignored.
+"""
+
+import collections
+import logging
+import numpy as np
+import time
+from auvsi_suas.models import distance
+from auvsi_suas.models import live_evaluation
+from auvsi_suas.models import shared_cache
+from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.stationary_obstacle import segment_clearance
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.proto import interop_admin_api_pb2
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Max number of recent alerts kept for each team.
+ALERTS_MAX = 100
+
+# Cache key for the version of the alerts.
+VERSION_KEY = 'live_alerts:version'
+
+# Geometry of missions built by this process, by mission ID.
+_geometry = {}
+
+
+def flight_key(user_id):
+    """Cache key for the flight of the user."""
+    return 'live_alerts:flight:%d' % user_id
+
+
+def state_key(user_id):
+    """Cache key for the TeamAlerts of the user."""
+    return 'live_alerts:state:%d' % user_id
+
+
+def version():
+    """Gets the version of the alerts, which changes with each new alert."""
+    return shared_cache.version(VERSION_KEY)
+
+
+def increment_version():
+    """Increments the version of the alerts."""
+    shared_cache.increment_version(VERSION_KEY)
+
+
+def edge_distances(x, y, vertices):
+    """Computes the distance from points to the edges of a polygon.
+
+    Args:
+        x, y: Arrays of the positions of the points.
+        vertices: Array with a row for each vertex of the closed polygon.
+    Returns:
+        Array of the distance from each point to the closest edge.
+    """
+    start = vertices[:-1]
+    edge = vertices[1:] - start
+    px = x[:, np.newaxis] - start[:, 0]
+    py = y[:, np.newaxis] - start[:, 1]
+    length_sq = (edge * edge).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length_sq > 0,
+                     (px * edge[:, 0] + py * edge[:, 1]) / length_sq, 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(px - t * edge[:, 0], py - t * edge[:, 1]).min(axis=1)
+
+
+class AlertGeometry(object):
+    """Boundaries of a mission, built once to check telemetry against."""
+    def __init__(self, geometry):
+        """Builds the boundaries of the mission.
+
+        Args:
+            geometry: The live_evaluation.MissionGeometry of the mission.
+        """
+        self.key = geometry.key
+        self.frame = geometry.frame
+        # Tuples of the polygon path, its vertices projected to the frame,
+        # and the min and max altitude of each fly zone.
+        self.zones = []
+        for path, alt_min, alt_max in geometry.fly_zone_geometry.zones:
+            lats, lons = path.vertices.T
+            x, y = self.frame.project(lats, lons)
+            self.zones.append((path, np.stack([x, y],
+                                              axis=-1), alt_min, alt_max))
+        self.obstacle_ids = [o.pk for o in geometry.obstacles]
+        self.obstacle_lat = np.array([o.latitude for o in geometry.obstacles])
+        self.obstacle_lon = np.array([o.longitude for o in geometry.obstacles])
+        self.obstacle_radius = np.array(
+            [o.cylinder_radius for o in geometry.obstacles])
+        self.obstacle_height = np.array(
+            [o.cylinder_height for o in geometry.obstacles])
+
+    def fly_zone_distances(self, logs):
+        """Checks telemetry against the fly zones.
+
+        Whether telemetry is inside is as for FlyZone.contains_pos. Inside the
+        fly zones, the distance is to the boundary of the zone the telemetry
+        is deepest within.
+
+        Args:
+            logs: A telemetry array.
+        Returns:
+            A tuple of a boolean array of whether each telemetry is inside any
+            fly zone, and an array of its distance to their boundary in feet.
+        """
+        points = np.stack([logs['latitude'], logs['longitude']], axis=-1)
+        alt = logs['altitude_msl']
+        x, y = self.frame.project(logs['latitude'], logs['longitude'])
+        inside = np.zeros(len(logs), dtype=bool)
+        depth = np.zeros(len(logs))
+        clearance = np.full(len(logs), np.inf)
+        for path, vertices, alt_min, alt_max in self.zones:
+            in_path = path.contains_points(points)
+            in_alt = (alt >= alt_min) & (alt <= alt_max)
+            edge = edge_distances(x, y, vertices)
+            in_zone = in_path & in_alt
+            inside |= in_zone
+            depth = np.where(
+                in_zone,
+                np.maximum(
+                    depth,
+                    np.minimum.reduce([edge, alt - alt_min, alt_max - alt])),
+                depth)
+            clearance = np.minimum(
+                clearance,
+                np.hypot(
+                    np.where(in_path, 0, edge),
+                    np.maximum.reduce(
+                        [alt_min - alt, alt - alt_max,
+                         np.zeros(len(logs))])))
+        return inside, np.where(inside, depth, clearance)
+
+    def obstacle_distances(self, logs):
+        """Checks telemetry against the stationary obstacles.
+
+        Whether telemetry is inside is as for StationaryObstacle.contains_pos.
+
+        Args:
+            logs: A telemetry array.
+        Returns:
+            A tuple of a boolean array by telemetry by obstacle of whether the
+            telemetry is inside the obstacle, and an array of its distance to
+            the boundary of the obstacle in feet.
+        """
+        r = distance.distance_to_many(logs['latitude'][:, np.newaxis],
+                                      logs['longitude'][:, np.newaxis], 0,
+                                      self.obstacle_lat, self.obstacle_lon, 0)
+        z = logs['altitude_msl'][:, np.newaxis]
+        inside = (z <= self.obstacle_height) & (r <= self.obstacle_radius)
+        depth = np.minimum(self.obstacle_radius - r, self.obstacle_height - z)
+        clearance = segment_clearance(0, r, 0, z, 0, 0, 0,
+                                      self.obstacle_radius,
+                                      self.obstacle_height)
+        return inside, np.where(inside, depth, clearance)
+
+
+def alert_geometry(mission_id):
+    """Gets the boundaries of the mission, rebuilt when the mission changes.
+
+    Raises:
+        MissionConfig.DoesNotExist: The mission doesn't exist.
+    """
+    geometry = live_evaluation.mission_geometry(mission_id)
+    cached = _geometry.get(mission_id)
+    if cached is None or cached.key != geometry.key:
+        cached = AlertGeometry(geometry)
+        _geometry[mission_id] = cached
+    return cached
+
+
+class TeamAlerts(object):
+    """State of a team's flight within the boundaries, and recent alerts."""
+    def __init__(self):
+        # Tuple of the mission ID and takeoff event ID of the flight, and the
+        # key of the geometry the state is of.
+        self.flight = None
+        self.geometry_key = None
+        # Time of the last telemetry checked, in integer microseconds.
+        self.last_us = None
+        # Whether the UAS is out of bounds, and the IDs of obstacles it's in.
+        self.out_of_bounds = False
+        self.obstacles = set()
+        # Serialized LiveAlert protos of the recent alerts, oldest first.
+        self.alerts = collections.deque(maxlen=ALERTS_MAX)
+        # ID of the next alert. Starts from the time, so IDs keep increasing
+        # if the state is lost and clients skipping seen IDs see new alerts.
+        self.next_id = int(time.time() * 1000)
+
+    def check(self, flight, geometry, telemetry):
+        """Checks stored telemetry of the flight against the boundaries.
+
+        Flights start within the fly zones and outside the obstacles.
+
+        Args:
+            flight: Tuple of the mission ID and takeoff event ID.
+            geometry: The AlertGeometry of the mission.
+            telemetry: List of the stored UasTelemetry of the team, sorted by
+                timestamp.
+        Returns:
+            The number of alerts added.
+        """
+        if flight != self.flight or geometry.key != self.geometry_key:
+            self.flight = flight
+            self.geometry_key = geometry.key
+            self.last_us = None
+            self.out_of_bounds = False
+            self.obstacles = set()
+
+        logs = UasTelemetry.as_array(telemetry)
+        times = UasTelemetry.timestamps_us(logs)
+        if self.last_us is not None:
+            after = times > self.last_us
+            telemetry = [t for t, a in zip(telemetry, after) if a]
+            logs, times = logs[after], times[after]
+        if not len(logs):
+            return 0
+        self.last_us = int(times[-1])
+
+        in_bounds, zone_dist = geometry.fly_zone_distances(logs)
+        in_obst, obst_dist = geometry.obstacle_distances(logs)
+
+        # Crossings are where whether telemetry is inside changes from the
+        # telemetry before it.
+        out_of_bounds = np.concatenate([[self.out_of_bounds], ~in_bounds])
+        in_obst = np.concatenate(
+            [[[pk in self.obstacles for pk in geometry.obstacle_ids]],
+             in_obst])
+        crossings = [(ix, -1) for ix in np.flatnonzero(
+            out_of_bounds[1:] != out_of_bounds[:-1]).tolist()]
+        crossings += zip(
+            *[a.tolist() for a in np.nonzero(in_obst[1:] != in_obst[:-1])])
+        for ix, obst_ix in sorted(crossings):
+            alert = interop_admin_api_pb2.LiveAlert()
+            if obst_ix < 0:
+                alert.boundary = alert.FLY_ZONE
+                entered = not out_of_bounds[ix + 1]
+                alert.distance_ft = zone_dist[ix]
+            else:
+                alert.boundary = alert.STATIONARY_OBSTACLE
+                alert.stationary_obstacle = geometry.obstacle_ids[obst_ix]
+                entered = in_obst[ix + 1, obst_ix]
+                alert.distance_ft = obst_dist[ix, obst_ix]
+            alert.event = alert.ENTER if entered else alert.EXIT
+            self.add(alert, telemetry[ix])
+
+        self.out_of_bounds = bool(out_of_bounds[-1])
+        self.obstacles = set(
+            pk for pk, inside in zip(geometry.obstacle_ids, in_obst[-1])
+            if inside)
+        return len(crossings)
+
+    def add(self, alert, telemetry):
+        """Adds the alert of the telemetry to the recent alerts."""
+        alert.id = self.next_id
+        self.next_id += 1
+        alert.mission = self.flight[0]
+        alert.team.id = telemetry.user_id
+        alert.timestamp = telemetry.timestamp.isoformat()
+        alert.telemetry.latitude = telemetry.latitude
+        alert.telemetry.longitude = telemetry.longitude
+        alert.telemetry.altitude = telemetry.altitude_msl
+        alert.telemetry.heading = telemetry.uas_heading
+        self.alerts.append(alert.SerializeToString())
+
+
+def user_flights(user_ids):
+    """Gets the flight each of the users is in.
+
+    Flights missing from the cache are loaded with a single query.
+
+    Args:
+        user_ids: List of IDs of the users.
+    Returns:
+        Dict from user ID to a tuple of the mission ID and takeoff event ID of
+        the user's flight, or an empty tuple if the user isn't in air.
+    """
+    cache = shared_cache.cache()
+    cached = cache.get_many([flight_key(user_id) for user_id in user_ids])
+    missing = [u for u in user_ids if flight_key(u) not in cached]
+    if missing:
+        query = TakeoffOrLandingEvent.objects.filter(user_id__in=missing)
+        query = query.order_by('user_id', '-timestamp').distinct('user_id')
+        events = {event.user_id: event for event in query}
+        for user_id in missing:
+            key = flight_key(user_id)
+            cached[key] = event_flight(events.get(user_id))
+            # Don't replace a flight set by a concurrent update.
+            cache.add(key, cached[key], timeout=None)
+    return {u: cached[flight_key(u)] for u in user_ids}
+
+
+def event_flight(event):
+    """Gets the flight started by the last event of a user, if in air."""
+    if event is None or not event.uas_in_air:
+        return ()
+    return (event.mission_id, event.pk)
+
+
+def update_telemetry(telemetry):
+    """Checks stored telemetry of teams in flight, adding alerts.
+
+    Args:
+        telemetry: List of stored UasTelemetry.
+    """
+    by_user = collections.defaultdict(list)
+    for t in telemetry:
+        by_user[t.user_id].append(t)
+    flights = user_flights(list(by_user))
+    by_user = {u: t for u, t in by_user.items() if flights[u]}
+    if not by_user:
+        return
+
+    cache = shared_cache.cache()
+    cached = cache.get_many([state_key(user_id) for user_id in by_user])
+    updates = {}
+    alerts = 0
+    for user_id, user_telemetry in by_user.items():
+        mission_id = flights[user_id][0]
+        try:
+            geometry = alert_geometry(mission_id)
+        except MissionConfig.DoesNotExist:
+            continue
+        key = state_key(user_id)
+        state = cached.get(key) or TeamAlerts()
+        alerts += state.check(
+            flights[user_id], geometry,
+            sorted(user_telemetry, key=lambda t: t.timestamp))
+        updates[key] = state
+    if updates:
+        cache.set_many(updates, timeout=None)
+    if alerts:
+        increment_version()
+
+
+def get_many(users, after=None):
+    """Gets the recent alerts of the users.
+
+    Args:
+        users: List of users to get alerts for.
+        after: Optional. Dict from user ID to the ID of the last alert of the
+            user already seen. Only later alerts are returned.
+    Returns:
+        List of LiveAlert protos, oldest first for each user.
+    """
+    after = after or {}
+    cached = shared_cache.cache().get_many(
+        [state_key(user.pk) for user in users])
+    alerts = []
+    for user in users:
+        state = cached.get(state_key(user.pk))
+        if state is None:
+            continue
+        for data in state.alerts:
+            alert = interop_admin_api_pb2.LiveAlert()
+            alert.ParseFromString(data)
+            if alert.id <= after.get(user.pk, 0):
+                continue
+            alert.team.username = user.username
+            alert.team.name = user.first_name
+            alert.team.university = user.last_name
+            alerts.append(alert)
+    return alerts
+
+
+@receiver(post_save, sender=UasTelemetry)
+def telemetry_saved(sender, instance, created, **kwargs):
+    if created:
+        update_telemetry([instance])
+
+
+@receiver(post_save, sender=TakeoffOrLandingEvent)
+@receiver(post_delete, sender=TakeoffOrLandingEvent)
+def event_changed(sender, instance, **kwargs):
+    shared_cache.cache().set(
+        flight_key(instance.user_id),
+        event_flight(
+            TakeoffOrLandingEvent.objects.filter(
+                user_id=instance.user_id).order_by('timestamp').last()),
+        timeout=None)
@@ -0,0 +1,222 @@
+"""Tests for the live_alerts module."""
+
+import datetime
+import random
+from auvsi_suas.models import live_alerts
+from auvsi_suas.models import shared_cache
+from auvsi_suas.models import test_utils
+from auvsi_suas.models.aerial_position import AerialPosition
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.proto import interop_admin_api_pb2
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+LiveAlert = interop_admin_api_pb2.LiveAlert
+
+# Positions in the sample mission: inside the fly zone, inside obstacle 4 and
+# outside the fly zone.
+INSIDE = (38.1478, -76.4290)
+OBSTACLE = (38.1487, -76.4290)
+OUTSIDE = (38.1480, -76.4255)
+
+
+class TestLiveAlerts(TestCase):
+    """Tests the live alerts of teams."""
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='superuser',
+                                                       password='testpass',
+                                                       email='test@test.com')
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        self.user = User.objects.create_user(username='user',
+                                             password='testpass',
+                                             email='test@test.com')
+        self.now = timezone.now()
+        self.sec = 0
+
+    def event(self, uas_in_air):
+        TakeoffOrLandingEvent(user=self.user,
+                              mission=self.mission,
+                              uas_in_air=uas_in_air).save()
+
+    def telemetry(self, pos, alt=300):
+        """Creates telemetry at the position, a second after the last."""
+        self.sec += 1
+        return UasTelemetry(user=self.user,
+                            timestamp=self.now +
+                            datetime.timedelta(seconds=self.sec),
+                            latitude=pos[0],
+                            longitude=pos[1],
+                            altitude_msl=alt,
+                            uas_heading=90)
+
+    def store(self, telemetry):
+        UasTelemetry.objects.bulk_create(telemetry)
+        live_alerts.update_telemetry(telemetry)
+
+    def alerts(self):
+        return live_alerts.get_many([self.user])
+
+    def test_geometry(self):
+        """Tests telemetry is inside as for contains_pos."""
+        geometry = live_alerts.alert_geometry(self.mission.pk)
+        fly_zone = self.mission.fly_zones.all()[0]
+        obstacles = list(self.mission.stationary_obstacles.all())
+        rand = random.Random(3)
+        telemetry = [
+            self.telemetry((38.146 + rand.uniform(-6e-3, 6e-3),
+                            -76.428 + rand.uniform(-6e-3, 6e-3)),
+                           rand.uniform(0, 900)) for _ in range(500)
+        ]
+        logs = UasTelemetry.as_array(telemetry)
+        in_bounds, _ = geometry.fly_zone_distances(logs)
+        in_obst, _ = geometry.obstacle_distances(logs)
+        for ix, t in enumerate(telemetry):
+            pos = AerialPosition(latitude=t.latitude,
+                                 longitude=t.longitude,
+                                 altitude_msl=t.altitude_msl)
+            self.assertEqual(fly_zone.contains_pos(pos), in_bounds[ix])
+            self.assertEqual([o.contains_pos(pos) for o in obstacles],
+                             in_obst[ix].tolist())
+        self.assertTrue(in_bounds.any() and not in_bounds.all())
+        self.assertTrue(in_obst.any())
+
+    def test_distances(self):
+        """Tests distance of telemetry to boundaries."""
+        geometry = live_alerts.alert_geometry(self.mission.pk)
+        obst = self.mission.stationary_obstacles.get(latitude=38.148711)
+        logs = UasTelemetry.as_array([
+            self.telemetry(INSIDE, 110),
+            self.telemetry(INSIDE, 800),
+            self.telemetry(OBSTACLE, 700),
+            self.telemetry(OBSTACLE, 760),
+            self.telemetry(INSIDE, 300),
+        ])
+        _, zone_dist = geometry.fly_zone_distances(logs)
+        self.assertAlmostEqual(10, zone_dist[0])
+        self.assertAlmostEqual(50, zone_dist[1])
+
+        _, obst_dist = geometry.obstacle_distances(logs)
+        ix = geometry.obstacle_ids.index(obst.pk)
+        self.assertAlmostEqual(50, obst_dist[2, ix])
+        self.assertAlmostEqual(10, obst_dist[3, ix])
+        pos = AerialPosition(latitude=INSIDE[0],
+                             longitude=INSIDE[1],
+                             altitude_msl=300)
+        self.assertAlmostEqual(
+            obst.distance_to(pos) - obst.cylinder_radius, obst_dist[4, ix])
+
+    def test_alerts(self):
+        """Tests alerts of crossing boundaries."""
+        self.event(True)
+        obst = self.mission.stationary_obstacles.get(latitude=38.148711)
+        telemetry = [
+            self.telemetry(INSIDE),
+            self.telemetry(INSIDE, 800),
+            self.telemetry(INSIDE),
+            self.telemetry(OBSTACLE),
+            self.telemetry(OBSTACLE),
+            self.telemetry(INSIDE),
+            self.telemetry(OUTSIDE),
+        ]
+        self.store(telemetry[:2])
+        self.store(telemetry[2:5])
+        self.store(telemetry[5:])
+
+        alerts = self.alerts()
+        first_id = alerts[0].id
+        self.assertEqual(list(range(first_id, first_id + 5)),
+                         [a.id for a in alerts])
+        self.assertEqual([
+            (LiveAlert.FLY_ZONE, LiveAlert.EXIT),
+            (LiveAlert.FLY_ZONE, LiveAlert.ENTER),
+            (LiveAlert.STATIONARY_OBSTACLE, LiveAlert.ENTER),
+            (LiveAlert.STATIONARY_OBSTACLE, LiveAlert.EXIT),
+            (LiveAlert.FLY_ZONE, LiveAlert.EXIT),
+        ], [(a.boundary, a.event) for a in alerts])
+        self.assertEqual(
+            [telemetry[ix].timestamp.isoformat() for ix in (1, 2, 3, 5, 6)],
+            [a.timestamp for a in alerts])
+        self.assertEqual(obst.pk, alerts[2].stationary_obstacle)
+        self.assertFalse(alerts[0].HasField('stationary_obstacle'))
+        self.assertAlmostEqual(50, alerts[0].distance_ft)
+        self.assertAlmostEqual(800, alerts[0].telemetry.altitude)
+        self.assertTrue(all(a.distance_ft > 0 for a in alerts))
+        for alert in alerts:
+            self.assertEqual(self.mission.pk, alert.mission)
+            self.assertEqual(self.user.pk, alert.team.id)
+            self.assertEqual('user', alert.team.username)
+
+        self.assertEqual([alerts[4].id], [
+            a.id for a in live_alerts.get_many([self.user],
+                                               {self.user.pk: alerts[3].id})
+        ])
+
+    def test_not_in_air(self):
+        """Tests telemetry isn't checked outside of flights."""
+        self.store([self.telemetry(OUTSIDE)])
+        self.event(True)
+        self.event(False)
+        self.store([self.telemetry(OUTSIDE)])
+        self.assertEqual([], self.alerts())
+
+    def test_new_flight(self):
+        """Tests flights start inside the fly zones."""
+        self.event(True)
+        self.store([self.telemetry(OUTSIDE)])
+        self.event(False)
+        self.event(True)
+        self.store([self.telemetry(INSIDE), self.telemetry(OUTSIDE)])
+        ids = [a.id for a in self.alerts()]
+        self.assertEqual([ids[0], ids[0] + 1], ids)
+        self.assertEqual([LiveAlert.EXIT, LiveAlert.EXIT],
+                         [a.event for a in self.alerts()])
+
+    def test_ids_after_lost_state(self):
+        """Tests alert IDs keep increasing if the alert state is lost."""
+        self.event(True)
+        self.store([self.telemetry(OUTSIDE)])
+        old_id = self.alerts()[0].id
+        shared_cache.cache().clear()
+        self.store([self.telemetry(INSIDE), self.telemetry(OUTSIDE)])
+        alerts = self.alerts()
+        self.assertEqual(1, len(alerts))
+        self.assertGreater(alerts[0].id, old_id)
+
+    def test_out_of_order(self):
+        """Tests telemetry older than that checked is ignored."""
+        self.event(True)
+        older = self.telemetry(OUTSIDE)
+        self.store([self.telemetry(INSIDE)])
+        self.store([older])
+        self.assertEqual([], self.alerts())
+
+    def test_version(self):
+        """Tests the version changes with new alerts."""
+        self.event(True)
+        v1 = live_alerts.version()
+        self.store([self.telemetry(INSIDE)])
+        self.assertEqual(v1, live_alerts.version())
+        self.store([self.telemetry(OUTSIDE)])
+        self.assertNotEqual(v1, live_alerts.version())
+
+    def test_no_queries(self):
+        """Tests checking telemetry doesn't query the database."""
+        self.event(True)
+        self.store([self.telemetry(INSIDE)])
+        telemetry = [self.telemetry(OUTSIDE)]
+        with self.assertNumQueries(0):
+            live_alerts.update_telemetry(telemetry)
+        self.assertEqual(1, len(self.alerts()))
+
+    def test_mission_edit(self):
+        """Tests edits to the mission are checked against."""
+        self.event(True)
+        self.store([self.telemetry(OUTSIDE)])
+        fly_zone = self.mission.fly_zones.all()[0]
+        fly_zone.altitude_msl_max = 200
+        fly_zone.save()
+        self.store([self.telemetry(INSIDE)])
+        self.assertEqual([LiveAlert.EXIT, LiveAlert.EXIT],
+                         [a.event for a in self.alerts()])
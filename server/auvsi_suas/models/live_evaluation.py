@@ -0,0 +1,546 @@
+"""Live evaluation of teams as their telemetry is stored.
+
+The parts of a team's feedback which depend on telemetry (telemetry rates,
+waypoints, time out of bounds and obstacle collisions) are kept as running
+state in the cache shared by all server processes, and updated as telemetry is
+stored. Each telemetry is evaluated once, so judges can see the feedback during
+the flight, and the final evaluation can read the state rather than replay all
+of the telemetry.
+
+Updates are best effort: concurrent updates may be lost, and telemetry may be
+stored out of order. Before state is read it's checked against the stored
+telemetry, and it's rebuilt from the stored telemetry if it's outdated.
+"""
+
+import collections
+import datetime
+import hashlib
+import logging
+import numpy as np
+from auvsi_suas.models import shared_cache
+from auvsi_suas.models.access_log import gap_rates
+from auvsi_suas.models.access_log import timestamp_us
+from auvsi_suas.models.fly_zone import OutOfBounds
+from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.stationary_obstacle import StationaryObstacle
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.proto import interop_admin_api_pb2
+from django.conf import settings
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Geometry of a mission used to evaluate telemetry. The key identifies the
+# values of the geometry, so state built for it can be checked.
+MissionGeometry = collections.namedtuple(
+    'MissionGeometry',
+    ['key', 'frame', 'waypoints', 'fly_zone_geometry', 'obstacles'])
+
+# Geometry of missions built by this process, by mission ID. Values are tuples
+# of the version of the mission when built, and the geometry.
+_geometry = {}
+
+
+def state_key(user_id):
+    """Cache key for the live evaluations of the user, by mission ID."""
+    return 'live_evaluation:%d' % user_id
+
+
+def mission_geometry(mission_config):
+    """Gets the geometry of the mission.
+
+    The geometry is built once, and rebuilt after missions are edited.
+
+    Args:
+        mission_config: The mission, or its ID.
+    Returns:
+        The MissionGeometry of the mission.
+    Raises:
+        MissionConfig.DoesNotExist: The mission doesn't exist.
+    """
+    mission_id = getattr(mission_config, 'pk', mission_config)
+    version = MissionConfig.version(mission_id)
+    cached = _geometry.get(mission_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    if not isinstance(mission_config, MissionConfig):
+        mission_config = MissionConfig.objects.get(pk=mission_id)
+    frame = mission_config.utm_frame()
+    waypoints = list(mission_config.mission_waypoints.order_by('order'))
+    fly_zone_geometry = mission_config.fly_zone_geometry()
+    obstacles = list(mission_config.stationary_obstacles.all())
+    values = [
+        (frame.origin_lat, frame.origin_lon),
+        [(w.latitude, w.longitude, w.altitude_msl) for w in waypoints],
+        [(path.vertices.tolist(), alt_min, alt_max)
+         for path, alt_min, alt_max in fly_zone_geometry.zones],
+        [(o.pk, o.latitude, o.longitude, o.cylinder_radius, o.cylinder_height)
+         for o in obstacles],
+    ]
+    geometry = MissionGeometry(key=hashlib.sha256(
+        repr(values).encode()).hexdigest(),
+                               frame=frame,
+                               waypoints=waypoints,
+                               fly_zone_geometry=fly_zone_geometry,
+                               obstacles=obstacles)
+    _geometry[mission_id] = (version, geometry)
+    return geometry
+
+
+def add_rates(rates, times_us):
+    """Adds times between telemetry to the (max, sum, count) of rates.
+
+    Args:
+        rates: The (max, sum, count) of times in integer microseconds.
+        times_us: Array of the times between telemetry to add.
+    Returns:
+        The (max, sum, count) with the times added.
+    """
+    if not len(times_us):
+        return rates
+    m, s, c = rates
+    return (max(m, int(times_us.max())), s + int(times_us.sum()),
+            c + len(times_us))
+
+
+def period_bounds_us(flight_periods):
+    """Gets the start and end of the periods in microseconds, or None."""
+    return [
+        tuple(None if t is None else timestamp_us(t)
+              for t in (period.start, period.end)) for period in flight_periods
+    ]
+
+
+class LiveEvaluation(object):
+    """Running evaluation of a team's telemetry during a mission's flights."""
+    def __init__(self, geometry, flight_periods, closest_approach):
+        """Starts the evaluation before any telemetry.
+
+        Args:
+            geometry: The MissionGeometry of the mission.
+            flight_periods: The list of TimePeriod of the team's flights.
+            closest_approach: Whether waypoints are evaluated by the closest
+                approach of flight, as in UasTelemetry.satisfied_waypoints.
+        """
+        self.geometry_key = geometry.key
+        self.periods = period_bounds_us(flight_periods)
+        self.closest_approach = closest_approach
+        # False if telemetry was stored out of order, so must be rebuilt.
+        self.valid = True
+
+        # Number and last timestamp of stored telemetry in each flight.
+        self.counts = [0] * len(self.periods)
+        self.last_us = [None] * len(self.periods)
+        # Last non-duplicate telemetry in each flight, to dedupe against.
+        self.last_unique = [None] * len(self.periods)
+        # Last non-duplicate telemetry of any flight, to fly from.
+        self.prev = None
+
+        # Max, sum and count of the time between telemetry in integer
+        # microseconds, as for AccessLogMixin.rates. The time between
+        # telemetry is added up to the time of rate_from_us in flight
+        # rate_period. None if the rates can't be computed.
+        self.rates = (0, 0, 0)
+        self.rate_period = 0
+        self.rate_from_us = self.periods[0][0] if self.periods else None
+        if any(start is None for start, _ in self.periods):
+            self.rates = None
+
+        # Waypoint hits and best distance, as in waypoint_hits.
+        self.hits = []
+        self.best = {}
+        # Whether each obstacle was hit, and its clearance or None.
+        self.obstacle_hits = [False] * len(geometry.obstacles)
+        self.clearances = [None] * len(geometry.obstacles)
+        # Fly zone violations in each flight.
+        self.out_of_bounds = [OutOfBounds() for _ in self.periods]
+
+    def current(self, geometry, flight_periods, closest_approach):
+        """Whether the evaluation is of the given inputs."""
+        return (self.valid and self.geometry_key == geometry.key
+                and self.periods == period_bounds_us(flight_periods)
+                and self.closest_approach == closest_approach)
+
+    def update(self, geometry, logs):
+        """Adds stored telemetry to the evaluation.
+
+        Telemetry must be stored in order. Otherwise, the evaluation becomes
+        invalid.
+
+        Args:
+            geometry: The MissionGeometry of the mission.
+            logs: A TELEMETRY_DTYPE array of the telemetry, sorted by
+                timestamp, stored after the telemetry already added.
+        """
+        if not self.valid:
+            return
+        times = UasTelemetry.timestamps_us(logs)
+        period_logs = []
+        for ix, (start, end) in enumerate(self.periods):
+            in_period = np.ones(len(logs), dtype=bool)
+            if start is not None:
+                in_period &= times >= start
+            if end is not None:
+                in_period &= times < end
+            period_logs.append(logs[in_period])
+            period_times = times[in_period]
+            if not len(period_times):
+                continue
+            # Telemetry not after the telemetry already added may have been
+            # added already, or belongs before it.
+            if ((self.last_us[ix] is not None
+                 and period_times[0] <= self.last_us[ix])
+                    or any(self.counts[ix + 1:])
+                    or np.any(np.diff(period_times) <= 0)):
+                self.valid = False
+                return
+        self.add(geometry, period_logs)
+
+    def add(self, geometry, period_logs):
+        """Adds telemetry to the evaluation, as loaded from the database.
+
+        Args:
+            geometry: The MissionGeometry of the mission.
+            period_logs: A list with a TELEMETRY_DTYPE array for each flight,
+                as for array_by_time_period, of the telemetry after the
+                telemetry already added.
+        """
+        unique_logs = []
+        for ix, logs in enumerate(period_logs):
+            if not len(logs):
+                continue
+            self.counts[ix] += len(logs)
+            self.last_us[ix] = int(logs['timestamp'][-1].astype(np.int64))
+
+            # Dedupe against the last non-duplicate telemetry of the flight.
+            last_unique = self.last_unique[ix]
+            if last_unique is not None:
+                logs = UasTelemetry.dedupe_array(
+                    np.concatenate([last_unique, logs]))[1:]
+            else:
+                logs = UasTelemetry.dedupe_array(logs)
+            if not len(logs):
+                continue
+            self.last_unique[ix] = logs[-1:]
+            unique_logs.append(logs)
+
+            times = UasTelemetry.timestamps_us(logs)
+            self.add_rates(ix, times)
+            self.out_of_bounds[ix].add(
+                times, geometry.fly_zone_geometry.outside(logs))
+        if not unique_logs:
+            return
+
+        # Evaluate flight from the last telemetry to the new telemetry.
+        logs = np.concatenate(unique_logs)
+        if self.prev is not None:
+            logs = np.concatenate([self.prev, logs])
+        starts, ends, valid = UasTelemetry.segment_arrays(logs, geometry.frame)
+        # The segment from the last telemetry depends on the next telemetry,
+        # so is evaluated later.
+        segments = (starts[:-1][valid[:-1]], ends[:-1][valid[:-1]])
+        if self.closest_approach:
+            dists, along = UasTelemetry.closest_approaches(geometry.frame,
+                                                           geometry.waypoints,
+                                                           None,
+                                                           segments=segments)
+        else:
+            telemetry = UasTelemetry.interpolate_arrays(logs)
+            if self.prev is not None:
+                # The last telemetry was already evaluated.
+                telemetry = telemetry._make(a[1:] for a in telemetry)
+            dists = UasTelemetry.sampled_distances(geometry.waypoints,
+                                                   telemetry)
+            along = np.zeros(dists.shape)
+        self.hits, self.best = self.merged_waypoint_hits(dists, along)
+        self.obstacle_hits, self.clearances = self.merged_collisions(
+            geometry, segments)
+        self.prev = logs[-1:]
+
+    def add_rates(self, ix, times):
+        """Adds the time between telemetry of a flight to the rates.
+
+        Args:
+            ix: The index of the flight.
+            times: The timestamps of non-duplicate telemetry of the flight,
+                after those already added.
+        """
+        if self.rates is None:
+            return
+        self.rates, self.rate_period, self.rate_from_us = self.rates_until(ix)
+        self.rates = add_rates(self.rates,
+                               np.diff(times, prepend=self.rate_from_us))
+        self.rate_from_us = int(times[-1])
+
+    def rates_until(self, ix):
+        """Gets the rates with the time between telemetry up to flight ix.
+
+        Returns:
+            A tuple of the rates, and the flight and time they're added to.
+        """
+        rates, period, from_us = self.rates, self.rate_period, self.rate_from_us
+        while period < ix:
+            rates = add_rates(rates,
+                              np.array([self.periods[period][1] - from_us]))
+            period += 1
+            if period < len(self.periods):
+                from_us = self.periods[period][0]
+        return rates, period, from_us
+
+    def merged_waypoint_hits(self, dists, along):
+        """Gets the waypoint hits and best distances with more flight.
+
+        Args:
+            dists: Distance matrix of later flight by waypoint.
+            along: Where along segments of flight each waypoint is closest.
+        Returns:
+            A tuple of the merged hits and best distances.
+        """
+        hits, best = UasTelemetry.waypoint_hits(dists, along)
+        merged_best = dict(self.best)
+        for iw, dist in best.items():
+            if iw not in merged_best or dist < merged_best[iw]:
+                merged_best[iw] = dist
+        return UasTelemetry.merge_waypoint_hits(self.hits, hits), merged_best
+
+    def merged_collisions(self, geometry, segments):
+        """Gets the obstacle hits and clearances with more flight.
+
+        Args:
+            geometry: The MissionGeometry of the mission.
+            segments: Segments of later flight, as given by segments.
+        Returns:
+            A tuple of the merged hits and clearances.
+        """
+        collisions = StationaryObstacle.evaluate_collisions(
+            geometry.obstacles,
+            None,
+            frame=geometry.frame,
+            segments=segments,
+            clearances=self.clearances)
+        hits = [
+            prev_hit or hit
+            for prev_hit, (hit, _) in zip(self.obstacle_hits, collisions)
+        ]
+        return hits, [clearance for _, clearance in collisions]
+
+    def feedback(self, geometry):
+        """Gets the feedback of the evaluation so far.
+
+        Args:
+            geometry: The MissionGeometry of the mission.
+        Returns:
+            A auvsi_suas.proto.MissionFeedback with the telemetry rates,
+            waypoints, out of bounds and stationary obstacles, as set by
+            mission_evaluation.evaluate_feedback.
+        """
+        feedback = interop_admin_api_pb2.MissionFeedback()
+
+        # Rates can only be computed once all flights have ended.
+        if (self.rates is not None and self.periods
+                and all(end is not None for _, end in self.periods)):
+            telem_max, telem_avg = gap_rates(
+                *self.rates_until(len(self.periods))[0])
+            if telem_max:
+                feedback.uas_telemetry_time_max_sec = telem_max
+            if telem_avg:
+                feedback.uas_telemetry_time_avg_sec = telem_avg
+
+        # Evaluate the segment from the last telemetry, as though no more
+        # telemetry follows.
+        hits, best = self.hits, self.best
+        obstacle_hits, clearances = self.obstacle_hits, self.clearances
+        if self.prev is not None:
+            starts, ends, valid = UasTelemetry.segment_arrays(
+                self.prev, geometry.frame)
+            segments = (starts[valid], ends[valid])
+            if self.closest_approach:
+                dists, along = UasTelemetry.closest_approaches(
+                    geometry.frame,
+                    geometry.waypoints,
+                    None,
+                    segments=segments)
+                hits, best = self.merged_waypoint_hits(dists, along)
+            obstacle_hits, clearances = self.merged_collisions(
+                geometry, segments)
+
+        feedback.waypoints.extend(
+            UasTelemetry.score_waypoint_hits(geometry.waypoints, hits, best))
+
+        out_of_bounds_time = sum((b.time() for b in self.out_of_bounds),
+                                 datetime.timedelta())
+        feedback.out_of_bounds = sum(b.violations for b in self.out_of_bounds)
+        feedback.out_of_bounds_time_sec = out_of_bounds_time.total_seconds()
+
+        for obst, hit, clearance in zip(geometry.obstacles, obstacle_hits,
+                                        clearances):
+            obst_eval = feedback.stationary_obstacles.add()
+            obst_eval.id = obst.pk
+            obst_eval.hit = hit
+            if clearance is not None:
+                obst_eval.min_clearance_ft = clearance
+        return feedback
+
+
+def build(mission_config, user, geometry, flight_periods):
+    """Builds the live evaluation of the team from its stored telemetry.
+
+    Args:
+        mission_config: The mission to evaluate the team against.
+        user: The team user.
+        geometry: The MissionGeometry of the mission.
+        flight_periods: The list of TimePeriod of the team's flights.
+    Returns:
+        The LiveEvaluation of the team.
+    """
+    state = LiveEvaluation(geometry, flight_periods,
+                           settings.WAYPOINT_CLOSEST_APPROACH)
+    state.add(geometry,
+              UasTelemetry.array_by_time_period(user, flight_periods))
+    return state
+
+
+def stored_telemetry_matches(state, user, flight_periods):
+    """Whether the evaluation added all of the team's stored telemetry.
+
+    Telemetry is checked by the count and last timestamp in each flight, with
+    a single query.
+    """
+    if not flight_periods:
+        return True
+    aggregates = {}
+    for ix, period in enumerate(flight_periods):
+        in_period = Q()
+        if period.start is not None:
+            in_period &= Q(timestamp__gte=period.start)
+        if period.end is not None:
+            in_period &= Q(timestamp__lt=period.end)
+        aggregates['count_%d' % ix] = Count('pk', filter=in_period)
+        aggregates['last_%d' % ix] = Max('timestamp', filter=in_period)
+    stored = UasTelemetry.objects.filter(user_id=user.pk).aggregate(
+        **aggregates)
+    for ix in range(len(flight_periods)):
+        last = stored['last_%d' % ix]
+        if (stored['count_%d' % ix] != state.counts[ix]
+                or (last and timestamp_us(last)) != state.last_us[ix]):
+            return False
+    return True
+
+
+def current_feedback(mission_config, user, flight_periods=None):
+    """Gets the live feedback of the team if it's current.
+
+    Args:
+        mission_config: The mission to evaluate the team against.
+        user: The team user.
+        flight_periods: Optional. The list of TimePeriod of the team's
+            flights. If None, will be loaded.
+    Returns:
+        The auvsi_suas.proto.MissionFeedback as given by
+        LiveEvaluation.feedback, or None if the live evaluation is missing
+        or outdated.
+    """
+    if flight_periods is None:
+        flight_periods = TakeoffOrLandingEvent.flights(mission_config, user)
+    geometry = mission_geometry(mission_config)
+    states = shared_cache.cache().get(state_key(user.pk)) or {}
+    state = states.get(mission_config.pk)
+    if (state is None or not state.current(geometry, flight_periods,
+                                           settings.WAYPOINT_CLOSEST_APPROACH)
+            or not stored_telemetry_matches(state, user, flight_periods)):
+        return None
+    return state.feedback(geometry)
+
+
+def get_feedback(mission_config, user):
+    """Gets the live feedback of the team, rebuilding it if outdated.
+
+    Args:
+        mission_config: The mission to evaluate the team against.
+        user: The team user.
+    Returns:
+        The auvsi_suas.proto.MissionFeedback as given by
+        LiveEvaluation.feedback.
+    """
+    flight_periods = TakeoffOrLandingEvent.flights(mission_config, user)
+    feedback = current_feedback(mission_config, user, flight_periods)
+    if feedback is not None:
+        return feedback
+
+    logger.info('Rebuilding live evaluation of user: %s.' % user.username)
+    geometry = mission_geometry(mission_config)
+    state = build(mission_config, user, geometry, flight_periods)
+    cache = shared_cache.cache()
+    key = state_key(user.pk)
+    states = cache.get(key) or {}
+    states[mission_config.pk] = state
+    cache.set(key, states, timeout=None)
+    return state.feedback(geometry)
+
+
+def update_telemetry(telemetry):
+    """Updates the live evaluations with stored telemetry.
+
+    Only teams with a live evaluation are updated. Evaluations are built
+    when first read.
+
+    Args:
+        telemetry: List of stored UasTelemetry.
+    """
+    by_user = collections.defaultdict(list)
+    for t in telemetry:
+        by_user[t.user_id].append(t)
+    cache = shared_cache.cache()
+    cached = cache.get_many([state_key(user_id) for user_id in by_user])
+    updates = {}
+    for user_id, user_telemetry in by_user.items():
+        key = state_key(user_id)
+        states = cached.get(key)
+        if not states:
+            continue
+        logs = UasTelemetry.as_array(
+            sorted(user_telemetry, key=lambda t: t.timestamp))
+        for mission_id, state in list(states.items()):
+            try:
+                geometry = mission_geometry(mission_id)
+            except MissionConfig.DoesNotExist:
+                del states[mission_id]
+                continue
+            if state.geometry_key != geometry.key:
+                state.valid = False
+            state.update(geometry, logs)
+        updates[key] = states
+    if updates:
+        cache.set_many(updates, timeout=None)
+
+
+def clear(user_id):
+    """Clears the live evaluations of the user, to be rebuilt when read."""
+    shared_cache.cache().delete(state_key(user_id))
+
+
+@receiver(post_save, sender=UasTelemetry)
+def telemetry_saved(sender, instance, created, **kwargs):
+    if created:
+        update_telemetry([instance])
+    else:
+        clear(instance.user_id)
+
+
+@receiver(post_delete, sender=UasTelemetry)
+def telemetry_deleted(sender, instance, **kwargs):
+    clear(instance.user_id)
+
+
+@receiver(post_save, sender=TakeoffOrLandingEvent)
+@receiver(post_delete, sender=TakeoffOrLandingEvent)
+def event_changed(sender, instance, **kwargs):
+    # Flights changed, so rebuild when read.
+    clear(instance.user_id)
@@ -0,0 +1,222 @@
+"""Tests for the live_evaluation module."""
+
+import datetime
+import random
+from auvsi_suas.models import live_evaluation
+from auvsi_suas.models import mission_evaluation
+from auvsi_suas.models import shared_cache
+from auvsi_suas.models import test_utils
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.proto import interop_admin_api_pb2
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+
+
+class TestLiveEvaluation(TestCase):
+    """Tests the live evaluation of teams."""
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='superuser',
+                                                       password='testpass',
+                                                       email='test@test.com')
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        self.user = User.objects.create_user(username='user',
+                                             password='testpass',
+                                             email='test@test.com')
+        self.start = timezone.now() - datetime.timedelta(hours=1)
+        self.random = random.Random(7)
+
+    def time(self, sec):
+        return self.start + datetime.timedelta(seconds=sec)
+
+    def event(self, sec, uas_in_air):
+        TakeoffOrLandingEvent(user=self.user,
+                              mission=self.mission,
+                              timestamp=self.time(sec),
+                              uas_in_air=uas_in_air).save()
+
+    def flight(self, start_sec):
+        """Creates telemetry of a flight through the mission.
+
+        The flight passes near the waypoints and obstacles, has duplicate
+        telemetry, gaps between telemetry, and goes out of bounds.
+        """
+        targets = list(self.mission.mission_waypoints.order_by('order'))
+        targets += list(self.mission.stationary_obstacles.all())
+        telemetry = []
+        sec = start_sec
+        lat, lon, alt = 0, 0, 0
+        for target in targets:
+            for _ in range(15):
+                sec += self.random.choice([0.1, 0.3, 1, 1, 6])
+                r = self.random.random()
+                if telemetry and r < 0.1:
+                    # Duplicate of the last telemetry.
+                    t = telemetry[-1]
+                    lat, lon, alt = t.latitude, t.longitude, t.altitude_msl
+                elif r < 0.15:
+                    # Out of bounds.
+                    alt = 2000
+                else:
+                    lat = target.latitude + self.random.uniform(-3e-4, 3e-4)
+                    lon = target.longitude + self.random.uniform(-3e-4, 3e-4)
+                    alt = getattr(target, 'altitude_msl', 150)
+                    alt += self.random.uniform(-50, 50)
+                telemetry.append(
+                    UasTelemetry(user=self.user,
+                                 timestamp=self.time(sec),
+                                 latitude=lat,
+                                 longitude=lon,
+                                 altitude_msl=alt,
+                                 uas_heading=90))
+        return telemetry
+
+    def store(self, telemetry):
+        """Stores the telemetry in batches, as the telemetry view does."""
+        while telemetry:
+            batch = telemetry[:self.random.randint(1, 5)]
+            telemetry = telemetry[len(batch):]
+            UasTelemetry.objects.bulk_create(batch)
+            live_evaluation.update_telemetry(batch)
+
+    def replayed_feedback(self):
+        """Gets the feedback from replaying the telemetry."""
+        live_evaluation.clear(self.user.pk)
+        team_eval = interop_admin_api_pb2.MissionEvaluation()
+        mission_evaluation.generate_feedback(self.mission, self.user,
+                                             team_eval)
+        return team_eval.feedback
+
+    def assertMatchesReplay(self, feedback):
+        """Asserts the feedback of telemetry matches that of a replay."""
+        replayed = self.replayed_feedback()
+        for field in ('odlc', 'judge', 'map'):
+            replayed.ClearField(field)
+        self.assertEqual(replayed, feedback)
+        self.assertEqual(replayed.SerializeToString(),
+                         feedback.SerializeToString())
+
+    def fly_mission(self):
+        """Flies two flights with telemetry before, between and after."""
+        telemetry = self.flight(0)
+        telemetry += self.flight(
+            (telemetry[-1].timestamp - self.start).total_seconds())
+        end = (telemetry[-1].timestamp - self.start).total_seconds()
+        self.event(end * 0.1, True)
+        self.event(end * 0.4, False)
+        self.event(end * 0.5, True)
+        self.event(end * 0.9, False)
+
+        # Start the live evaluation.
+        live_evaluation.get_feedback(self.mission, self.user)
+        self.store(telemetry)
+
+    def test_matches_replay(self):
+        """Tests live feedback is that of replaying the telemetry."""
+        for closest_approach in (False, True):
+            with override_settings(WAYPOINT_CLOSEST_APPROACH=closest_approach):
+                UasTelemetry.objects.all().delete()
+                TakeoffOrLandingEvent.objects.all().delete()
+                self.fly_mission()
+
+                feedback = live_evaluation.current_feedback(
+                    self.mission, self.user)
+                self.assertIsNotNone(feedback)
+                self.assertTrue(
+                    feedback.HasField('uas_telemetry_time_avg_sec'))
+                self.assertTrue(feedback.out_of_bounds)
+                self.assertTrue(
+                    any(w.score_ratio > 0 for w in feedback.waypoints))
+                self.assertTrue(
+                    any(o.hit for o in feedback.stationary_obstacles))
+                self.assertMatchesReplay(feedback)
+
+    def test_evaluation_uses_live_feedback(self):
+        """Tests the final evaluation reads the live feedback."""
+        self.fly_mission()
+        live = interop_admin_api_pb2.MissionEvaluation()
+        with self.assertNumQueries(8):
+            mission_evaluation.generate_feedback(self.mission, self.user, live)
+        self.assertEqual(self.replayed_feedback(), live.feedback)
+
+    def test_rebuild(self):
+        """Tests live feedback is rebuilt from the stored telemetry."""
+        self.fly_mission()
+        live_evaluation.clear(self.user.pk)
+        self.assertIsNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+
+        feedback = live_evaluation.get_feedback(self.mission, self.user)
+        self.assertIsNotNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+        self.assertMatchesReplay(feedback)
+
+    def test_open_flight(self):
+        """Tests feedback during a flight."""
+        self.event(0, True)
+        live_evaluation.get_feedback(self.mission, self.user)
+        self.store(self.flight(10))
+
+        feedback = live_evaluation.current_feedback(self.mission, self.user)
+        self.assertFalse(feedback.HasField('uas_telemetry_time_avg_sec'))
+        self.assertMatchesReplay(feedback)
+
+    def test_out_of_order(self):
+        """Tests telemetry stored out of order is evaluated after rebuild."""
+        self.event(0, True)
+        self.event(300, False)
+        live_evaluation.get_feedback(self.mission, self.user)
+        telemetry = self.flight(10)
+        self.store(telemetry[10:])
+        self.store(telemetry[:10])
+
+        self.assertIsNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+        feedback = live_evaluation.get_feedback(self.mission, self.user)
+        self.assertMatchesReplay(feedback)
+
+    def test_missed_update(self):
+        """Tests telemetry stored without an update isn't missed."""
+        self.event(0, True)
+        self.event(300, False)
+        live_evaluation.get_feedback(self.mission, self.user)
+        telemetry = self.flight(10)
+        UasTelemetry.objects.bulk_create(telemetry[:10])
+        self.store(telemetry[10:])
+
+        self.assertIsNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+
+    def test_update_without_state(self):
+        """Tests updates are skipped until the evaluation is read."""
+        self.event(0, True)
+        self.store(self.flight(10))
+        self.assertIsNone(shared_cache.cache().get(
+            live_evaluation.state_key(self.user.pk)))
+
+    def test_event_clears(self):
+        """Tests changes to flights clear the evaluation."""
+        self.event(0, True)
+        live_evaluation.get_feedback(self.mission, self.user)
+        self.store(self.flight(10))
+        self.event(300, False)
+
+        self.assertIsNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+        feedback = live_evaluation.get_feedback(self.mission, self.user)
+        self.assertTrue(feedback.HasField('uas_telemetry_time_avg_sec'))
+        self.assertMatchesReplay(feedback)
+
+    def test_mission_edit(self):
+        """Tests edits to the mission geometry rebuild the evaluation."""
+        self.fly_mission()
+        obst = self.mission.stationary_obstacles.all()[0]
+        obst.cylinder_radius += 100
+        obst.save()
+
+        self.assertIsNone(
+            live_evaluation.current_feedback(self.mission, self.user))
+        feedback = live_evaluation.get_feedback(self.mission, self.user)
+        self.assertMatchesReplay(feedback)
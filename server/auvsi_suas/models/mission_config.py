@@ -1,7 +1,12 @@
 """Mission configuration model."""
 
+import functools
 import logging
+import operator
+from auvsi_suas.models import distance
+from auvsi_suas.models import shared_cache
 from auvsi_suas.models.fly_zone import FlyZone
+from auvsi_suas.models.fly_zone import FlyZoneGeometry
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.odlc import Odlc
 from auvsi_suas.models.stationary_obstacle import StationaryObstacle
@@ -9,9 +14,46 @@ from auvsi_suas.models.waypoint import Waypoint
 from django.contrib import admin
 from django.core import validators
 from django.db import models
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
 
 logger = logging.getLogger(__name__)
 
+# Cache key for the version of all mission configurations.
+VERSION_KEY = 'mission_config:version'
+
+# Lookups from missions to each kind of data they reference, so edits to the
+# data change the versions of only the missions which reference it.
+MISSION_LOOKUPS = {
+    FlyZone: ['fly_zones'],
+    GpsPosition: [
+        'home_pos', 'lost_comms_pos', 'emergent_last_known_pos',
+        'off_axis_odlc_pos', 'map_center_pos', 'air_drop_pos', 'ugv_drive_pos',
+        'odlcs__location'
+    ],
+    Odlc: ['odlcs'],
+    StationaryObstacle: ['stationary_obstacles'],
+    Waypoint: [
+        'mission_waypoints', 'search_grid_points', 'air_drop_boundary_points',
+        'fly_zones__boundary_pts'
+    ],
+}
+
+# Fly zone geometry of missions built by this process, by mission ID. Values
+# are tuples of the version of the mission when built, and the geometry.
+_fly_zone_geometry = {}
+# UTM frames of missions built by this process, as for fly zone geometry.
+_utm_frame = {}
+
+
+def version_key(mission_id):
+    """Cache key for the version of the mission configuration."""
+    return 'mission_config:version:%d' % mission_id
+
 
 class MissionConfig(models.Model):
     """The details for the mission."""
@@ -74,6 +116,131 @@ class MissionConfig(models.Model):
     def __str__(self):
         return 'Mission %d' % self.pk
 
+    @classmethod
+    def version(cls, mission_id=None):
+        """Gets the version of a mission, which changes on each edit of it.
+
+        Args:
+            mission_id: Optional. ID of the mission. If None, gets the version
+                of all missions, which changes on edits to any mission.
+        """
+        if mission_id is None:
+            return shared_cache.version(VERSION_KEY)
+        return shared_cache.version(version_key(mission_id))
+
+    def fly_zone_geometry(self):
+        """Gets the geometry of the fly zones of the mission.
+
+        The geometry is built once, and rebuilt after missions are edited.
+
+        Returns:
+            A FlyZoneGeometry for the fly zones.
+        """
+        return self._built_once(_fly_zone_geometry,
+                                lambda: FlyZoneGeometry(self.fly_zones.all()))
+
+    def utm_frame(self):
+        """Gets the UTM frame of the home position of the mission.
+
+        The frame is built once, and rebuilt after missions are edited.
+
+        Returns:
+            A distance.UtmFrame around the home position.
+        """
+        return self._built_once(
+            _utm_frame, lambda: distance.UtmFrame.around(self.home_pos))
+
+    def _built_once(self, built, build):
+        """Gets a value built for this mission, building it if outdated.
+
+        Args:
+            built: Dict from mission ID to a tuple of the version of the
+                mission when built, and the value.
+            build: Function to build the value.
+        Returns:
+            The value.
+        """
+        version = MissionConfig.version(self.pk)
+        cached = built.get(self.pk)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = build()
+        built[self.pk] = (version, value)
+        return value
+
+
+def referencing_missions(instance):
+    """Gets the IDs of the missions which reference the mission data.
+
+    Args:
+        instance: A MissionConfig, or data of a model in MISSION_LOOKUPS.
+    Returns:
+        Set of mission IDs.
+    """
+    if isinstance(instance, MissionConfig):
+        return {instance.pk}
+    query = functools.reduce(operator.or_,
+                             (Q(**{lookup: instance.pk})
+                              for lookup in MISSION_LOOKUPS[type(instance)]))
+    return set(
+        MissionConfig.objects.filter(query).values_list('pk', flat=True))
+
+
+def increment_versions(mission_ids):
+    """Increments the versions of the missions, and of all missions.
+
+    Readers may see the new versions before the transaction changing the
+    missions commits, and cache the old missions under them. So the
+    versions are incremented again once the transaction commits.
+    """
+    if not mission_ids:
+        return
+
+    def increment():
+        for mission_id in mission_ids:
+            shared_cache.increment_version(version_key(mission_id))
+        shared_cache.increment_version(VERSION_KEY)
+
+    increment()
+    transaction.on_commit(increment)
+
+
+def mission_saved(sender, instance, **kwargs):
+    """Increments the versions of missions referencing saved data."""
+    increment_versions(referencing_missions(instance))
+
+
+def mission_deleting(sender, instance, **kwargs):
+    # References are deleted with the data, so find the missions first.
+    instance._referencing_missions = referencing_missions(instance)
+
+
+def mission_deleted(sender, instance, **kwargs):
+    """Increments the versions of missions referencing deleted data."""
+    increment_versions(getattr(instance, '_referencing_missions', set()))
+
+
+def mission_references_changed(sender, instance, action, **kwargs):
+    """Increments the versions of missions whose references changed."""
+    if action.startswith('pre_'):
+        # Removed references are gone after the change, so find them first.
+        instance._referencing_missions = referencing_missions(instance)
+        return
+    increment_versions(
+        referencing_missions(instance)
+        | getattr(instance, '_referencing_missions', set()))
+
+
+for model in [MissionConfig] + list(MISSION_LOOKUPS):
+    post_save.connect(mission_saved, sender=model)
+    pre_delete.connect(mission_deleting, sender=model)
+    post_delete.connect(mission_deleted, sender=model)
+for field in (MissionConfig.fly_zones, MissionConfig.mission_waypoints,
+              MissionConfig.search_grid_points, MissionConfig.odlcs,
+              MissionConfig.air_drop_boundary_points,
+              MissionConfig.stationary_obstacles, FlyZone.boundary_pts):
+    m2m_changed.connect(mission_references_changed, sender=field.through)
+
 
 @admin.register(MissionConfig)
 class MissionConfigModelAdmin(admin.ModelAdmin):
@@ -1,7 +1,10 @@
 """Tests for the mission_config module."""
 
 from auvsi_suas.models import test_utils
+from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.odlc import Odlc
+from auvsi_suas.proto import interop_api_pb2
 from django.contrib.auth.models import User
 from django.test import TestCase
 
@@ -22,3 +25,85 @@ class TestMissionConfigModelSampleMission(TestCase):
         """Test model validation."""
         for mission in MissionConfig.objects.all():
             mission.full_clean()
+
+    def test_version(self):
+        """Test the version changes when missions are edited."""
+        version = MissionConfig.version()
+        self.assertEqual(version, MissionConfig.version())
+
+        mission = MissionConfig.objects.first()
+        obst = mission.stationary_obstacles.first()
+        obst.cylinder_height += 10
+        obst.save()
+        self.assertNotEqual(version, MissionConfig.version())
+        version = MissionConfig.version()
+
+        mission.stationary_obstacles.remove(obst)
+        self.assertNotEqual(version, MissionConfig.version())
+
+    def test_mission_version(self):
+        """Test a mission's version changes only with data it references."""
+        mission = MissionConfig.objects.first()
+        user = User.objects.create_user(username='testuser',
+                                        password='testpass',
+                                        email='test@test.com')
+        location = GpsPosition(latitude=38, longitude=-76)
+        location.save()
+        team_odlc = Odlc(mission=mission,
+                         user=user,
+                         odlc_type=interop_api_pb2.Odlc.STANDARD,
+                         location=location)
+        team_odlc.save()
+        version = MissionConfig.version(mission.pk)
+
+        # Team ODLCs aren't mission data.
+        team_odlc.location.latitude += 0.0001
+        team_odlc.location.save()
+        team_odlc.save()
+        self.assertEqual(version, MissionConfig.version(mission.pk))
+
+        real_odlc = mission.odlcs.first()
+        real_odlc.location.latitude += 0.0001
+        real_odlc.location.save()
+        self.assertNotEqual(version, MissionConfig.version(mission.pk))
+        version = MissionConfig.version(mission.pk)
+
+        mission.odlcs.remove(real_odlc)
+        self.assertNotEqual(version, MissionConfig.version(mission.pk))
+        version = MissionConfig.version(mission.pk)
+
+        # Removed references are found before they're deleted.
+        obst = mission.stationary_obstacles.first()
+        obst.delete()
+        self.assertNotEqual(version, MissionConfig.version(mission.pk))
+        version = MissionConfig.version(mission.pk)
+
+        wpt = mission.fly_zones.first().boundary_pts.first()
+        wpt.flyzone_set.clear()
+        self.assertNotEqual(version, MissionConfig.version(mission.pk))
+
+    def test_fly_zone_geometry(self):
+        """Test the fly zone geometry is rebuilt after edits."""
+        mission = MissionConfig.objects.first()
+        geometry = mission.fly_zone_geometry()
+        with self.assertNumQueries(0):
+            self.assertIs(geometry, mission.fly_zone_geometry())
+
+        wpt = mission.fly_zones.first().boundary_pts.first()
+        wpt.latitude += 0.0001
+        wpt.save()
+        self.assertIsNot(geometry, mission.fly_zone_geometry())
+
+    def test_utm_frame(self):
+        """Test the UTM frame is of the home position, rebuilt after edits."""
+        mission = MissionConfig.objects.first()
+        frame = mission.utm_frame()
+        self.assertEqual(mission.home_pos.latitude, frame.origin_lat)
+        self.assertEqual(mission.home_pos.longitude, frame.origin_lon)
+        with self.assertNumQueries(0):
+            self.assertIs(frame, mission.utm_frame())
+
+        mission.home_pos.latitude += 0.0001
+        mission.home_pos.save()
+        mission.save()
+        self.assertIsNot(frame, mission.utm_frame())
@@ -1,19 +1,40 @@
 """Mission evaluation."""
 
-import itertools
+import collections
+import concurrent.futures
+import datetime
+import django
+import hashlib
 import logging
+import multiprocessing
+import numpy as np
+import os
+import sys
+from auvsi_suas.models import live_evaluation
 from auvsi_suas.models.map import Map
+from auvsi_suas.models.mission_config import MissionConfig
 from auvsi_suas.models.mission_judge_feedback import MissionJudgeFeedback
 from auvsi_suas.models.odlc import Odlc
 from auvsi_suas.models.odlc import OdlcEvaluator
+from auvsi_suas.models.stationary_obstacle import StationaryObstacle
 from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.proto import interop_admin_api_pb2
 from auvsi_suas.proto import interop_api_pb2
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models import Count
+from django.db.models import Max
 
 logger = logging.getLogger(__name__)
 
+# Version of the evaluation. Change when the evaluation changes, so cached
+# evaluations from earlier versions aren't used.
+EVALUATION_VERSION = 1
+# Alias of the cache of team evaluations.
+EVALUATION_CACHE = 'evaluations'
+
 # The time between interop telemetry posts that's a prereq for other tasks.
 INTEROP_TELEM_THRESHOLD_TIME_SEC = 1.0
 
@@ -71,84 +92,253 @@ MAP_WEIGHT = 0.1
 AIR_DROP_WEIGHT = 0.2
 OPERATIONAL_WEIGHT = 0.1
 
-
-def generate_feedback(mission_config, user, team_eval):
-    """Generates mission feedback for the given team and mission.
+# Inputs of a team's feedback, loaded from the database so feedback can be
+# evaluated without database access.
+FeedbackInputs = collections.namedtuple('FeedbackInputs', [
+    'user',
+    'flight_periods',
+    'uas_period_logs',
+    'telemetry_feedback',
+    'frame',
+    'waypoints',
+    'closest_approach',
+    'fly_zone_geometry',
+    'user_odlcs',
+    'real_odlcs',
+    'map_quality',
+    'obstacles',
+    'judge_feedback',
+])
+
+
+def load_feedback_inputs(mission_config, user):
+    """Loads the inputs of the feedback for the given team and mission.
 
     Args:
         mission_config: The mission to evaluate the team against.
         user: The team user object for which to evaluate and provide feedback.
-        team_eval: The team evaluation to fill.
+    Returns:
+        The FeedbackInputs for the team.
     """
-    feedback = team_eval.feedback
-
-    # Find the user's flights.
     flight_periods = TakeoffOrLandingEvent.flights(mission_config, user)
-    for period in flight_periods:
-        if period.duration() is None:
-            team_eval.warnings.append(
-                'Infinite flight period, may be missing TakeoffOrLandingEvent.'
-            )
-            break
-    uas_period_logs = [
-        UasTelemetry.dedupe(logs)
-        for logs in UasTelemetry.by_time_period(user, flight_periods)
-    ]
-    uas_logs = list(itertools.chain.from_iterable(uas_period_logs))
+    # Use the live evaluation of the telemetry if current, otherwise load the
+    # telemetry to evaluate.
+    telemetry_feedback = live_evaluation.current_feedback(
+        mission_config, user, flight_periods)
+    uas_period_logs = None
+    if telemetry_feedback is None:
+        uas_period_logs = [
+            UasTelemetry.dedupe_array(logs)
+            for logs in UasTelemetry.array_by_time_period(
+                user, flight_periods)
+        ]
+
+    try:
+        map_quality = Map.objects.get(mission_id=mission_config.pk,
+                                      user=user).quality
+    except Map.DoesNotExist:
+        map_quality = None
+
+    try:
+        judge_feedback = MissionJudgeFeedback.objects.get(
+            mission=mission_config.pk, user=user.pk).proto()
+    except MissionJudgeFeedback.DoesNotExist:
+        judge_feedback = None
+
+    return FeedbackInputs(
+        user=user,
+        flight_periods=flight_periods,
+        uas_period_logs=uas_period_logs,
+        telemetry_feedback=telemetry_feedback,
+        frame=mission_config.utm_frame(),
+        waypoints=list(mission_config.mission_waypoints.order_by('order')),
+        closest_approach=settings.WAYPOINT_CLOSEST_APPROACH,
+        fly_zone_geometry=mission_config.fly_zone_geometry(),
+        user_odlcs=list(
+            Odlc.objects.filter(user=user).filter(
+                mission=mission_config.pk).select_related('user', 'location')),
+        real_odlcs=list(mission_config.odlcs.select_related('location')),
+        map_quality=map_quality,
+        obstacles=list(mission_config.stationary_obstacles.all()),
+        judge_feedback=judge_feedback)
+
+
+def evaluate_telemetry(inputs, feedback):
+    """Evaluates the feedback from the telemetry of the team.
+
+    This fills the same feedback as LiveEvaluation.feedback.
+
+    Args:
+        inputs: The FeedbackInputs of the team, with the telemetry.
+        feedback: The auvsi_suas.proto.MissionFeedback to fill.
+    """
+    uas_period_logs = inputs.uas_period_logs
+    uas_logs = np.concatenate([UasTelemetry.as_array([])] + uas_period_logs)
 
     # Determine interop telemetry rates.
-    telem_max, telem_avg = UasTelemetry.rates(user,
-                                              flight_periods,
+    telem_max, telem_avg = UasTelemetry.rates(inputs.user,
+                                              inputs.flight_periods,
                                               time_period_logs=uas_period_logs)
     if telem_max:
         feedback.uas_telemetry_time_max_sec = telem_max
     if telem_avg:
         feedback.uas_telemetry_time_avg_sec = telem_avg
 
+    # Project the straight segments of flight once, for both waypoints and
+    # obstacles.
+    segments = UasTelemetry.segments(uas_logs, inputs.frame)
+
     # Determine if the uas hit the waypoints.
     feedback.waypoints.extend(
         UasTelemetry.satisfied_waypoints(
-            mission_config.home_pos,
-            mission_config.mission_waypoints.order_by('order'), uas_logs))
+            inputs.frame,
+            inputs.waypoints,
+            uas_logs,
+            closest_approach=inputs.closest_approach,
+            segments=segments))
+
+    # Determine time out of bounds, separately for each flight so time between
+    # flights doesn't count.
+    out_of_bounds = 0
+    out_of_bounds_time = datetime.timedelta()
+    for logs in uas_period_logs:
+        violations, violation_time = inputs.fly_zone_geometry.out_of_bounds(
+            logs)
+        out_of_bounds += violations
+        out_of_bounds_time += violation_time
+    feedback.out_of_bounds = out_of_bounds
+    feedback.out_of_bounds_time_sec = out_of_bounds_time.total_seconds()
+
+    # Determine collisions with stationary.
+    collisions = StationaryObstacle.evaluate_collisions(inputs.obstacles,
+                                                        uas_logs,
+                                                        frame=inputs.frame,
+                                                        segments=segments)
+    for obst, (hit, clearance) in zip(inputs.obstacles, collisions):
+        obst_eval = feedback.stationary_obstacles.add()
+        obst_eval.id = obst.pk
+        obst_eval.hit = hit
+        if clearance is not None:
+            obst_eval.min_clearance_ft = clearance
+
+
+def evaluate_feedback(inputs, team_eval):
+    """Evaluates mission feedback from the loaded inputs of the team.
+
+    Args:
+        inputs: The FeedbackInputs of the team.
+        team_eval: The team evaluation to fill.
+    """
+    feedback = team_eval.feedback
+
+    # Check the user's flights.
+    flight_periods = inputs.flight_periods
+    for period in flight_periods:
+        if period.duration() is None:
+            team_eval.warnings.append(
+                'Infinite flight period, may be missing TakeoffOrLandingEvent.'
+            )
+            break
+    if inputs.telemetry_feedback is not None:
+        feedback.MergeFrom(inputs.telemetry_feedback)
+    else:
+        evaluate_telemetry(inputs, feedback)
 
     # Evaluate the object detections.
-    user_odlcs = Odlc.objects.filter(user=user).filter(
-        mission=mission_config.pk).all()
-    for odlc in user_odlcs:
+    for odlc in inputs.user_odlcs:
         if odlc.thumbnail and odlc.thumbnail_approved is None:
             team_eval.warnings.append(
                 'Odlc thumbnail review not set, may need to review ODLCs.')
             break
-    evaluator = OdlcEvaluator(user_odlcs, mission_config.odlcs.all(),
+    evaluator = OdlcEvaluator(inputs.user_odlcs, inputs.real_odlcs,
                               flight_periods)
     feedback.odlc.CopyFrom(evaluator.evaluate())
 
     # Add map feedback if it exists.
-    try:
-        m = Map.objects.get(mission_id=mission_config.pk, user=user)
-        feedback.map.quality = m.quality
-    except Map.DoesNotExist:
-        pass
-
-    # Determine collisions with stationary.
-    for obst in mission_config.stationary_obstacles.all():
-        obst_eval = feedback.stationary_obstacles.add()
-        obst_eval.id = obst.pk
-        obst_eval.hit = obst.evaluate_collision_with_uas(uas_logs)
+    if inputs.map_quality is not None:
+        feedback.map.quality = inputs.map_quality
 
     # Add judge feedback.
-    try:
-        judge_feedback = MissionJudgeFeedback.objects.get(
-            mission=mission_config.pk, user=user.pk)
-        feedback.judge.CopyFrom(judge_feedback.proto())
+    if inputs.judge_feedback is not None:
+        feedback.judge.CopyFrom(inputs.judge_feedback)
         if feedback.judge.min_auto_flight_time and not flight_periods:
             team_eval.warnings.append(
                 'Min flight time achieved by no flight periods, may be missing TakeoffOrLandingEvent.'
             )
-    except MissionJudgeFeedback.DoesNotExist:
+    else:
         team_eval.warnings.append('No MissionJudgeFeedback for team.')
 
 
+def evaluation_key(mission_config, user):
+    """Cache key for the cached evaluation of the team and mission."""
+    return 'mission_evaluation:%d:%d' % (mission_config.pk, user.pk)
+
+
+def odlc_values(odlcs):
+    """Gets the values of the ODLCs, including their locations."""
+    fields = [f.attname for f in Odlc._meta.concrete_fields]
+    return list(
+        odlcs.order_by('pk').values_list(*fields, 'location__latitude',
+                                         'location__longitude'))
+
+
+def feedback_fingerprint(mission_config, user):
+    """Computes a fingerprint of the inputs of the team's feedback.
+
+    The fingerprint changes when the inputs change, so an evaluation can be
+    reused until then. Telemetry is only added, so it's fingerprinted by the
+    last and count of telemetry in each flight.
+
+    Args:
+        mission_config: The mission to evaluate the team against.
+        user: The team user object for which to evaluate and provide feedback.
+    Returns:
+        The fingerprint as a string.
+    """
+    inputs = [
+        EVALUATION_VERSION,
+        mission_config.pk,
+        MissionConfig.version(mission_config.pk),
+        settings.WAYPOINT_CLOSEST_APPROACH,
+        odlc_values(mission_config.odlcs.all()),
+    ]
+    inputs.append(
+        list(
+            TakeoffOrLandingEvent.objects.filter(
+                user=user).filter(mission=mission_config).order_by(
+                    'timestamp', 'pk').values_list('pk', 'timestamp',
+                                                   'uas_in_air')))
+    for period in TakeoffOrLandingEvent.flights(mission_config, user):
+        telemetry = UasTelemetry.by_user(user, period.start, period.end)
+        inputs.append(
+            sorted(
+                telemetry.aggregate(Max('pk'), Max('timestamp'),
+                                    Count('pk')).items()))
+    inputs.append(
+        odlc_values(
+            Odlc.objects.filter(user=user).filter(mission=mission_config)))
+    inputs.append(
+        list(
+            Map.objects.filter(mission=mission_config).filter(
+                user=user).values_list('pk', 'quality')))
+    inputs.append(
+        list(
+            MissionJudgeFeedback.objects.filter(mission=mission_config).filter(
+                user=user).values_list()))
+    return hashlib.sha256(repr(inputs).encode()).hexdigest()
+
+
+def generate_feedback(mission_config, user, team_eval):
+    """Generates mission feedback for the given team and mission.
+
+    Args:
+        mission_config: The mission to evaluate the team against.
+        user: The team user object for which to evaluate and provide feedback.
+        team_eval: The team evaluation to fill.
+    """
+    evaluate_feedback(load_feedback_inputs(mission_config, user), team_eval)
+
+
 def score_team(team_eval):
     """Generates a score from the given feedback.
 
@@ -281,23 +471,39 @@ def score_team(team_eval):
         score.score_ratio = 0
 
 
-def evaluate_teams(mission_config, users=None):
+def evaluate_teams(mission_config, users=None, progress=None):
     """Evaluates the teams (non admin users) of the competition.
 
     Args:
         mission_config: The mission to evaluate users against.
         users: Optional list of users to eval. If None will evaluate all.
+        progress: Optional function called with the list of usernames of the
+            teams to evaluate and the set of those evaluated so far, once the
+            teams are known and after each team is evaluated.
     Returns:
         A auvsi_suas.proto.MultiUserMissionEvaluation.
     """
-    # Start a results map from user to MissionEvaluation.
     mission_eval = interop_admin_api_pb2.MultiUserMissionEvaluation()
+    mission_eval.teams.extend(
+        iter_team_evaluations(mission_config, users, progress))
+    return mission_eval
+
 
+def iter_team_evaluations(mission_config, users=None, progress=None):
+    """Evaluates the teams (non admin users) of the competition one at a time.
+
+    See evaluate_teams.
+
+    Yields:
+        The auvsi_suas.proto.MissionEvaluation of each team, sorted by
+        username, as each is evaluated.
+    """
     # If not provided, eval all users.
     if users is None:
         users = User.objects.all()
 
     logger.info('Starting team evaluations.')
+    team_users = []
     for user in sorted(users, key=lambda u: u.username):
         # Ignore admins.
         if user.is_superuser:
@@ -315,16 +521,115 @@ def evaluate_teams(mission_config, users=None):
             logger.info('Filtering inactive user: %s.' % user.username)
             continue
 
-        # Start the evaluation data structure.
-        logger.info('Evaluation starting for user: %s.' % user.username)
-        team_eval = mission_eval.teams.add()
+        team_users.append(user)
+
+    # Reuse cached evaluations of teams whose inputs haven't changed.
+    cache = caches[EVALUATION_CACHE]
+    keys = [evaluation_key(mission_config, u) for u in team_users]
+    fingerprints = [
+        feedback_fingerprint(mission_config, u) for u in team_users
+    ]
+    cached = cache.get_many(keys)
+    results = []
+    for key, fingerprint in zip(keys, fingerprints):
+        entry = cached.get(key)
+        results.append(entry[1] if entry and entry[0] == fingerprint else None)
+
+    # Evaluate the remaining teams as they're reached.
+    usernames = [u.username for u in team_users]
+    evaluated = set(u.username for u, result in zip(team_users, results)
+                    if result)
+    if progress:
+        progress(usernames, evaluated)
+    missing = [u for u, result in zip(team_users, results) if result is None]
+    logger.info('Evaluating %d teams, %d cached.' %
+                (len(missing), len(results) - len(missing)))
+    evaluations = evaluate_many_teams(mission_config, missing)
+
+    for ix, user in enumerate(team_users):
+        result = results[ix]
+        if result is None:
+            result = next(evaluations)
+            cache.set(keys[ix], (fingerprints[ix], result), timeout=None)
+            if progress:
+                evaluated.add(user.username)
+                progress(usernames, evaluated)
+
+        team_eval = interop_admin_api_pb2.MissionEvaluation()
         team_eval.mission = mission_config.pk
         team_eval.team.username = user.username
         team_eval.team.name = user.first_name
         team_eval.team.university = user.last_name
-        # Generate feedback.
-        generate_feedback(mission_config, user, team_eval)
-        # Generate score from feedback.
-        score_team(team_eval)
+        team_eval.MergeFromString(result)
+        yield team_eval
 
-    return mission_eval
+
+def worker_executable():
+    """Gets the Python interpreter to spawn evaluation workers with.
+
+    Within uwsgi, sys.executable is the uwsgi binary rather than Python.
+    """
+    if os.path.basename(sys.executable).startswith('python'):
+        return sys.executable
+    return os.path.join(sys.exec_prefix, 'bin',
+                        'python%d.%d' % sys.version_info[:2])
+
+
+def evaluate_many_teams(mission_config, users):
+    """Evaluates the feedback and score of many teams.
+
+    The inputs of each team are loaded just before it's evaluated, so only the
+    inputs of the teams being evaluated are held at once. Teams are evaluated
+    concurrently if MISSION_EVALUATION_WORKERS is more than 1.
+
+    Args:
+        mission_config: The mission to evaluate the teams against.
+        users: List of the team users to evaluate.
+    Yields:
+        The serialized evaluation of each team in order. See evaluate_team.
+    """
+    team_inputs = (load_feedback_inputs(mission_config, u) for u in users)
+    workers = settings.MISSION_EVALUATION_WORKERS
+    # Daemonic processes, like those of a multiprocessing pool, can't start
+    # worker processes.
+    if workers > 1 and multiprocessing.current_process().daemon:
+        workers = 1
+    if workers <= 1 or len(users) <= 1:
+        for inputs in team_inputs:
+            yield evaluate_team(inputs)
+        return
+
+    # Workers don't access the database, but need Django set up to load the
+    # models in the inputs. Workers are spawned rather than forked, as forking
+    # a server process with other threads running can deadlock the workers.
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(worker_executable())
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=django.setup) as executor:
+        # Load one team ahead of the workers, so workers don't wait on loads.
+        pending = collections.deque()
+        for inputs in team_inputs:
+            pending.append(executor.submit(evaluate_team, inputs))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def evaluate_team(inputs):
+    """Evaluates the feedback and score of a team.
+
+    Args:
+        inputs: The FeedbackInputs of the team.
+    Returns:
+        The serialized auvsi_suas.proto.MissionEvaluation with the feedback,
+        score and warnings of the team.
+    """
+    logger.info('Evaluation starting for user: %s.' % inputs.user.username)
+    team_eval = interop_admin_api_pb2.MissionEvaluation()
+    # Generate feedback.
+    evaluate_feedback(inputs, team_eval)
+    # Generate score from feedback.
+    score_team(team_eval)
+    return team_eval.SerializeToString()
@@ -1,11 +1,21 @@
 """Tests for the mission_evaluation module."""
 
+import datetime
+import os
+import sys
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.test import TestCase
+from django.utils import timezone
+from unittest import mock
 
 from auvsi_suas.models import mission_config
 from auvsi_suas.models import mission_evaluation
 from auvsi_suas.models import test_utils
+from auvsi_suas.models.mission_judge_feedback import MissionJudgeFeedback
+from auvsi_suas.models.odlc import Odlc
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.proto import interop_admin_api_pb2
 
 
@@ -344,6 +354,9 @@ class TestMissionEvaluation(TestCase):
             self.assertGreaterEqual(obst.id, 0)
             self.assertTrue(obst.HasField('hit'))
 
+        self.assertTrue(feedback.HasField('out_of_bounds'))
+        self.assertGreaterEqual(feedback.out_of_bounds_time_sec, 0)
+
         self.assertGreater(feedback.judge.flight_time_sec, 0)
 
         timeline = score.timeline
@@ -380,6 +393,135 @@ class TestMissionEvaluation(TestCase):
 
         self.assertGreaterEqual(score.score_ratio, 0)
 
+    def test_evaluate_teams_workers(self):
+        """Tests evaluating teams in worker processes gives same results."""
+        test_utils.simulate_team_mission(self, self.mission, self.superuser,
+                                         self.user1)
+        expected = mission_evaluation.evaluate_teams(self.mission)
+        self.assertEqual(2, len(expected.teams))
+
+        # Don't reuse the cached evaluations.
+        caches[mission_evaluation.EVALUATION_CACHE].clear()
+        with self.settings(MISSION_EVALUATION_WORKERS=2):
+            mission_eval = mission_evaluation.evaluate_teams(self.mission)
+        self.assertEqual(expected, mission_eval)
+
+    def test_worker_executable(self):
+        """Tests workers are spawned with Python within uwsgi."""
+        self.assertEqual(sys.executable,
+                         mission_evaluation.worker_executable())
+        with mock.patch.object(sys, 'executable', '/usr/local/bin/uwsgi'):
+            executable = mission_evaluation.worker_executable()
+        self.assertTrue(os.path.basename(executable).startswith('python'))
+        self.assertTrue(os.path.exists(executable))
+
+    def test_evaluate_teams_cached(self):
+        """Tests evaluations are cached until the team's inputs change."""
+        expected = mission_evaluation.evaluate_teams(self.mission)
+        self.assertEqual(expected,
+                         mission_evaluation.evaluate_teams(self.mission))
+
+        # Mark the cached evaluation, to detect it's reused.
+        cache = caches[mission_evaluation.EVALUATION_CACHE]
+        key = mission_evaluation.evaluation_key(self.mission, self.user0)
+        fingerprint, result = cache.get(key)
+        team_eval = interop_admin_api_pb2.MissionEvaluation()
+        team_eval.MergeFromString(result)
+        team_eval.warnings.append('Cached.')
+        cache.set(key, (fingerprint, team_eval.SerializeToString()))
+        mission_eval = mission_evaluation.evaluate_teams(self.mission)
+        self.assertIn('Cached.', mission_eval.teams[0].warnings)
+
+        # Changed inputs are evaluated again.
+        feedback = MissionJudgeFeedback.objects.get(mission=self.mission,
+                                                    user=self.user0)
+        feedback.safety_pilot_takeovers += 1
+        feedback.save()
+        mission_eval = mission_evaluation.evaluate_teams(self.mission)
+        self.assertNotIn('Cached.', mission_eval.teams[0].warnings)
+        self.assertEqual(
+            expected.teams[0].feedback.judge.safety_pilot_takeovers + 1,
+            mission_eval.teams[0].feedback.judge.safety_pilot_takeovers)
+
+    def test_feedback_fingerprint(self):
+        """Tests the fingerprint changes with the team's inputs."""
+        fingerprint = mission_evaluation.feedback_fingerprint(
+            self.mission, self.user0)
+        self.assertEqual(
+            fingerprint,
+            mission_evaluation.feedback_fingerprint(self.mission, self.user0))
+
+        flight = TakeoffOrLandingEvent.flights(self.mission, self.user0)[0]
+        UasTelemetry(user=self.user0,
+                     timestamp=flight.start,
+                     latitude=38,
+                     longitude=-76,
+                     altitude_msl=100,
+                     uas_heading=0).save()
+        telemetry_fingerprint = mission_evaluation.feedback_fingerprint(
+            self.mission, self.user0)
+        self.assertNotEqual(fingerprint, telemetry_fingerprint)
+
+        odlc = Odlc.objects.filter(user=self.user0).first()
+        odlc.thumbnail_approved = not odlc.thumbnail_approved
+        odlc.save()
+        odlc_fingerprint = mission_evaluation.feedback_fingerprint(
+            self.mission, self.user0)
+        self.assertNotEqual(telemetry_fingerprint, odlc_fingerprint)
+
+        waypoint = self.mission.mission_waypoints.first()
+        waypoint.altitude_msl += 1
+        waypoint.save()
+        waypoint_fingerprint = mission_evaluation.feedback_fingerprint(
+            self.mission, self.user0)
+        self.assertNotEqual(odlc_fingerprint, waypoint_fingerprint)
+
+        real_odlc = self.mission.odlcs.first()
+        real_odlc.location.latitude += 0.0001
+        real_odlc.location.save()
+        self.assertNotEqual(
+            waypoint_fingerprint,
+            mission_evaluation.feedback_fingerprint(self.mission, self.user0))
+
+    def test_out_of_bounds(self):
+        """Tests out of bounds is evaluated from telemetry of each flight."""
+        now = timezone.now()
+        inside = (38.147, -76.429)
+        outside = (38.16, -76.429)
+
+        def fly(start, positions):
+            TakeoffOrLandingEvent(user=self.user1,
+                                  mission=self.mission,
+                                  timestamp=now +
+                                  datetime.timedelta(seconds=start - 1),
+                                  uas_in_air=True).save()
+            # Headings differ so the telemetry isn't deduped.
+            for i, (lat, lon) in enumerate(positions):
+                UasTelemetry(user=self.user1,
+                             timestamp=now +
+                             datetime.timedelta(seconds=start + i),
+                             latitude=lat,
+                             longitude=lon,
+                             altitude_msl=200,
+                             uas_heading=i).save()
+            TakeoffOrLandingEvent(
+                user=self.user1,
+                mission=self.mission,
+                timestamp=now +
+                datetime.timedelta(seconds=start + len(positions)),
+                uas_in_air=False).save()
+
+        # Out for 2s, counted for the debounce time. Then out for a whole
+        # flight, not counting the time between flights.
+        fly(0, [inside] * 10 + [outside] * 2 + [inside] * 18)
+        fly(100, [outside] * 5)
+
+        mission_eval = mission_evaluation.evaluate_teams(
+            self.mission, [self.user1])
+        feedback = mission_eval.teams[0].feedback
+        self.assertEqual(2, feedback.out_of_bounds)
+        self.assertAlmostEqual(14, feedback.out_of_bounds_time_sec)
+
     def test_evaluate_teams_specific_users(self):
         """Tests the evaluation of teams method with specific users."""
         mission_eval = mission_evaluation.evaluate_teams(
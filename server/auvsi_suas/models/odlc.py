@@ -2,7 +2,7 @@
 
 import enum
 import logging
-import networkx as nx
+import numpy as np
 import operator
 from auvsi_suas.models import pb_utils
 from auvsi_suas.models.gps_position import GpsPosition
@@ -29,6 +29,65 @@ ACTIONABLE_WEIGHT = 0.1
 AUTONOMY_WEIGHT = 0.1
 
 
+def max_weight_assignment(weights):
+    """Assigns rows to columns to maximize the total weight of assignments.
+
+    Solves the rectangular assignment problem with the Hungarian algorithm,
+    using shortest augmenting paths. Ties between assignments of the same
+    total weight are broken deterministically.
+
+    Args:
+        weights: 2D array of the weight of assigning each row to each column.
+    Returns:
+        A list of (row, column) pairs of the assignment. Each row is assigned
+        if there are at least as many columns as rows, else each column is.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape[0] > weights.shape[1]:
+        return sorted((r, c) for c, r in max_weight_assignment(weights.T))
+    n, m = weights.shape
+    if not n:
+        return []
+    # Minimize the non-negative cost of each assignment instead.
+    cost = weights.max() - weights
+
+    # Potentials of rows and columns, and the row assigned to each column.
+    # Arrays are indexed from 1, with index 0 for the row being assigned.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    assigned = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        assigned[0] = row
+        col = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        # Grow the tree of columns reached by shortest alternating paths from
+        # the row, until reaching an unassigned column.
+        while True:
+            used[col] = True
+            reduced = cost[assigned[col] - 1] - u[assigned[col]] - v[1:]
+            shorter = ~used[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][shorter] = reduced[shorter]
+            way[1:][shorter] = col
+            free = np.flatnonzero(~used[1:]) + 1
+            next_col = free[np.argmin(min_reduced[free])]
+            delta = min_reduced[next_col]
+            u[assigned[used]] += delta
+            v[used] -= delta
+            min_reduced[~used] -= delta
+            col = next_col
+            if not assigned[col]:
+                break
+        # Augment the assignment along the path to the column.
+        while col:
+            prev_col = way[col]
+            assigned[col] = assigned[prev_col]
+            col = prev_col
+
+    return [(assigned[c] - 1, c - 1) for c in range(1, m + 1) if assigned[c]]
+
+
 class Odlc(models.Model):
     """Object detection submission for a team."""
 
@@ -201,6 +260,9 @@ class OdlcEvaluator(object):
                     raise AssertionError(
                         "All submitted objects must be from the same user")
 
+        # Match evaluations of each pair of objects, computed on first use.
+        self.match_evals = {}
+
         self.matches = self.match_odlcs(submitted_objects, real_objects)
         self.unmatched = self.find_unmatched(submitted_objects, real_objects,
                                              self.matches)
@@ -285,6 +347,50 @@ class OdlcEvaluator(object):
 
         return object_eval
 
+    def cached_evaluate_match(self, submitted, real):
+        """Evaluates the match as evaluate_match, once for each pair.
+
+        The returned evaluation is shared, so must not be modified.
+        """
+        key = (submitted, real)
+        object_eval = self.match_evals.get(key)
+        if object_eval is None:
+            object_eval = self.evaluate_match(submitted, real)
+            self.match_evals[key] = object_eval
+        return object_eval
+
+    def match_weights(self, submitted_objects, real_objects, weight):
+        """Computes the weight matrix of matching submitted to real objects.
+
+        Args:
+            submitted_objects: List of submitted object detections.
+            real_objects: List of real objects made by judges.
+            weight: Function of the submitted object, real object and their
+                match evaluation to the weight of matching them.
+        Returns:
+            Array of the weights by submitted object and real object.
+        """
+        return np.array([[
+            weight(submitted, real, self.cached_evaluate_match(
+                submitted, real)) for real in real_objects
+        ] for submitted in submitted_objects],
+                        dtype=np.float64).reshape(len(submitted_objects),
+                                                  len(real_objects))
+
+    def max_weight_matching(self, submitted_objects, real_objects, weights):
+        """Matches objects to maximize the total weight of matches.
+
+        Args:
+            submitted_objects: List of submitted object detections.
+            real_objects: List of real objects made by judges.
+            weights: Array of the weights by submitted object and real object.
+                Objects with no weight are never matched.
+        Returns:
+            A list of matched (submitted, real) pairs.
+        """
+        return [(submitted_objects[s], real_objects[r])
+                for s, r in max_weight_assignment(weights) if weights[s, r]]
+
     def matching_map_from_set(self, matched_set):
         """Converts mapping set-of-pairs format to a map format."""
         matches = {}
@@ -303,19 +409,13 @@ class OdlcEvaluator(object):
             A map from submitted object to real object, and real object to
             submitted object, if they are matched.
         """
-        # Create a bipartite graph from submitted to real objects with match
-        # values (score ratio) as edge weights. Skip edges with no match value.
-        g = nx.Graph()
-        g.add_nodes_from(submitted_objects)
-        g.add_nodes_from(real_objects)
-        for submitted in submitted_objects:
-            for real in real_objects:
-                match_value = self.evaluate_match(submitted, real).score_ratio
-                if match_value:
-                    g.add_edge(submitted, real, weight=match_value)
+        # Weight matches by match value (score ratio). Objects with no match
+        # value aren't matched.
+        weights = self.match_weights(submitted_objects, real_objects,
+                                     lambda s, r, e: e.score_ratio)
         # Compute the full matching.
         return self.matching_map_from_set(
-            nx.algorithms.matching.max_weight_matching(g))
+            self.max_weight_matching(submitted_objects, real_objects, weights))
 
     def find_unmatched(self, submitted_objects, real_objects, matches):
         """Finds unmatched objects, filtering double-counts by autonomy.
@@ -328,26 +428,22 @@ class OdlcEvaluator(object):
             List of objects which are unmatched after filtering autonomy
             duplicates.
         """
-        # Create a bipartite graph from unsubmitted to real objects with match
-        # values (score ratio) as edge weights. Skip edges with no match value.
-        # Skip edges if not inverse autonomy for existing match.
+        # Match unsubmitted to real objects which have match value. Skip
+        # matches if not inverse autonomy for existing match.
         remaining_objects = [t for t in submitted_objects if t not in matches]
-        g = nx.Graph()
-        g.add_nodes_from(remaining_objects)
-        g.add_nodes_from(real_objects)
-        for submitted in remaining_objects:
-            for real in real_objects:
-                match_value = self.evaluate_match(submitted, real).score_ratio
-                inverted_autonomy = (
-                    real in matches
-                    and submitted.autonomous != matches[real].autonomous)
-                if match_value and inverted_autonomy:
-                    # We care about minimizing unmatched, not match weight, so
-                    # use weight of 1.
-                    g.add_edge(submitted, real, weight=1)
+
+        def weight(submitted, real, object_eval):
+            inverted_autonomy = (
+                real in matches
+                and submitted.autonomous != matches[real].autonomous)
+            # We care about minimizing unmatched, not match weight, so use
+            # weight of 1.
+            return 1 if object_eval.score_ratio and inverted_autonomy else 0
+
+        weights = self.match_weights(remaining_objects, real_objects, weight)
         # Compute the matching to find unused objects.
         unused_match = self.matching_map_from_set(
-            nx.algorithms.matching.max_weight_matching(g))
+            self.max_weight_matching(remaining_objects, real_objects, weights))
         # Difference between remaining and unused is unmatched.
         return [t for t in remaining_objects if t not in unused_match]
 
@@ -365,7 +461,8 @@ class OdlcEvaluator(object):
             object_eval.score_ratio = 0
             submitted = self.matches.get(real)
             if submitted:
-                object_eval.CopyFrom(self.evaluate_match(submitted, real))
+                object_eval.CopyFrom(
+                    self.cached_evaluate_match(submitted, real))
         if self.real_objects:
             multi_eval.matched_score_ratio = sum(
                 [e.score_ratio
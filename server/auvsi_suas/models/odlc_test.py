@@ -1,11 +1,14 @@
 """Tests for the odlc module."""
 
+import itertools
 import os.path
+import random
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.mission_config import MissionConfig
 from auvsi_suas.models.odlc import Odlc
 from auvsi_suas.models.odlc import OdlcEvaluator
+from auvsi_suas.models.odlc import max_weight_assignment
 from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
 from auvsi_suas.models.waypoint import Waypoint
 from auvsi_suas.proto import interop_api_pb2
@@ -15,6 +18,36 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 
 
+class TestMaxWeightAssignment(TestCase):
+    """Tests the max_weight_assignment function."""
+    def test_empty(self):
+        """Tests assignment with no rows or columns."""
+        self.assertEqual([], max_weight_assignment([[]]))
+        self.assertEqual([], max_weight_assignment([[], []]))
+
+    def test_assignment(self):
+        """Tests assignments maximize weight, compared to brute force."""
+        rand = random.Random(0)
+        for _ in range(200):
+            rows, cols = rand.randint(1, 5), rand.randint(1, 5)
+            weights = [[
+                rand.choice([0, 0.5, 1, rand.random()]) for _ in range(cols)
+            ] for _ in range(rows)]
+            assignment = max_weight_assignment(weights)
+
+            self.assertEqual(min(rows, cols), len(assignment))
+            self.assertEqual(len(assignment),
+                             len(set(r for r, _ in assignment)))
+            self.assertEqual(len(assignment),
+                             len(set(c for _, c in assignment)))
+            best = max(
+                sum(weights[r][c] for r, c in zip(rs, cs))
+                for rs in itertools.permutations(range(rows))
+                for cs in itertools.permutations(range(cols)))
+            self.assertAlmostEqual(best,
+                                   sum(weights[r][c] for r, c in assignment))
+
+
 class TestOdlc(TestCase):
     """Tests for the Odlc model."""
     def setUp(self):
@@ -604,6 +637,22 @@ class TestOdlcEvaluator(TestCase):
                 self.real6: self.submit6,
             }, e.match_odlcs(self.submitted_odlcs, self.real_odlcs))
 
+    def test_match_evaluated_once(self):
+        """Tests that each pair of odlcs is evaluated once."""
+        evaluated = []
+
+        class CountingEvaluator(OdlcEvaluator):
+            def evaluate_match(self, submitted, real):
+                evaluated.append((submitted, real))
+                return super(CountingEvaluator,
+                             self).evaluate_match(submitted, real)
+
+        CountingEvaluator(self.submitted_odlcs, self.real_odlcs,
+                          self.flights).evaluate()
+        self.assertEqual(
+            len(self.submitted_odlcs) * len(self.real_odlcs), len(evaluated))
+        self.assertEqual(len(evaluated), len(set(evaluated)))
+
     def test_evaluate(self):
         """Tests that the evaluation is generated correctly."""
         e = OdlcEvaluator(self.submitted_odlcs, self.real_odlcs, self.flights)
@@ -0,0 +1,56 @@
+"""Access to the cache shared by all server processes."""
+
+import time
+from django.core.cache import caches
+
+# Alias of the cache shared by all server processes.
+SHARED_CACHE = 'shared'
+
+
+def cache():
+    """Gets the cache shared by all server processes."""
+    return caches[SHARED_CACHE]
+
+
+def version(key):
+    """Gets the version counter stored at key.
+
+    Args:
+        key: The cache key of the version counter.
+    Returns:
+        The version, which changes each time it is incremented.
+    """
+    current = cache().get(key)
+    if current is None:
+        # Start from the time, so versions aren't reused if the cache is lost.
+        cache().add(key, int(time.time() * 1000), timeout=None)
+        current = cache().get(key)
+    return current
+
+
+def versions(keys):
+    """Gets the version counters stored at keys. See version.
+
+    Args:
+        keys: The cache keys of the version counters.
+    Returns:
+        Dict from key to the version.
+    """
+    current = cache().get_many(keys)
+    for key in keys:
+        if key not in current:
+            current[key] = version(key)
+    return current
+
+
+def increment_version(key):
+    """Increments the version counter stored at key.
+
+    Returns:
+        The new version, or None if the version is missing.
+    """
+    try:
+        return cache().incr(key)
+    except ValueError:
+        # Version is missing, so the next get starts a new version.
+        return None
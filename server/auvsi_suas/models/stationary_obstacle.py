@@ -1,7 +1,11 @@
 """Stationary obstacle model."""
 
 import logging
+import math
+import numpy as np
+from auvsi_suas.models import distance
 from auvsi_suas.models.gps_position import GpsPositionMixin
+from auvsi_suas.models.uas_telemetry import TELEMETRY_INTERPOLATION_MAX_GAP
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from django.contrib import admin
 from django.core import validators
@@ -12,6 +16,46 @@ logger = logging.getLogger(__name__)
 STATIONARY_OBSTACLE_RADIUS_FT_MIN = 30
 STATIONARY_OBSTACLE_RAIDUS_FT_MAX = 300
 
+# Number of golden section iterations to find the closest approach of a
+# segment of flight, which narrows it to within 1e-10 of the segment.
+CLEARANCE_SEARCH_ITERATIONS = 50
+
+
+def segment_clearance(t, x, y, z, dx, dy, dz, radius, height):
+    """Computes the clearance of points along segments from obstacles.
+
+    Positions are relative to the center of the obstacle at ground level.
+
+    Args:
+        t: The fraction along the segments of the points.
+        x, y, z: The start of the segments in feet.
+        dx, dy, dz: The vectors from start to end of the segments in feet.
+        radius: The radius of the obstacles in feet.
+        height: The height of the obstacles in feet.
+    Returns:
+        The distance in feet from the points to the obstacles, or zero if
+        within the obstacles.
+    """
+    r = np.hypot(x + t * dx, y + t * dy)
+    return np.hypot(np.maximum(r - radius, 0),
+                    np.maximum(z + t * dz - height, 0))
+
+
+def closest_to_axis(x, y, dx, dy, lo, hi):
+    """Finds the points along segments closest to the axis of obstacles.
+
+    Args:
+        x, y: The start of the segments relative to the obstacles.
+        dx, dy: The vectors from start to end of the segments.
+        lo, hi: The range of fractions along the segments to search.
+    Returns:
+        The fraction along the segments of the closest points.
+    """
+    length_sq = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length_sq > 0, -(x * dx + y * dy) / length_sq, 0)
+    return np.clip(t, lo, hi)
+
 
 class StationaryObstacle(GpsPositionMixin):
     """A stationary obstacle that teams must avoid."""
@@ -50,10 +94,111 @@ class StationaryObstacle(GpsPositionMixin):
             Whether a UAS telemetry log reported indicates a collision with the
             obstacle.
         """
-        for log in UasTelemetry.interpolate(uas_telemetry_logs):
-            if self.contains_pos(log):
-                return True
-        return False
+        hit, _ = self.evaluate_collisions([self], uas_telemetry_logs)[0]
+        return hit
+
+    @classmethod
+    def evaluate_collisions(cls,
+                            obstacles,
+                            uas_telemetry_logs,
+                            max_gap=TELEMETRY_INTERPOLATION_MAX_GAP,
+                            frame=None,
+                            segments=None,
+                            clearances=None):
+        """Evaluates collisions of the UAS with each of the obstacles.
+
+        The UAS is assumed to fly straight between telemetry at most max_gap
+        apart, as in UasTelemetry.interpolate. Rather than sampling along each
+        segment of flight, the closest approach of each segment to each
+        obstacle is computed in a projected frame.
+
+        Args:
+            obstacles: A list of StationaryObstacle to evaluate.
+            uas_telemetry_logs: A list of UasTelemetry logs, or a telemetry
+                array, sorted by timestamp for which to evaluate.
+            max_gap: The max time between telemetry to fly straight between.
+            frame: Optional. The distance.UtmFrame to project to. If None,
+                will project to the UTM zone of the obstacles.
+            segments: Optional. The segments of the telemetry projected to
+                the frame, as given by UasTelemetry.segments.
+            clearances: Optional. A list of the closest approach of other
+                flight to each obstacle, or None, to include in the closest
+                approach. Segments which can't come closer aren't searched.
+        Returns:
+            A list with a tuple for each obstacle of whether the UAS collided
+            with the obstacle, and the closest approach of the UAS to the
+            obstacle in feet or None if there is no telemetry.
+        """
+        if not obstacles:
+            return []
+        # Project to feet in the frame.
+        if frame is None:
+            frame = distance.UtmFrame.around(obstacles[0])
+        if segments is None:
+            segments = UasTelemetry.segments(uas_telemetry_logs, frame,
+                                             max_gap)
+        starts, ends = segments
+        if clearances is None:
+            clearances = [None for _ in obstacles]
+        if not len(starts):
+            return [(False, c) for c in clearances]
+        x, y, z = starts.T
+        obst_x, obst_y = frame.project([o.latitude for o in obstacles],
+                                       [o.longitude for o in obstacles])
+        radius = np.array([o.cylinder_radius for o in obstacles])
+        height = np.array([o.cylinder_height for o in obstacles])
+
+        # Arrays of segments by obstacles, relative to the obstacles.
+        seg_x = x[:, np.newaxis] - obst_x
+        seg_y = y[:, np.newaxis] - obst_y
+        seg_z = z[:, np.newaxis]
+        seg_dx, seg_dy, seg_dz = (ends - starts).T[:, :, np.newaxis]
+
+        # A segment hits an obstacle if the part of it at or below the top of
+        # the obstacle comes within the radius of the obstacle.
+        below = np.minimum(seg_z, seg_z + seg_dz) <= height
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_top = (height - seg_z) / seg_dz
+        lo = np.where(seg_dz < 0, np.clip(t_top, 0, 1), 0)
+        hi = np.where(seg_dz > 0, np.clip(t_top, 0, 1), 1)
+        t = closest_to_axis(seg_x, seg_y, seg_dx, seg_dy, lo, hi)
+        hits = below & (np.hypot(seg_x + t * seg_dx, seg_y + t * seg_dy) <=
+                        radius)
+
+        # Bound the clearance of each segment, which is convex along the
+        # segment, then search segments which may be closer than the best.
+        args = (seg_x, seg_y, seg_z, seg_dx, seg_dy, seg_dz, radius, height)
+        t = closest_to_axis(seg_x, seg_y, seg_dx, seg_dy, 0, 1)
+        upper = np.minimum.reduce([
+            segment_clearance(0, *args),
+            segment_clearance(1, *args),
+            segment_clearance(t, *args),
+        ])
+        upper[hits] = 0
+        closest = np.minimum(upper.min(axis=0),
+                             [np.inf if c is None else c for c in clearances])
+        r_min = np.hypot(seg_x + t * seg_dx, seg_y + t * seg_dy)
+        lower = np.hypot(
+            np.maximum(r_min - radius, 0),
+            np.maximum(np.minimum(seg_z, seg_z + seg_dz) - height, 0))
+        seg_ix, obst_ix = np.nonzero(lower < closest)
+        if len(seg_ix):
+            args = tuple(
+                np.broadcast_to(a, hits.shape)[seg_ix, obst_ix] for a in args)
+            a = np.zeros(len(seg_ix))
+            b = np.ones(len(seg_ix))
+            inv_phi = (math.sqrt(5) - 1) / 2
+            for _ in range(CLEARANCE_SEARCH_ITERATIONS):
+                c = b - inv_phi * (b - a)
+                d = a + inv_phi * (b - a)
+                left = segment_clearance(c, *args) < segment_clearance(
+                    d, *args)
+                b = np.where(left, d, b)
+                a = np.where(left, a, c)
+            np.minimum.at(closest, obst_ix,
+                          segment_clearance((a + b) / 2, *args))
+
+        return list(zip(hits.any(axis=0).tolist(), closest.tolist()))
 
 
 @admin.register(StationaryObstacle)
@@ -37,7 +37,7 @@ class TestStationaryObstacleModel(TestCase):
             log.altitude_msl = alt
             log.uas_heading = 0
             if i > 0:
-                log.timetamp = ret[i - 1].timestamp + timedelta(seconds=1)
+                log.timestamp = ret[i - 1].timestamp + timedelta(seconds=1)
             log.save()
             ret.append(log)
 
@@ -140,3 +140,61 @@ class TestStationaryObstacleModel(TestCase):
             (45.4338393, -71.8523446, 769.881926415),
         ])
         self.assertFalse(obst.evaluate_collision_with_uas(logs))
+
+    def test_evaluate_collisions(self):
+        """Tests the collisions and clearance with multiple obstacles."""
+        obsts = [
+            StationaryObstacle(latitude=38,
+                               longitude=-76,
+                               cylinder_radius=30,
+                               cylinder_height=500),
+            StationaryObstacle(latitude=38.0005,
+                               longitude=-76.001,
+                               cylinder_radius=50,
+                               cylinder_height=100),
+        ]
+        for obst in obsts:
+            obst.save()
+
+        # Fly through the first obstacle between samples of interpolation.
+        logs = self.create_uas_logs(self.user, [
+            (37.9944, -76, 100),
+            (38.0054, -76, 100),
+        ])
+        collisions = StationaryObstacle.evaluate_collisions(obsts, logs)
+        self.assertEqual(True, collisions[0][0])
+        self.assertEqual(0, collisions[0][1])
+        self.assertEqual(False, collisions[1][0])
+
+        # Pass over the top of the second obstacle.
+        logs = self.create_uas_logs(self.user, [
+            (38.0005, -76.002, 150),
+            (38.0005, -76.000, 150),
+        ])
+        collisions = StationaryObstacle.evaluate_collisions(obsts, logs)
+        self.assertEqual(False, collisions[1][0])
+        self.assertAlmostEqual(50, collisions[1][1], delta=0.1)
+        self.assertEqual(False, collisions[0][0])
+
+        # Pass to the side of the second obstacle, 0.0008 degrees is 291 ft.
+        logs = self.create_uas_logs(self.user, [
+            (38.0013, -76.002, 50),
+            (38.0013, -76.000, 50),
+        ])
+        collisions = StationaryObstacle.evaluate_collisions(obsts, logs)
+        self.assertEqual([False, False], [c[0] for c in collisions])
+        self.assertAlmostEqual(241, collisions[1][1], delta=2)
+
+        # Don't assume straight flight over large gaps in telemetry.
+        logs = self.create_uas_logs(self.user, [
+            (37.9944, -76, 100),
+            (38.0054, -76, 100),
+        ])
+        logs[1].timestamp = logs[0].timestamp + timedelta(seconds=10)
+        collisions = StationaryObstacle.evaluate_collisions(obsts, logs)
+        self.assertEqual([False, False], [c[0] for c in collisions])
+        self.assertAlmostEqual(1936, collisions[0][1], delta=5)
+
+        # No telemetry to evaluate.
+        self.assertEqual([(False, None), (False, None)],
+                         StationaryObstacle.evaluate_collisions(obsts, []))
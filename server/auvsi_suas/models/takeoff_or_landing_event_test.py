@@ -8,6 +8,7 @@ from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
 from auvsi_suas.models.time_period import TimePeriod
 from auvsi_suas.models.waypoint import Waypoint
 from auvsi_suas.models.access_log_test import TestAccessLogMixinCommon
+from django.contrib.auth.models import User
 
 
 class TestTakeoffOrLandingEventModel(TestAccessLogMixinCommon):
@@ -229,3 +230,20 @@ class TestTakeoffOrLandingEventModel(TestAccessLogMixinCommon):
 
         self.assertTrue(
             TakeoffOrLandingEvent.user_in_air(self.user1, time=time))
+
+    def test_users_in_air(self):
+        """In-air status of multiple users."""
+        self.create_event(self.year2000, True)
+        self.create_event(self.year2000 + self.ten_minutes, False)
+        self.create_event(self.year2001, True)
+        user3 = User.objects.create_user('user3', 'email@example.com', 'pass')
+
+        with self.assertNumQueries(1):
+            in_air = TakeoffOrLandingEvent.users_in_air(
+                [self.user1, self.user2, user3])
+        self.assertEqual(
+            {
+                self.user1.pk: True,
+                self.user2.pk: False,
+                user3.pk: False,
+            }, in_air)
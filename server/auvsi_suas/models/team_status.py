@@ -0,0 +1,215 @@
+"""Snapshot of the latest status of each team.
+
+The snapshot is kept in the cache shared by all server processes, and is
+updated as telemetry and takeoff or landing events are stored. This lets the
+status of teams be served without querying telemetry or events.
+"""
+
+import logging
+from auvsi_suas.models import shared_cache
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Cache key for the version of the snapshot.
+VERSION_KEY = 'team_status:version'
+# Cache key for the version of the set of users.
+USERS_VERSION_KEY = 'team_status:users_version'
+
+
+def telemetry_key(user_id):
+    """Cache key for the latest telemetry of the user."""
+    return 'team_status:telemetry:%d' % user_id
+
+
+def in_air_key(user_id):
+    """Cache key for the in air status of the user."""
+    return 'team_status:in_air:%d' % user_id
+
+
+def user_version_key(user_id):
+    """Cache key for the version of the status of the user."""
+    return 'team_status:user_version:%d' % user_id
+
+
+def version():
+    """Gets the version of the snapshot, which changes on each update.
+
+    Changes to teams themselves also change the version.
+    """
+    return shared_cache.version(VERSION_KEY)
+
+
+def users_version():
+    """Gets the version of the set of users, which changes as users change."""
+    return shared_cache.version(USERS_VERSION_KEY)
+
+
+def user_versions(user_ids):
+    """Gets the versions of the status of the users.
+
+    Args:
+        user_ids: IDs of the users.
+    Returns:
+        Dict from user ID to the version of the user's status, which changes
+        each time the user's status changes.
+    """
+    current = shared_cache.versions([user_version_key(u) for u in user_ids])
+    return {u: current[user_version_key(u)] for u in user_ids}
+
+
+def increment_version(user_ids=(), users_changed=False):
+    """Increments the version of the snapshot.
+
+    The versions of the users are incremented before the version of the
+    snapshot, so readers that see the new snapshot version also see the new
+    versions of the users.
+
+    Args:
+        user_ids: IDs of the users whose status changed.
+        users_changed: Whether users were added, edited or deleted.
+    """
+    if users_changed:
+        shared_cache.increment_version(USERS_VERSION_KEY)
+    for user_id in user_ids:
+        shared_cache.increment_version(user_version_key(user_id))
+    shared_cache.increment_version(VERSION_KEY)
+
+
+def telemetry_to_entry(telemetry):
+    """Converts the telemetry, which may be None, to a cache entry."""
+    if telemetry is None:
+        return {}
+    return {
+        'pk': telemetry.pk,
+        'user_id': telemetry.user_id,
+        'timestamp': telemetry.timestamp,
+        'latitude': telemetry.latitude,
+        'longitude': telemetry.longitude,
+        'altitude_msl': telemetry.altitude_msl,
+        'uas_heading': telemetry.uas_heading,
+    }
+
+
+def telemetry_from_entry(entry):
+    """Converts a cache entry to unsaved telemetry, or None if no telemetry."""
+    if not entry:
+        return None
+    return UasTelemetry(**entry)
+
+
+def get_many(users):
+    """Gets the status of the users.
+
+    Status missing from the snapshot is loaded and added to the snapshot.
+
+    Args:
+        users: List of users to get status for.
+    Returns:
+        Dict from user ID to a tuple of whether the user is in air, and the
+        user's latest telemetry or None.
+    """
+    cache = shared_cache.cache()
+    keys = []
+    for user in users:
+        keys.append(in_air_key(user.pk))
+        keys.append(telemetry_key(user.pk))
+    cached = cache.get_many(keys)
+
+    # Load missing status with a query for each kind of status, so the number
+    # of queries is independent of the number of users.
+    missing_in_air = [u for u in users if in_air_key(u.pk) not in cached]
+    if missing_in_air:
+        in_air = TakeoffOrLandingEvent.users_in_air(missing_in_air)
+        for user in missing_in_air:
+            key = in_air_key(user.pk)
+            cached[key] = in_air[user.pk]
+            # Don't replace status set by a concurrent update.
+            cache.add(key, cached[key], timeout=None)
+    missing_telemetry = [u for u in users if telemetry_key(u.pk) not in cached]
+    if missing_telemetry:
+        telemetry = UasTelemetry.last_for_users(missing_telemetry)
+        for user in missing_telemetry:
+            key = telemetry_key(user.pk)
+            cached[key] = telemetry_to_entry(telemetry.get(user.pk))
+            cache.add(key, cached[key], timeout=None)
+
+    return {
+        u.pk: (cached[in_air_key(u.pk)],
+               telemetry_from_entry(cached[telemetry_key(u.pk)]))
+        for u in users
+    }
+
+
+def get(user):
+    """Gets the status of the user. See get_many."""
+    return get_many([user])[user.pk]
+
+
+def update_telemetry(telemetry):
+    """Updates the snapshot with stored telemetry.
+
+    Telemetry older than that already in the snapshot is ignored, so batches
+    may be stored out of order.
+
+    Args:
+        telemetry: List of stored UasTelemetry.
+    """
+    latest = {}
+    for t in telemetry:
+        prev = latest.get(t.user_id)
+        if prev is None or t.timestamp >= prev.timestamp:
+            latest[t.user_id] = t
+    if not latest:
+        return
+
+    cache = shared_cache.cache()
+    cached = cache.get_many([telemetry_key(user_id) for user_id in latest])
+    updates = {}
+    updated_ids = []
+    for user_id, t in latest.items():
+        key = telemetry_key(user_id)
+        entry = cached.get(key)
+        if entry and entry['timestamp'] > t.timestamp:
+            continue
+        updates[key] = telemetry_to_entry(t)
+        updated_ids.append(user_id)
+    if updates:
+        cache.set_many(updates, timeout=None)
+        increment_version(updated_ids)
+
+
+@receiver(post_save, sender=UasTelemetry)
+def telemetry_saved(sender, instance, created, **kwargs):
+    if created:
+        update_telemetry([instance])
+    else:
+        # Edits may change which telemetry is latest, so reload on next get.
+        shared_cache.cache().delete(telemetry_key(instance.user_id))
+        increment_version([instance.user_id])
+
+
+@receiver(post_delete, sender=UasTelemetry)
+def telemetry_deleted(sender, instance, **kwargs):
+    shared_cache.cache().delete(telemetry_key(instance.user_id))
+    increment_version([instance.user_id])
+
+
+@receiver(post_save, sender=TakeoffOrLandingEvent)
+@receiver(post_delete, sender=TakeoffOrLandingEvent)
+def event_changed(sender, instance, **kwargs):
+    shared_cache.cache().set(in_air_key(instance.user_id),
+                             TakeoffOrLandingEvent.user_in_air(instance.user),
+                             timeout=None)
+    increment_version([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    increment_version([instance.pk], users_changed=True)
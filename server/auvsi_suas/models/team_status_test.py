@@ -0,0 +1,152 @@
+"""Tests for the team_status module."""
+
+import datetime
+from auvsi_suas.models import team_status
+from auvsi_suas.models.gps_position import GpsPosition
+from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+
+class TestTeamStatus(TestCase):
+    """Tests the team status snapshot."""
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'testemail@x.com',
+                                             'testpass')
+        self.user.save()
+
+        pos = GpsPosition(latitude=10, longitude=100)
+        pos.save()
+        self.mission = MissionConfig()
+        self.mission.home_pos = pos
+        self.mission.lost_comms_pos = pos
+        self.mission.emergent_last_known_pos = pos
+        self.mission.off_axis_odlc_pos = pos
+        self.mission.map_center_pos = pos
+        self.mission.map_height_ft = 1
+        self.mission.air_drop_pos = pos
+        self.mission.ugv_drive_pos = pos
+        self.mission.save()
+
+        self.now = timezone.now()
+
+    def create_telemetry(self, dt, lat):
+        return UasTelemetry(user=self.user,
+                            timestamp=self.now +
+                            datetime.timedelta(seconds=dt),
+                            latitude=lat,
+                            longitude=-76,
+                            altitude_msl=100,
+                            uas_heading=90)
+
+    def test_no_data(self):
+        """Tests status of a user without telemetry or events."""
+        self.assertEqual((False, None), team_status.get(self.user))
+        with self.assertNumQueries(0):
+            self.assertEqual((False, None), team_status.get(self.user))
+
+    def test_telemetry_save(self):
+        """Tests saved telemetry updates the snapshot."""
+        team_status.get(self.user)
+
+        telem = self.create_telemetry(0, 38)
+        telem.save()
+        with self.assertNumQueries(0):
+            in_air, latest = team_status.get(self.user)
+        self.assertFalse(in_air)
+        self.assertEqual(telem.pk, latest.pk)
+        self.assertEqual(self.user.pk, latest.user_id)
+        self.assertEqual(self.now, latest.timestamp)
+        self.assertEqual(38, latest.latitude)
+        self.assertEqual(-76, latest.longitude)
+        self.assertEqual(100, latest.altitude_msl)
+        self.assertEqual(90, latest.uas_heading)
+
+        telem.delete()
+        self.assertEqual((False, None), team_status.get(self.user))
+
+    def test_update_telemetry_out_of_order(self):
+        """Tests older telemetry doesn't replace newer telemetry."""
+        newer = self.create_telemetry(2, 39)
+        older = [self.create_telemetry(0, 37), self.create_telemetry(1, 38)]
+        UasTelemetry.objects.bulk_create([newer])
+        team_status.update_telemetry([newer])
+        UasTelemetry.objects.bulk_create(older)
+        team_status.update_telemetry(older)
+
+        _, latest = team_status.get(self.user)
+        self.assertEqual(newer.pk, latest.pk)
+        self.assertEqual(39, latest.latitude)
+
+    def test_event_save(self):
+        """Tests saved events update the snapshot."""
+        team_status.get(self.user)
+
+        event = TakeoffOrLandingEvent(user=self.user,
+                                      mission=self.mission,
+                                      uas_in_air=True)
+        event.save()
+        with self.assertNumQueries(0):
+            self.assertEqual((True, None), team_status.get(self.user))
+
+        event.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual((False, None), team_status.get(self.user))
+
+    def test_get_many(self):
+        """Tests getting status of multiple users."""
+        other = User.objects.create_user('other', 'testemail@x.com',
+                                         'testpass')
+        self.create_telemetry(0, 38).save()
+
+        status = team_status.get_many([self.user, other])
+        self.assertEqual(38, status[self.user.pk][1].latitude)
+        self.assertEqual((False, None), status[other.pk])
+
+    def test_version(self):
+        """Tests the version changes with each update."""
+        v1 = team_status.version()
+        self.assertEqual(v1, team_status.version())
+
+        self.create_telemetry(0, 38).save()
+        v2 = team_status.version()
+        self.assertNotEqual(v1, v2)
+
+        TakeoffOrLandingEvent(user=self.user,
+                              mission=self.mission,
+                              uas_in_air=True).save()
+        v3 = team_status.version()
+        self.assertNotEqual(v2, v3)
+
+        User.objects.create_user('other', 'testemail@x.com', 'testpass')
+        self.assertNotEqual(v3, team_status.version())
+
+    def test_user_versions(self):
+        """Tests the versions of users change with their status."""
+        other = User.objects.create_user('other', 'testemail@x.com',
+                                         'testpass')
+        ids = [self.user.pk, other.pk]
+        v1 = team_status.user_versions(ids)
+        users_v1 = team_status.users_version()
+
+        self.create_telemetry(0, 38).save()
+        v2 = team_status.user_versions(ids)
+        self.assertNotEqual(v1[self.user.pk], v2[self.user.pk])
+        self.assertEqual(v1[other.pk], v2[other.pk])
+
+        TakeoffOrLandingEvent(user=other,
+                              mission=self.mission,
+                              uas_in_air=True).save()
+        v3 = team_status.user_versions(ids)
+        self.assertEqual(v2[self.user.pk], v3[self.user.pk])
+        self.assertNotEqual(v2[other.pk], v3[other.pk])
+        self.assertEqual(users_v1, team_status.users_version())
+
+        # Changes to users change the version of the set of users.
+        other.save()
+        self.assertNotEqual(v3[other.pk],
+                            team_status.user_versions(ids)[other.pk])
+        self.assertNotEqual(users_v1, team_status.users_version())
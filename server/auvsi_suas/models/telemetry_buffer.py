@@ -0,0 +1,357 @@
+"""Write-behind buffer for UAS telemetry.
+
+Uploaded telemetry is queued in process and inserted into the database in
+batches by a background thread, which decouples request latency from database
+commit latency. Telemetry which can't be queued or inserted is spooled to disk
+and inserted once the database recovers.
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from auvsi_suas.models import live_alerts
+from auvsi_suas.models import live_evaluation
+from auvsi_suas.models import team_status
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from django import db
+from django.conf import settings
+from django.db import transaction
+from django.utils import dateparse
+
+logger = logging.getLogger(__name__)
+
+# Max time between flushes of buffered telemetry.
+FLUSH_INTERVAL_SEC = 0.1
+# Number of buffered telemetry which triggers an early flush.
+FLUSH_SIZE = 500
+# Max number of telemetry buffered in memory. Telemetry added to a full buffer
+# is spooled to disk instead.
+MAX_SIZE = 10000
+# Directory within MEDIA_ROOT to spool telemetry.
+SPOOL_DIR = 'telemetry_spool'
+# Extension of spool files awaiting insertion.
+SPOOL_EXT = '.jsonl'
+# Directory within the spool directory for telemetry which can't be inserted.
+DEAD_LETTER_DIR = 'dead'
+# Number of times a spool file is rejected by the database before it's moved
+# to the dead letter directory.
+REPLAY_ATTEMPTS = 3
+
+
+def telemetry_to_spool(telemetry):
+    """Converts unsaved telemetry to a JSON line for the spool."""
+    return json.dumps({
+        'user_id': telemetry.user_id,
+        'timestamp': telemetry.timestamp.isoformat(),
+        'latitude': telemetry.latitude,
+        'longitude': telemetry.longitude,
+        'altitude_msl': telemetry.altitude_msl,
+        'uas_heading': telemetry.uas_heading,
+    }) + '\n'
+
+
+def telemetry_from_spool(line):
+    """Converts a JSON line from the spool to unsaved telemetry."""
+    fields = json.loads(line)
+    fields['timestamp'] = dateparse.parse_datetime(fields['timestamp'])
+    return UasTelemetry(**fields)
+
+
+def spool_attempts(path):
+    """Gets the number of rejected replays of a spool file from its name."""
+    match = re.search(r'\.attempt(\d+)%s$' % re.escape(SPOOL_EXT), path)
+    return int(match.group(1)) if match else 0
+
+
+def process_running(pid):
+    """Gets whether a process with the PID is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TelemetryBuffer(object):
+    """Buffers telemetry and inserts it into the database in batches.
+
+    Telemetry is added by request handlers, and flushed either by the
+    background thread started by start(), or explicitly by flush(). Spool
+    files are shared by all processes using the same spool directory, so
+    telemetry spooled by one process may be inserted by another.
+    """
+    def __init__(self,
+                 spool_dir,
+                 max_size=MAX_SIZE,
+                 flush_size=FLUSH_SIZE,
+                 flush_interval_sec=FLUSH_INTERVAL_SEC):
+        """Creates a buffer without starting the background thread.
+
+        Args:
+            spool_dir: Directory to spool telemetry to disk.
+            max_size: Max number of telemetry queued in memory.
+            flush_size: Number of queued telemetry which triggers a flush.
+            flush_interval_sec: Max time between background flushes.
+        """
+        self.spool_dir = spool_dir
+        self.spool_path = os.path.join(
+            spool_dir, 'telemetry-%d%s' % (os.getpid(), SPOOL_EXT))
+        self.flush_size = flush_size
+        self.flush_interval_sec = flush_interval_sec
+        self.queue = queue.Queue(maxsize=max_size)
+        # Serializes flushes, and appends to this process's spool file.
+        self.flush_lock = threading.Lock()
+        self.spool_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Starts the background flush thread, flushing again at exit."""
+        self.reclaim()
+        self.thread = threading.Thread(target=self.run,
+                                       name='TelemetryBuffer',
+                                       daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Stops the background thread and flushes remaining telemetry."""
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def run(self):
+        """Flushes telemetry until the buffer is closed."""
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval_sec)
+            self.wakeup.clear()
+            # Recover from connections broken by a database outage.
+            db.close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush telemetry.')
+        db.connection.close()
+
+    def add(self, telemetry):
+        """Queues unsaved telemetry to be inserted.
+
+        Telemetry which doesn't fit in the queue is spooled to disk.
+
+        Args:
+            telemetry: List of unsaved UasTelemetry.
+        """
+        overflow = []
+        for t in telemetry:
+            try:
+                self.queue.put_nowait(t)
+            except queue.Full:
+                overflow.append(t)
+        if overflow:
+            logger.warning('Telemetry buffer full, spooling %d telemetry.',
+                           len(overflow))
+            self.spool(overflow)
+        if self.queue.qsize() >= self.flush_size:
+            self.wakeup.set()
+
+    def flush(self):
+        """Inserts all queued and spooled telemetry.
+
+        Telemetry which fails to insert is spooled to disk.
+
+        Returns:
+            The number of telemetry inserted.
+        """
+        with self.flush_lock:
+            telemetry = []
+            while True:
+                try:
+                    telemetry.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if telemetry:
+                try:
+                    self.insert(telemetry)
+                except db.Error:
+                    logger.exception('Failed to insert %d telemetry.',
+                                     len(telemetry))
+                    self.spool(telemetry)
+                    return 0
+                self.update_status(telemetry)
+
+            return len(telemetry) + self.replay()
+
+    def insert(self, telemetry):
+        """Inserts the telemetry in batches within a transaction."""
+        with transaction.atomic():
+            UasTelemetry.objects.bulk_create(telemetry,
+                                             batch_size=self.flush_size)
+
+    def update_status(self, telemetry):
+        """Updates the status of teams with inserted telemetry.
+
+        The telemetry is already stored, so failures are logged rather than
+        raised, which would spool the telemetry to be inserted again.
+        """
+        for module in [team_status, live_evaluation, live_alerts]:
+            try:
+                module.update_telemetry(telemetry)
+            except Exception:
+                logger.exception('Failed to update %s with %d telemetry.',
+                                 module.__name__, len(telemetry))
+
+    def spool(self, telemetry):
+        """Appends telemetry to this process's spool file."""
+        lines = ''.join(telemetry_to_spool(t) for t in telemetry)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with self.spool_lock:
+            while True:
+                with open(self.spool_path, 'a') as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    # The file may have been claimed for replay before it was
+                    # locked, in which case append to a new file.
+                    try:
+                        current = os.stat(self.spool_path)
+                    except FileNotFoundError:
+                        continue
+                    if current.st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    return
+
+    def replay(self):
+        """Inserts spooled telemetry from all processes.
+
+        Malformed lines are moved to the dead letter directory. Files rejected
+        by the database REPLAY_ATTEMPTS times are moved there too, so they
+        don't block the rest of the spool.
+
+        Returns:
+            The number of telemetry inserted.
+        """
+        inserted = 0
+        for path in glob.glob(os.path.join(self.spool_dir, '*' + SPOOL_EXT)):
+            # Claim the file, so no other process replays it.
+            claimed = '%s.%d.replay' % (path, os.getpid())
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed) as f:
+                # Wait for appends which opened the file before the claim.
+                fcntl.flock(f, fcntl.LOCK_EX)
+                lines = f.readlines()
+
+            telemetry = []
+            valid = []
+            malformed = []
+            for line in lines:
+                try:
+                    telemetry.append(telemetry_from_spool(line))
+                    valid.append(line)
+                except (ValueError, TypeError, KeyError):
+                    malformed.append(line)
+            if malformed:
+                logger.error('Moving %d malformed telemetry from %s to %s.',
+                             len(malformed), path, DEAD_LETTER_DIR)
+                with open(self.dead_letter_path(), 'w') as f:
+                    f.writelines(malformed)
+                with open(claimed, 'w') as f:
+                    f.writelines(valid)
+
+            try:
+                if telemetry:
+                    self.insert(telemetry)
+            except (db.OperationalError, db.InterfaceError):
+                logger.exception('Failed to replay %d telemetry from %s.',
+                                 len(telemetry), path)
+                # The database is unavailable, so stop until it recovers.
+                self.requeue(claimed, spool_attempts(path))
+                break
+            except db.Error:
+                logger.exception('Database rejected %d telemetry from %s.',
+                                 len(telemetry), path)
+                attempts = spool_attempts(path) + 1
+                if attempts >= REPLAY_ATTEMPTS:
+                    logger.error('Moving %s to %s after %d attempts.', path,
+                                 DEAD_LETTER_DIR, attempts)
+                    os.rename(claimed, self.dead_letter_path())
+                else:
+                    self.requeue(claimed, attempts)
+                continue
+
+            os.remove(claimed)
+            if telemetry:
+                self.update_status(telemetry)
+            inserted += len(telemetry)
+        return inserted
+
+    def requeue(self, claimed, attempts):
+        """Returns a claimed spool file to the spool for a later replay.
+
+        Args:
+            claimed: Path of the claimed spool file.
+            attempts: Number of times the database rejected the file.
+        """
+        os.rename(
+            claimed,
+            os.path.join(
+                self.spool_dir, 'telemetry-%d-%d.attempt%d%s' %
+                (os.getpid(), time.time_ns(), attempts, SPOOL_EXT)))
+
+    def reclaim(self):
+        """Returns spool files claimed by dead processes to the spool.
+
+        Files claimed with this process's PID were claimed by a previous
+        process with the same PID, as the buffer hasn't started.
+        """
+        for claimed in glob.glob(
+                os.path.join(self.spool_dir, '*%s.*.replay' % SPOOL_EXT)):
+            path, pid, _ = claimed.rsplit('.', 2)
+            if int(pid) != os.getpid() and process_running(int(pid)):
+                continue
+            logger.warning('Reclaiming %s from process %s.', path, pid)
+            try:
+                self.requeue(claimed, spool_attempts(path))
+            except FileNotFoundError:
+                continue
+
+    def dead_letter_path(self):
+        """Gets a new path for telemetry which can't be inserted."""
+        dead_letter_dir = os.path.join(self.spool_dir, DEAD_LETTER_DIR)
+        os.makedirs(dead_letter_dir, exist_ok=True)
+        return os.path.join(
+            dead_letter_dir,
+            'telemetry-%d-%d%s' % (os.getpid(), time.time_ns(), SPOOL_EXT))
+
+
+# The buffer for this process, started on first use.
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Gets the started buffer for this process."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = TelemetryBuffer(
+                os.path.join(settings.MEDIA_ROOT, SPOOL_DIR))
+            _buffer.start()
+        return _buffer
@@ -0,0 +1,167 @@
+"""Tests for the telemetry_buffer module."""
+
+import datetime
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+from auvsi_suas.models import live_alerts
+from auvsi_suas.models import team_status
+from auvsi_suas.models.telemetry_buffer import DEAD_LETTER_DIR
+from auvsi_suas.models.telemetry_buffer import REPLAY_ATTEMPTS
+from auvsi_suas.models.telemetry_buffer import TelemetryBuffer
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from unittest import mock
+
+
+class TestTelemetryBuffer(TestCase):
+    """Tests the TelemetryBuffer."""
+    def setUp(self):
+        self.user = User.objects.create_user('testuser', 'testemail@x.com',
+                                             'testpass')
+        self.user.save()
+        self.spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool_dir)
+        self.now = timezone.now()
+
+    def create_telemetry(self, count, heading=90):
+        return [
+            UasTelemetry(user=self.user,
+                         timestamp=self.now +
+                         datetime.timedelta(seconds=0.1 * i),
+                         latitude=38 + i,
+                         longitude=-76,
+                         altitude_msl=100,
+                         uas_heading=heading) for i in range(count)
+        ]
+
+    def spool_files(self):
+        return glob.glob(os.path.join(self.spool_dir, '*.jsonl'))
+
+    def dead_letter_lines(self):
+        lines = []
+        for path in glob.glob(
+                os.path.join(self.spool_dir, DEAD_LETTER_DIR, '*')):
+            with open(path) as f:
+                lines.extend(f)
+        return lines
+
+    def test_flush(self):
+        """Tests queued telemetry is inserted on flush."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.add(self.create_telemetry(3))
+        self.assertEqual(0, UasTelemetry.objects.count())
+
+        self.assertEqual(3, buf.flush())
+        logs = UasTelemetry.by_user(self.user)
+        self.assertEqual([38, 39, 40], [l.latitude for l in logs])
+        self.assertEqual(self.now, logs[0].timestamp)
+
+        self.assertEqual(0, buf.flush())
+        self.assertEqual(3, UasTelemetry.objects.count())
+
+    def test_failed_update_not_spooled(self):
+        """Tests telemetry isn't spooled if updating status fails."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.add(self.create_telemetry(3))
+        with mock.patch.object(live_alerts,
+                               'update_telemetry',
+                               side_effect=RuntimeError('failed')):
+            self.assertEqual(3, buf.flush())
+            self.assertEqual(3, UasTelemetry.objects.count())
+            self.assertEqual([], self.spool_files())
+
+            # Replayed telemetry isn't spooled again either.
+            buf.spool(self.create_telemetry(2))
+            self.assertEqual(2, buf.replay())
+        self.assertEqual(5, UasTelemetry.objects.count())
+        self.assertEqual([], self.spool_files())
+        # Other status is still updated.
+        self.assertEqual(40, team_status.get(self.user)[1].latitude)
+
+    def test_full_spools(self):
+        """Tests telemetry added to a full buffer is spooled."""
+        buf = TelemetryBuffer(self.spool_dir, max_size=2)
+        buf.add(self.create_telemetry(5))
+        self.assertEqual(1, len(self.spool_files()))
+
+        self.assertEqual(5, buf.flush())
+        logs = UasTelemetry.by_user(self.user)
+        self.assertEqual([38, 39, 40, 41, 42], [l.latitude for l in logs])
+        self.assertEqual(self.now, logs[0].timestamp)
+        self.assertEqual([], self.spool_files())
+
+    def test_failed_insert_spools(self):
+        """Tests telemetry which fails to insert is spooled."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.add(self.create_telemetry(2, heading=None))
+        self.assertEqual(0, buf.flush())
+        self.assertEqual(0, UasTelemetry.objects.count())
+        self.assertEqual(1, len(self.spool_files()))
+
+        # Replay keeps failing telemetry in the spool.
+        buf.add(self.create_telemetry(1))
+        self.assertEqual(1, buf.flush())
+        self.assertEqual(1, len(self.spool_files()))
+
+    def test_replay_other_process(self):
+        """Tests telemetry spooled by another process is inserted."""
+        other = TelemetryBuffer(self.spool_dir)
+        other.spool_path = os.path.join(self.spool_dir, 'telemetry-0.jsonl')
+        other.spool(self.create_telemetry(2))
+
+        buf = TelemetryBuffer(self.spool_dir)
+        self.assertEqual(2, buf.flush())
+        self.assertEqual(2, UasTelemetry.objects.count())
+        self.assertEqual([], self.spool_files())
+
+    def test_rejected_dead_letter(self):
+        """Tests spool files the database rejects are moved aside."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.spool(self.create_telemetry(2, heading=None))
+        buf.spool_path = os.path.join(self.spool_dir, 'telemetry-0.jsonl')
+        buf.spool(self.create_telemetry(1))
+
+        # Rejected files don't block other files.
+        self.assertEqual(1, buf.flush())
+        self.assertEqual(1, len(self.spool_files()))
+        for _ in range(REPLAY_ATTEMPTS - 1):
+            self.assertEqual(0, buf.flush())
+        self.assertEqual([], self.spool_files())
+        self.assertEqual(2, len(self.dead_letter_lines()))
+
+    def test_malformed_dead_letter(self):
+        """Tests malformed lines are moved aside and the rest inserted."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.spool(self.create_telemetry(2))
+        with open(buf.spool_path, 'a') as f:
+            f.write('{"user_id": 1, "lat\n')
+
+        self.assertEqual(2, buf.flush())
+        self.assertEqual(2, UasTelemetry.objects.count())
+        self.assertEqual([], self.spool_files())
+        self.assertEqual(['{"user_id": 1, "lat\n'], self.dead_letter_lines())
+
+    def test_reclaim(self):
+        """Tests files claimed by dead processes are replayed on start."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.spool(self.create_telemetry(2))
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        os.rename(buf.spool_path, '%s.%d.replay' % (buf.spool_path, dead.pid))
+        self.assertEqual(0, buf.flush())
+
+        buf.reclaim()
+        self.assertEqual(2, buf.flush())
+        self.assertEqual(2, UasTelemetry.objects.count())
+
+    def test_close(self):
+        """Tests close flushes queued telemetry."""
+        buf = TelemetryBuffer(self.spool_dir)
+        buf.add(self.create_telemetry(2))
+        buf.close()
+        self.assertEqual(2, UasTelemetry.objects.count())
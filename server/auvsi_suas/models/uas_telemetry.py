@@ -1,9 +1,12 @@
 """UAS Telemetry model."""
 
+import collections
 import datetime
-import itertools
 import logging
+import numpy as np
+from auvsi_suas.models import distance
 from auvsi_suas.models.access_log import AccessLogMixin
+from auvsi_suas.models.access_log import timestamp_us
 from auvsi_suas.models.aerial_position import AerialPositionMixin
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.proto import interop_admin_api_pb2
@@ -21,6 +24,23 @@ TELEMETRY_INTERPOLATION_STEP = datetime.timedelta(seconds=0.1)
 # The max time gap between two telemetry to interpolate between.
 TELEMETRY_INTERPOLATION_MAX_GAP = datetime.timedelta(seconds=5.0)
 
+# Telemetry as a structured array, as loaded for evaluation. Timestamps are in
+# microseconds since the epoch.
+TELEMETRY_DTYPE = np.dtype([
+    ('timestamp', 'datetime64[us]'),
+    ('latitude', np.float64),
+    ('longitude', np.float64),
+    ('altitude_msl', np.float64),
+    ('uas_heading', np.float64),
+])
+# The number of telemetry fetched from the database at once into arrays.
+TELEMETRY_ARRAY_CHUNK_SIZE = 10000
+
+# Interpolated telemetry as arrays. Timestamps are in seconds since the epoch.
+TelemetryArrays = collections.namedtuple(
+    'TelemetryArrays',
+    ['timestamps', 'latitudes', 'longitudes', 'altitudes_msl', 'headings'])
+
 # The time window (in seconds) in which a plane cannot be counted as going out
 # of bounds multiple times. This prevents noisy input data from recording
 # significant more violations than a human observer.
@@ -112,6 +132,112 @@ class UasTelemetry(AccessLogMixin, AerialPositionMixin):
 
         return filter(lambda log: _is_good(log), logs)
 
+    @classmethod
+    def rows_to_array(cls, rows):
+        """Converts rows of telemetry values to a telemetry array.
+
+        Args:
+            rows: A sequence of tuples of the values of telemetry, in the order
+                of the fields of TELEMETRY_DTYPE.
+        Returns:
+            A TELEMETRY_DTYPE array of the telemetry.
+        """
+        array = np.empty(len(rows), dtype=TELEMETRY_DTYPE)
+        if rows:
+            columns = list(zip(*rows))
+            array['timestamp'] = np.array(
+                [timestamp_us(t) for t in columns[0]],
+                dtype=np.int64).astype(array.dtype['timestamp'])
+            for name, column in zip(TELEMETRY_DTYPE.names[1:], columns[1:]):
+                array[name] = column
+        return array
+
+    @classmethod
+    def as_array(cls, uas_telemetry_logs):
+        """Gets the telemetry as a telemetry array.
+
+        Args:
+            uas_telemetry_logs: A TELEMETRY_DTYPE array, which is returned
+                as is, or a sequence of UasTelemetry.
+        Returns:
+            A TELEMETRY_DTYPE array of the telemetry.
+        """
+        if isinstance(uas_telemetry_logs, np.ndarray):
+            return uas_telemetry_logs
+        return cls.rows_to_array([
+            tuple(getattr(l, f) for f in TELEMETRY_DTYPE.names)
+            for l in uas_telemetry_logs
+        ])
+
+    @classmethod
+    def array_by_time_period(cls, user, time_periods):
+        """Gets a time-sorted telemetry array for each time period.
+
+        Like by_time_period, but only the values of the telemetry are loaded,
+        in chunks, so no model instance is constructed for each telemetry.
+
+        Args:
+            user: The user to get the telemetry for.
+            time_periods: A list of TimePeriod objects.
+        Returns:
+            A list with a TELEMETRY_DTYPE array for each time period.
+        """
+        arrays = []
+        for period in time_periods:
+            query = cls.by_user(user, period.start,
+                                period.end).values_list(*TELEMETRY_DTYPE.names)
+            chunks = []
+            rows = []
+            for row in query.iterator(chunk_size=TELEMETRY_ARRAY_CHUNK_SIZE):
+                rows.append(row)
+                if len(rows) >= TELEMETRY_ARRAY_CHUNK_SIZE:
+                    chunks.append(cls.rows_to_array(rows))
+                    rows = []
+            chunks.append(cls.rows_to_array(rows))
+            arrays.append(np.concatenate(chunks))
+        return arrays
+
+    @classmethod
+    def timestamps_us(cls, logs):
+        """Gets the timestamps of the logs. See AccessLogMixin.timestamps_us.
+
+        The logs may also be a telemetry array.
+        """
+        if isinstance(logs, np.ndarray):
+            return logs['timestamp'].astype(np.int64)
+        return super(UasTelemetry, cls).timestamps_us(logs)
+
+    @classmethod
+    def dedupe_array(cls, array):
+        """Dedupes a telemetry array, as dedupe does for a list of logs.
+
+        Args:
+            array: A time-sorted TELEMETRY_DTYPE array.
+        Returns:
+            A TELEMETRY_DTYPE array of the non-duplicate telemetry.
+        """
+        if not len(array):
+            return array
+        # Duplicates of the previous telemetry are duplicates of the
+        # previous unique telemetry.
+        duplicate = np.ones(len(array) - 1, dtype=bool)
+        for name in TELEMETRY_DTYPE.names[1:]:
+            duplicate &= array[name][1:] == array[name][:-1]
+        return array[np.concatenate([[True], ~duplicate])]
+
+    @classmethod
+    def filter_bad_array(cls, array):
+        """Filters bad telemetry from the array, as filter_bad does.
+
+        Args:
+            array: A TELEMETRY_DTYPE array.
+        Returns:
+            A TELEMETRY_DTYPE array of the non-bad telemetry.
+        """
+        return array[
+            np.maximum(np.abs(array['latitude']), np.abs(
+                array['longitude'])) > BAD_TELEMETRY_THRESHOLD_DEGREES]
+
     @classmethod
     def interpolate(cls,
                     uas_telemetry_logs,
@@ -159,7 +285,184 @@ class UasTelemetry(AccessLogMixin, AerialPositionMixin):
                 t += step
 
     @classmethod
-    def satisfied_waypoints(cls, home_pos, waypoints, uas_telemetry_logs):
+    def interpolate_arrays(cls,
+                           uas_telemetry_logs,
+                           step=TELEMETRY_INTERPOLATION_STEP,
+                           max_gap=TELEMETRY_INTERPOLATION_MAX_GAP):
+        """Interpolates the ordered set of telemetry into arrays.
+
+        Produces the same positions as interpolate, without constructing a
+        UasTelemetry for each interpolated position.
+
+        Args:
+            uas_telemetry_logs: The telemetry to interpolate, as UasTelemetry or an array.
+            step: The discrete interpolation step in seconds.
+            max_gap: The max time between telemetry to interpolate.
+        Returns:
+            A TelemetryArrays of the interpolated telemetry.
+        """
+        logs = cls.as_array(uas_telemetry_logs)
+        if not len(logs):
+            empty = np.zeros(0)
+            return TelemetryArrays(empty, empty, empty, empty, empty)
+
+        # Compute times in integer microseconds so that the interpolated
+        # timestamps are exactly those of interpolate.
+        usec = datetime.timedelta(microseconds=1)
+        start = logs['timestamp'][0].astype(np.int64)
+        times = logs['timestamp'].astype(np.int64) - start
+        step_us = step // usec
+        values = np.stack([
+            logs['latitude'], logs['longitude'], logs['altitude_msl'],
+            logs['uas_heading']
+        ],
+                          axis=-1)
+
+        # Number of positions from each log up to the next log, which is the
+        # log itself plus those interpolated at each step before the next.
+        dt = np.diff(times)
+        counts = np.ones(len(logs), dtype=np.int64)
+        interp = (dt > 0) & (dt <= max_gap // usec)
+        counts[:-1][interp] += (dt[interp] - 1) // step_us
+
+        # Index of the previous log and steps since it, for each position.
+        prev = np.repeat(np.arange(len(logs)), counts)
+        steps = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        following = np.minimum(prev + 1, len(logs) - 1)
+
+        # Weight the previous and next logs by time to each.
+        offset = steps * step_us
+        span = np.append(dt, 1)[prev].astype(np.float64)
+        span[span <= 0] = 1
+        n_w = offset / span
+        w = (span - offset) / span
+        interpolated = (w[:, np.newaxis] * values[prev] +
+                        n_w[:, np.newaxis] * values[following])
+
+        timestamps = start / 1e6 + (times[prev] + offset) / 1e6
+        return TelemetryArrays(timestamps, *interpolated.T)
+
+    @classmethod
+    def segments(cls,
+                 uas_telemetry_logs,
+                 origin,
+                 max_gap=TELEMETRY_INTERPOLATION_MAX_GAP):
+        """Gets the straight segments of flight between the telemetry.
+
+        The UAS is assumed to fly straight between telemetry at most max_gap
+        apart, as in interpolate. There is a segment from each telemetry to the
+        next, or a segment of zero length if they are too far apart. Segments
+        too far from the UTM zone to project are omitted.
+
+        Args:
+            uas_telemetry_logs: The telemetry sorted by timestamp, as in
+                interpolate_arrays.
+            origin: The position in the UTM zone to project to, or the
+                distance.UtmFrame to project to.
+            max_gap: The max time between telemetry to fly straight between.
+        Returns:
+            A tuple of arrays of the start and end of each segment, each of
+            the easting, northing and altitude in feet.
+        """
+        starts, ends, valid = cls.segment_arrays(uas_telemetry_logs, origin,
+                                                 max_gap)
+        return starts[valid], ends[valid]
+
+    @classmethod
+    def segment_arrays(cls,
+                       uas_telemetry_logs,
+                       origin,
+                       max_gap=TELEMETRY_INTERPOLATION_MAX_GAP):
+        """Gets the segment of flight from each of the telemetry.
+
+        Like segments, but segments which can't be projected aren't omitted.
+
+        Returns:
+            A tuple of arrays of the start and end of the segment from each
+            telemetry, as in segments, and whether each segment is valid.
+        """
+        logs = cls.as_array(uas_telemetry_logs)
+        x, y = distance.UtmFrame.around(origin).project(
+            logs['latitude'], logs['longitude'])
+        z = logs['altitude_msl']
+        starts = np.stack([x, y, z], axis=-1).reshape(-1, 3)
+
+        end = np.arange(len(logs))
+        dt = np.diff(logs['timestamp'].astype(np.int64))
+        end[:-1][(dt > 0)
+                 & (dt <= max_gap // datetime.timedelta(microseconds=1))] += 1
+        ends = starts[end]
+        valid = np.all(np.isfinite(starts) & np.isfinite(ends), axis=1)
+        return starts, ends, valid
+
+    @classmethod
+    def closest_approaches(cls,
+                           home_pos,
+                           positions,
+                           uas_telemetry_logs,
+                           segments=None):
+        """Computes the closest approach of each segment of flight.
+
+        Args:
+            home_pos: The home position for projections, or its
+                distance.UtmFrame.
+            positions: A list of aerial positions to approach.
+            uas_telemetry_logs: The telemetry sorted by timestamp.
+            segments: Optional. The segments of the telemetry projected to
+                the frame of home_pos. If None, will obtain by calling
+                segments().
+        Returns:
+            A tuple of arrays by segment and position, of the distance in feet
+            of the closest approach, and the fraction along the segment at
+            which it occurs. Segments are as given by segments.
+        """
+        frame = distance.UtmFrame.around(home_pos)
+        if segments is None:
+            segments = cls.segments(uas_telemetry_logs, frame)
+        starts, ends = segments
+        points = frame.project_positions(positions)
+
+        # Project each position onto each segment, clamped to its ends.
+        vectors = ends - starts
+        length_sq = np.sum(vectors * vectors, axis=1)[:, np.newaxis]
+        to_points = points[np.newaxis, :, :] - starts[:, np.newaxis, :]
+        dots = np.sum(to_points * vectors[:, np.newaxis, :], axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(length_sq > 0, dots / length_sq, 0)
+        t = np.clip(t, 0, 1)
+        closest = (starts[:, np.newaxis, :] +
+                   t[:, :, np.newaxis] * vectors[:, np.newaxis, :])
+        dists = np.linalg.norm(closest - points[np.newaxis, :, :], axis=2)
+        return dists, t
+
+    @staticmethod
+    def _first_sum_at_least(prefix_max, score, total):
+        """Finds the first index where prefix_max[i] + score >= total.
+
+        Args:
+            prefix_max: Non-decreasing list of totals.
+            score: The score added to each total.
+            total: The total to find.
+        Returns:
+            The first index meeting the total.
+        """
+        lo, hi = 0, len(prefix_max) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if prefix_max[mid] + score >= total:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @classmethod
+    def satisfied_waypoints(cls,
+                            home_pos,
+                            waypoints,
+                            uas_telemetry_logs,
+                            closest_approach=False,
+                            segments=None):
         """Determines whether the UAS satisfied the waypoints.
 
         Waypoints must be satisfied in order. The entire pattern may be
@@ -170,75 +473,177 @@ class UasTelemetry(AccessLogMixin, AerialPositionMixin):
         SATISFIED_WAYPOINT_DIST_MAX_FT apart.
 
         Args:
-            home_pos: The home position for projections.
+            home_pos: The home position for projections, or its
+                distance.UtmFrame.
             waypoints: A list of waypoints to check against.
-            uas_telemetry_logs: A list of UAS Telemetry logs to evaluate.
+            uas_telemetry_logs: A list of UAS Telemetry logs, or a telemetry
+                array, to evaluate.
+            closest_approach: Whether to use the closest approach of each
+                straight segment of flight to the waypoints, rather than
+                sampling the interpolated telemetry.
+            segments: Optional. The segments of the telemetry for the closest
+                approach, as for closest_approaches.
         Returns:
             A list of auvsi_suas.proto.WaypointEvaluation.
         """
-        # Reduce telemetry from telemetry to waypoint hits.
-        # This will make future processing more efficient via data reduction.
-        # While iterating, compute the best distance seen for feedback.
+        if closest_approach:
+            # Distance matrix of segments by waypoint, and where along the
+            # segment each is closest.
+            dists, along = cls.closest_approaches(home_pos,
+                                                  waypoints,
+                                                  uas_telemetry_logs,
+                                                  segments=segments)
+        else:
+            dists = cls.sampled_distances(
+                waypoints, cls.interpolate_arrays(uas_telemetry_logs))
+            along = np.zeros(dists.shape)
+        hits, best = cls.waypoint_hits(dists, along)
+        return cls.score_waypoint_hits(waypoints, hits, best)
+
+    @classmethod
+    def sampled_distances(cls, waypoints, telemetry):
+        """Computes the distance of interpolated telemetry to the waypoints.
+
+        Args:
+            waypoints: A list of waypoints.
+            telemetry: A TelemetryArrays of interpolated telemetry.
+        Returns:
+            A distance matrix in feet of telemetry by waypoint.
+        """
+        w_lats, w_lons, w_alts = np.array(
+            [(w.latitude, w.longitude, w.altitude_msl) for w in waypoints],
+            dtype=np.float64).reshape(-1, 3).T
+        return distance.distance_to_many(
+            telemetry.latitudes[:, np.newaxis],
+            telemetry.longitudes[:, np.newaxis],
+            telemetry.altitudes_msl[:, np.newaxis], w_lats, w_lons, w_alts)
+
+    @classmethod
+    def waypoint_hits(cls, dists, along):
+        """Reduces the distances of flight to waypoints to waypoint hits.
+
+        This will make future processing more efficient via data reduction.
+
+        Args:
+            dists: Distance matrix in feet of telemetry or segments (rows) by
+                waypoint, in order of flight.
+            along: Matrix of where along each segment each waypoint is
+                closest, which orders hits within a row.
+        Returns:
+            A tuple of the list of hits, each a tuple of the waypoint index,
+            distance and score, and a dict from waypoint index to the best
+            distance seen.
+        """
         best = {}
-        hits = []
-        for log in cls.interpolate(uas_telemetry_logs):
-            for iw, waypoint in enumerate(waypoints):
-                dist = log.distance_to(waypoint)
-                best[iw] = min(best.get(iw, dist), dist)
-                score = max(
-                    0,
-                    float(SATISFIED_WAYPOINT_DIST_MAX_FT - dist) /
-                    SATISFIED_WAYPOINT_DIST_MAX_FT)
-                if score > 0:
-                    hits.append((iw, dist, score))
-        # Remove redundant hits which wouldn't be part of best sequence.
-        # This will make future processing more efficient via data reduction.
-        hits = [
-            max(g, key=lambda x: x[2])
-            for _, g in itertools.groupby(hits, lambda x: x[0])
-        ]
+        if len(dists):
+            best = dict(enumerate(dists.min(axis=0).tolist()))
+        scores = np.maximum(0, (SATISFIED_WAYPOINT_DIST_MAX_FT - dists) /
+                            float(SATISFIED_WAYPOINT_DIST_MAX_FT))
+        # Hits in order of flight, then waypoint. Hits on the same segment are
+        # in order of where along the segment they are closest.
+        hit_rows, hit_waypoints = np.nonzero(scores > 0)
+        order = np.lexsort((along[hit_rows, hit_waypoints], hit_rows))
+        hit_rows = hit_rows[order]
+        hit_waypoints = hit_waypoints[order]
+        hit_dists = dists[hit_rows, hit_waypoints]
+        hit_scores = scores[hit_rows, hit_waypoints]
+        hits = list(
+            zip(hit_waypoints.tolist(), hit_dists.tolist(),
+                hit_scores.tolist()))
+        return cls.merge_waypoint_hits([], hits), best
+
+    @classmethod
+    def merge_waypoint_hits(cls, hits, later_hits):
+        """Appends later hits to hits, removing redundant hits.
+
+        Consecutive hits of the same waypoint wouldn't all be part of the best
+        sequence, so only the first of the highest scoring is kept.
 
+        Args:
+            hits: A list of hits as given by waypoint_hits.
+            later_hits: A list of hits after those in hits.
+        Returns:
+            The merged list of hits.
+        """
+        merged = list(hits)
+        for hit in later_hits:
+            if merged and merged[-1][0] == hit[0]:
+                if hit[2] > merged[-1][2]:
+                    merged[-1] = hit
+            else:
+                merged.append(hit)
+        return merged
+
+    @classmethod
+    def score_waypoint_hits(cls, waypoints, hits, best):
+        """Scores the best sequence of hits of the waypoints.
+
+        Args:
+            waypoints: A list of waypoints to check against.
+            hits: A list of hits as given by waypoint_hits.
+            best: Dict from waypoint index to the best distance seen.
+        Returns:
+            A list of auvsi_suas.proto.WaypointEvaluation.
+        """
         # Find highest scoring sequence via dynamic programming.
         # Implement recurrence relation:
         #   S(iw, ih) = s[iw, ih] + max_{k=[0,ih)} S(iw-1, k)
-        dp = defaultdict(lambda: defaultdict(lambda: (0, None, None)))
+        # The max over the previous row is kept as a running prefix max, so
+        # each row takes linear time in the number of hits.
+        totals = []
+        backs = []
         highest_total = None
         highest_total_pos = (None, None)
         for iw in range(len(waypoints)):
+            row_totals = []
+            row_backs = []
+            prev_totals = totals[-1] if totals else None
+            # Prefix max of the previous row, and first index attaining it.
+            prefix_max = []
+            running_max = None
+            running_max_ih = None
             for ih, (hiw, hdist, hscore) in enumerate(hits):
                 # Compute score for assigning current hit to current waypoint.
                 score = hscore if iw == hiw else 0.0
                 # Compute best total score, which includes this match score and
                 # best of all which could come before it.
-                prev_iw = iw - 1
                 total_score = score
-                total_score_back = (None, None)
-                if prev_iw >= 0:
-                    for prev_ih in range(ih + 1):
-                        (prev_total_score, _) = dp[prev_iw][prev_ih]
-                        new_total_score = prev_total_score + score
-                        if new_total_score > total_score:
-                            total_score = new_total_score
-                            total_score_back = (prev_iw, prev_ih)
-                dp[iw][ih] = (total_score, total_score_back)
+                total_score_back = None
+                if prev_totals is not None:
+                    if running_max is None or prev_totals[ih] > running_max:
+                        running_max = prev_totals[ih]
+                        running_max_ih = ih
+                    prefix_max.append(running_max)
+                    new_total_score = running_max + score
+                    if new_total_score > total_score:
+                        total_score = new_total_score
+                        total_score_back = running_max_ih
+                        if score:
+                            # Adding the score may round an earlier total up
+                            # to the same sum, and the earliest is used.
+                            total_score_back = cls._first_sum_at_least(
+                                prefix_max, score, new_total_score)
+                row_totals.append(total_score)
+                row_backs.append(total_score_back)
                 # Track highest score seen.
                 if highest_total is None or total_score > highest_total:
                     highest_total = total_score
                     highest_total_pos = (iw, ih)
+            totals.append(row_totals)
+            backs.append(row_backs)
         # Traceback sequence to get scores and distance for score.
-        scores = defaultdict(lambda: (0, None))
-        cur_pos = highest_total_pos
-        while cur_pos != (None, None):
-            cur_iw, cur_ih = cur_pos
+        waypoint_scores = defaultdict(lambda: (0, None))
+        cur_iw, cur_ih = highest_total_pos
+        while cur_ih is not None:
             hiw, hdist, hscore = hits[cur_ih]
             if cur_iw == hiw:
-                scores[cur_iw] = (hscore, hdist)
-            _, cur_pos = dp[cur_iw][cur_ih]
+                waypoint_scores[cur_iw] = (hscore, hdist)
+            cur_iw, cur_ih = cur_iw - 1, backs[cur_iw][cur_ih]
 
         # Convert to evaluation.
         waypoint_evals = []
         for iw, waypoint in enumerate(waypoints):
-            score, dist = scores[iw]
+            score, dist = waypoint_scores[iw]
             waypoint_eval = interop_admin_api_pb2.WaypointEvaluation()
             waypoint_eval.id = iw
             waypoint_eval.score_ratio = score
@@ -1,9 +1,12 @@
 """Tests for the uas_telemetry module."""
 
 import datetime
+import time
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.time_period import TimePeriod
+from auvsi_suas.models.uas_telemetry import TELEMETRY_DTYPE
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.models.waypoint import Waypoint
 from auvsi_suas.proto.interop_admin_api_pb2 import WaypointEvaluation
@@ -255,6 +258,56 @@ class TestUasTelemetryFilter(TestUasTelemetryBase):
         expect = [self.log1]
         self.assertSequenceEqual(list(UasTelemetry.filter_bad(orig)), expect)
 
+    def test_dedupe_array(self):
+        """Tests dedupe_array matches dedupe."""
+        orig = [
+            self.log1, self.log1, self.log2, self.log3, self.log3, self.log4,
+            self.log4, self.log5, self.log5
+        ]
+        expect = UasTelemetry.as_array(UasTelemetry.dedupe(orig))
+        got = UasTelemetry.dedupe_array(UasTelemetry.as_array(orig))
+        self.assertEqual(expect.tolist(), got.tolist())
+
+        empty = UasTelemetry.as_array([])
+        self.assertEqual(0, len(UasTelemetry.dedupe_array(empty)))
+
+    def test_filter_bad_array(self):
+        """Tests filter_bad_array matches filter_bad."""
+        orig = [self.log1, self.log5, self.log2]
+        expect = UasTelemetry.as_array(UasTelemetry.filter_bad(orig))
+        got = UasTelemetry.filter_bad_array(UasTelemetry.as_array(orig))
+        self.assertEqual(expect.tolist(), got.tolist())
+
+
+class TestUasTelemetryArray(TestUasTelemetryBase):
+    def test_as_array(self):
+        """Tests conversion of logs to an array."""
+        log = self.create_log_element(1.000001, 38, -76, 100, 90)
+        array = UasTelemetry.as_array([log])
+        self.assertEqual(TELEMETRY_DTYPE, array.dtype)
+        self.assertEqual(
+            [(log.timestamp.replace(tzinfo=None), 38, -76, 100, 90)],
+            array.tolist())
+        self.assertIs(array, UasTelemetry.as_array(array))
+        self.assertEqual(0, len(UasTelemetry.as_array([])))
+
+    def test_array_by_time_period(self):
+        """Tests loaded arrays match the logs of each period."""
+        self.create_uas_logs([(t * 0.3, 38 + t, -76, 100, 90)
+                              for t in range(10)])
+        periods = [
+            TimePeriod(self.now, self.now + datetime.timedelta(seconds=1)),
+            TimePeriod(self.now + datetime.timedelta(seconds=1), None),
+            TimePeriod(self.now - datetime.timedelta(seconds=2), self.now),
+        ]
+        expect = UasTelemetry.by_time_period(self.user, periods)
+        got = UasTelemetry.array_by_time_period(self.user, periods)
+        self.assertEqual(3, len(got))
+        self.assertEqual([4, 6, 0], [len(a) for a in got])
+        for logs, array in zip(expect, got):
+            self.assertEqual(
+                UasTelemetry.as_array(logs).tolist(), array.tolist())
+
 
 class TestUasTelemetryInterpolate(TestUasTelemetryBase):
     """Tests the UasTelemetry interpolate()."""
@@ -318,6 +371,36 @@ class TestUasTelemetryInterpolate(TestUasTelemetryBase):
                     (10, 38, -76, 110, 0),
                 ])))
 
+    def test_arrays(self):
+        """Tests the arrays match the interpolated telemetry."""
+        logs = self.create_uas_logs([
+            (0.0, 38, -76, 100, 0),
+            (0.05, 38, -76, 101, 0),
+            (0.2, 40, -74, 110, 2),
+            (0.45, 42, -72, 120, 4),
+            (0.45, 42, -72, 120, 4),
+            (0.7, 45, -69, 150, 7),
+            (10.7, 45, -69, 150, 7),
+            (11.0, 46, -68, 160, 8),
+        ])
+        expect = list(UasTelemetry.interpolate(logs))
+        got = UasTelemetry.interpolate_arrays(logs)
+        self.assertEqual(len(expect), len(got.timestamps))
+        for ix, telem in enumerate(expect):
+            self.assertAlmostEqual(telem.timestamp.timestamp(),
+                                   got.timestamps[ix],
+                                   places=5)
+            self.assertAlmostEqual(telem.latitude, got.latitudes[ix])
+            self.assertAlmostEqual(telem.longitude, got.longitudes[ix])
+            self.assertAlmostEqual(telem.altitude_msl, got.altitudes_msl[ix])
+            self.assertAlmostEqual(telem.uas_heading, got.headings[ix])
+
+    def test_arrays_no_logs(self):
+        """Tests the arrays are empty without telemetry."""
+        got = UasTelemetry.interpolate_arrays([])
+        self.assertEqual(0, len(got.timestamps))
+        self.assertEqual(0, len(got.latitudes))
+
 
 class TestUasTelemetryWaypoints(TestUasTelemetryBase):
     def test_satisfied_waypoints(self):
@@ -550,3 +633,111 @@ class TestUasTelemetryWaypoints(TestUasTelemetryBase):
         ]
         self.assertSatisfiedWaypoints(
             expect, UasTelemetry.satisfied_waypoints(gpos, waypoints, logs))
+
+    def test_satisfied_waypoints_closest_approach(self):
+        """Tests the evaluation of waypoints by closest approach."""
+        gpos = GpsPosition(latitude=38.145, longitude=-76.428)
+        waypoints = self.waypoints_from_data([
+            (38.146, -76.428, 100),
+            (38.148, -76.428, 100),
+        ])
+
+        # Fast pass through both waypoints, in order.
+        logs = self.create_uas_logs([
+            (0, 38.145, -76.428, 100, 0),
+            (4, 38.149, -76.428, 100, 0),
+        ])
+        expect = [
+            WaypointEvaluation(id=0,
+                               score_ratio=1,
+                               closest_for_scored_approach_ft=0,
+                               closest_for_mission_ft=0),
+            WaypointEvaluation(id=1,
+                               score_ratio=1,
+                               closest_for_scored_approach_ft=0,
+                               closest_for_mission_ft=0),
+        ]
+        self.assertSatisfiedWaypoints(
+            expect,
+            UasTelemetry.satisfied_waypoints(gpos,
+                                             waypoints,
+                                             logs,
+                                             closest_approach=True))
+
+        # Pass above the waypoints.
+        logs = self.create_uas_logs([
+            (0, 38.145, -76.428, 130, 0),
+            (4, 38.149, -76.428, 130, 0),
+        ])
+        evals = UasTelemetry.satisfied_waypoints(gpos,
+                                                 waypoints,
+                                                 logs,
+                                                 closest_approach=True)
+        for waypoint_eval in evals:
+            self.assertAlmostEqual(0.7, waypoint_eval.score_ratio, places=2)
+            self.assertAlmostEqual(30,
+                                   waypoint_eval.closest_for_mission_ft,
+                                   places=1)
+
+        # Pass through both waypoints in reverse order.
+        logs = self.create_uas_logs([
+            (0, 38.149, -76.428, 100, 0),
+            (4, 38.145, -76.428, 100, 0),
+        ])
+        evals = UasTelemetry.satisfied_waypoints(gpos,
+                                                 waypoints,
+                                                 logs,
+                                                 closest_approach=True)
+        self.assertAlmostEqual(1, sum(e.score_ratio for e in evals), places=2)
+
+        # Don't fly straight over large gaps in telemetry.
+        logs = self.create_uas_logs([
+            (0, 38.145, -76.428, 100, 0),
+            (10, 38.149, -76.428, 100, 0),
+        ])
+        evals = UasTelemetry.satisfied_waypoints(gpos,
+                                                 waypoints,
+                                                 logs,
+                                                 closest_approach=True)
+        self.assertEqual([0, 0], [e.score_ratio for e in evals])
+
+    def test_merge_waypoint_hits(self):
+        """Tests merging hits keeps the first best of consecutive hits."""
+        hits = [(0, 10, 0.9), (1, 50, 0.5)]
+        self.assertEqual([(0, 10, 0.9), (1, 20, 0.8), (2, 0, 1)],
+                         UasTelemetry.merge_waypoint_hits(
+                             hits, [(1, 20, 0.8), (1, 30, 0.8), (2, 0, 1)]))
+        self.assertEqual([(0, 10, 0.9), (1, 50, 0.5), (0, 10, 0.9)],
+                         UasTelemetry.merge_waypoint_hits(
+                             hits, [(1, 60, 0.4), (0, 10, 0.9)]))
+        self.assertEqual(hits, UasTelemetry.merge_waypoint_hits(hits, []))
+        self.assertEqual([(0, 10, 0.9), (1, 50, 0.5)], hits)
+
+    def test_satisfied_waypoints_loadtest(self):
+        """Tests evaluating long loitering flights with many hits."""
+        waypoints = self.waypoints_from_data([
+            (38.145, -76.428, 100),
+            (38.145, -76.426, 100),
+            (38.147, -76.426, 100),
+            (38.147, -76.428, 100),
+        ])
+        # Loiter around the waypoints, hitting each once a second.
+        total_hits = 4000
+        logs = []
+        for i in range(total_hits):
+            wpt = waypoints[i % len(waypoints)]
+            logs.append(
+                UasTelemetry(user=self.user,
+                             timestamp=self.now +
+                             datetime.timedelta(seconds=i),
+                             latitude=wpt.latitude,
+                             longitude=wpt.longitude,
+                             altitude_msl=wpt.altitude_msl,
+                             uas_heading=0))
+
+        start_t = time.perf_counter()
+        evals = UasTelemetry.satisfied_waypoints(None, waypoints, logs)
+        end_t = time.perf_counter()
+        self.assertEqual([1] * len(waypoints), [e.score_ratio for e in evals])
+        hit_rate = total_hits / (end_t - start_t)
+        self.assertGreaterEqual(hit_rate, 2000)
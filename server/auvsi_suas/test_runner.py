@@ -14,7 +14,7 @@ class AuvsiSuasTestRunner(runner.DiscoverRunner):
         super(AuvsiSuasTestRunner, self).__init__(*args, **kwargs)
 
     def setup_test_environment(self):
-        """Create a custom MEDIA_ROOT and configure sendfile."""
+        """Create a custom MEDIA_ROOT, configure sendfile and caches."""
         super(AuvsiSuasTestRunner, self).setup_test_environment()
 
         # Scratch MEDIA_ROOT for odlc uploads
@@ -26,6 +26,21 @@ class AuvsiSuasTestRunner(runner.DiscoverRunner):
         self.sendfile_backend = settings.SENDFILE_BACKEND
         settings.SENDFILE_BACKEND = 'sendfile.backends.development'
 
+        # Use a cache private to the test process, as tests in parallel
+        # processes reuse object IDs.
+        self.caches = settings.CACHES
+        settings.CACHES = dict(self.caches)
+        settings.CACHES['shared'] = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'shared',
+            'TIMEOUT': None,
+        }
+
+        # Jobs run by background threads can't see data in the transaction of
+        # a test, so run jobs within the request which submits them.
+        self.evaluation_job_workers = settings.EVALUATION_JOB_WORKERS
+        settings.EVALUATION_JOB_WORKERS = 0
+
         # Disable logging
         logging.disable(logging.CRITICAL)
 
@@ -34,6 +49,8 @@ class AuvsiSuasTestRunner(runner.DiscoverRunner):
 
         settings.MEDIA_ROOT = self.media_root
         settings.SENDFILE_BACKEND = self.sendfile_backend
+        settings.CACHES = self.caches
+        settings.EVALUATION_JOB_WORKERS = self.evaluation_job_workers
 
         logging.disable(logging.NOTSET)
 
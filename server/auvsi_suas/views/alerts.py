@@ -0,0 +1,156 @@
+"""Live alerts view."""
+
+import json
+import logging
+import time
+from auvsi_suas.models import live_alerts
+from auvsi_suas.views.decorators import require_superuser
+from auvsi_suas.views.events import event_stream_response
+from auvsi_suas.views.events import release_connection
+from auvsi_suas.views.json import ProtoJsonEncoder
+from auvsi_suas.views.protobuf import proto_list_response
+from django.contrib.auth.models import User
+from django.http import HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+logger = logging.getLogger(__name__)
+
+# Duration of an alert stream, after which the client reconnects.
+ALERTS_STREAM_DURATION_SEC = 60
+# Interval at which a stream checks for new alerts.
+ALERTS_STREAM_POLL_SEC = 0.1
+# Interval at which a stream reloads teams and rechecks all alerts.
+ALERTS_STREAM_RELOAD_SEC = 10
+# Max time a stream is idle before sending a keepalive.
+ALERTS_STREAM_KEEPALIVE_SEC = 5
+# Time the client waits to reconnect after a stream ends.
+ALERTS_STREAM_RETRY_MS = 500
+
+
+def alert_protos(mission_id=None, after=None):
+    """Gets the recent alerts of all standard users.
+
+    Args:
+        mission_id: Optional. ID of the mission to get alerts of.
+        after: Optional. Dict from user ID to the ID of the last alert of the
+            user already seen, as for live_alerts.get_many.
+    Returns:
+        List of LiveAlert protos, sorted by timestamp.
+    """
+    users = list(User.objects.filter(is_superuser=False))
+    alerts = live_alerts.get_many(users, after)
+    if mission_id is not None:
+        alerts = [a for a in alerts if a.mission == mission_id]
+    return sorted(alerts, key=lambda a: (a.timestamp, a.team.id, a.id))
+
+
+def request_mission(request):
+    """Gets the optional mission ID to get alerts of from the request.
+
+    Raises:
+        ValueError: The mission isn't an ID.
+    """
+    if 'mission' not in request.GET:
+        return None
+    return int(request.GET['mission'])
+
+
+def encode_seen(seen):
+    """Encodes the IDs of the last alerts seen of each team as an event ID."""
+    return ','.join('%d:%d' % item for item in sorted(seen.items()))
+
+
+def decode_seen(event_id):
+    """Decodes an event ID from encode_seen.
+
+    Raises:
+        ValueError: The event ID isn't from encode_seen.
+    """
+    seen = {}
+    for item in filter(None, event_id.split(',')):
+        user_id, alert_id = item.split(':')
+        seen[int(user_id)] = int(alert_id)
+    return seen
+
+
+def live_alert_events(mission_id=None,
+                      seen=None,
+                      duration_sec=ALERTS_STREAM_DURATION_SEC):
+    """Generates server-sent events with new alerts.
+
+    The first event contains the recent alerts not yet seen. Subsequent
+    events contain the alerts added since the previous event. Each event's
+    data is a list of LiveAlert JSON formatted protos, and its ID encodes the
+    alerts seen so far, so a reconnecting client resumes after them.
+
+    Args:
+        mission_id: Optional. ID of the mission to stream alerts of.
+        seen: Optional. Dict from user ID to the ID of the last alert of the
+            user already seen, as decoded from the last event ID.
+        duration_sec: Duration of the stream.
+    """
+    yield 'retry: %d\n\n' % ALERTS_STREAM_RETRY_MS
+
+    start = time.monotonic()
+    seen = dict(seen or {})
+    first = True
+    version = None
+    reload_time = None
+    event_time = start
+    while time.monotonic() - start < duration_sec:
+        now = time.monotonic()
+        if reload_time is None or now - reload_time >= ALERTS_STREAM_RELOAD_SEC:
+            reload_time = now
+            version = None
+
+        current_version = live_alerts.version()
+        if current_version != version:
+            version = current_version
+            alerts = alert_protos(mission_id, seen)
+            for alert in alerts:
+                seen[alert.team.id] = max(seen.get(alert.team.id, 0), alert.id)
+            if alerts or first:
+                first = False
+                event_time = now
+                data = json.dumps(alerts, cls=ProtoJsonEncoder)
+                yield 'id: %s\ndata: %s\n\n' % (encode_seen(seen), data)
+
+        if now - event_time >= ALERTS_STREAM_KEEPALIVE_SEC:
+            event_time = now
+            yield ': keepalive\n\n'
+        release_connection()
+        time.sleep(ALERTS_STREAM_POLL_SEC)
+
+
+class Alerts(View):
+    """Gets the recent alerts of teams."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(Alerts, self).dispatch(*args, **kwargs)
+
+    def get(self, request):
+        try:
+            mission_id = request_mission(request)
+        except ValueError:
+            return HttpResponseBadRequest('Mission not an ID.')
+        return proto_list_response(request, alert_protos(mission_id))
+
+
+class AlertsStream(View):
+    """Streams new alerts of teams as server-sent events."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(AlertsStream, self).dispatch(*args, **kwargs)
+
+    def get(self, request):
+        try:
+            mission_id = request_mission(request)
+        except ValueError:
+            return HttpResponseBadRequest('Mission not an ID.')
+        # Reconnecting clients send the ID of the last event they received.
+        try:
+            seen = decode_seen(request.META.get('HTTP_LAST_EVENT_ID', ''))
+        except ValueError:
+            seen = None
+        return event_stream_response(live_alert_events(mission_id, seen))
@@ -0,0 +1,156 @@
+"""Tests for the alerts module."""
+
+import datetime
+import json
+from auvsi_suas.models import test_utils
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.views.alerts import decode_seen
+from auvsi_suas.views.alerts import encode_seen
+from auvsi_suas.views.alerts import live_alert_events
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+alerts_url = reverse('auvsi_suas:alerts')
+alerts_stream_url = reverse('auvsi_suas:alerts_stream')
+
+# Positions inside and outside of the fly zone of the sample mission.
+INSIDE = (38.1478, -76.4290)
+OUTSIDE = (38.1480, -76.4255)
+
+
+class TestAlertsViewCommon(TestCase):
+    """Common test setup."""
+    def setUp(self):
+        self.superuser = User.objects.create_superuser('superuser',
+                                                       'email@example.com',
+                                                       'superpass')
+        self.user = User.objects.create_user('user', 'email@example.com',
+                                             'testpass')
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        TakeoffOrLandingEvent(user=self.user,
+                              mission=self.mission,
+                              uas_in_air=True).save()
+        self.now = timezone.now()
+        self.sec = 0
+
+    def fly(self, pos):
+        self.sec += 1
+        UasTelemetry(user=self.user,
+                     timestamp=self.now + datetime.timedelta(seconds=self.sec),
+                     latitude=pos[0],
+                     longitude=pos[1],
+                     altitude_msl=300,
+                     uas_heading=90).save()
+
+
+class TestAlertsView(TestAlertsViewCommon):
+    """Tests the alerts view."""
+    def test_nonadmin(self):
+        """Tests alerts are only for superusers."""
+        self.client.force_login(self.user)
+        self.assertEqual(403, self.client.get(alerts_url).status_code)
+        self.assertEqual(403, self.client.get(alerts_stream_url).status_code)
+
+    def test_invalid_mission(self):
+        """Tests a mission which isn't an ID."""
+        self.client.force_login(self.superuser)
+        response = self.client.get(alerts_url, {'mission': 'a'})
+        self.assertEqual(400, response.status_code)
+
+    def test_get(self):
+        """Tests getting alerts, optionally of a mission."""
+        self.fly(INSIDE)
+        self.fly(OUTSIDE)
+        self.fly(INSIDE)
+        self.client.force_login(self.superuser)
+
+        response = self.client.get(alerts_url)
+        self.assertEqual(200, response.status_code)
+        alerts = json.loads(response.content)
+        self.assertEqual(['EXIT', 'ENTER'], [a['event'] for a in alerts])
+        self.assertEqual(['FLY_ZONE', 'FLY_ZONE'],
+                         [a['boundary'] for a in alerts])
+        self.assertEqual('user', alerts[0]['team']['username'])
+        self.assertEqual(self.mission.pk, alerts[0]['mission'])
+
+        response = self.client.get(alerts_url,
+                                   {'mission': self.mission.pk + 1})
+        self.assertEqual([], json.loads(response.content))
+
+
+class TestAlertsStreamView(TestAlertsViewCommon):
+    """Tests the alerts stream."""
+    def parse_event(self, event):
+        """Parses the ID and alerts of an event."""
+        self.assertTrue(event.startswith('id: '))
+        self.assertTrue(event.endswith('\n\n'))
+        id_line, data_line = event[len('id: '):-2].split('\n')
+        self.assertTrue(data_line.startswith('data: '))
+        return id_line, json.loads(data_line[len('data: '):])
+
+    def test_response(self):
+        """Response is an unbuffered event stream."""
+        self.client.force_login(self.superuser)
+        response = self.client.get(alerts_stream_url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        self.assertEqual('no', response['X-Accel-Buffering'])
+        self.assertNotIn('gzip', response.get('Content-Encoding', ''))
+        # Close as the test client does for consumed streams, so the test's
+        # database connection isn't closed.
+        request_finished.disconnect(close_old_connections)
+        try:
+            response.close()
+        finally:
+            request_finished.connect(close_old_connections)
+
+    def test_new_alerts(self):
+        """Events contain only new alerts."""
+        self.fly(OUTSIDE)
+        events = live_alert_events(self.mission.pk, duration_sec=10)
+        self.assertTrue(next(events).startswith('retry: '))
+        _, alerts = self.parse_event(next(events))
+        self.assertEqual(['EXIT'], [a['event'] for a in alerts])
+
+        self.fly(INSIDE)
+        _, alerts = self.parse_event(next(events))
+        self.assertEqual(['ENTER'], [a['event'] for a in alerts])
+        events.close()
+
+    def test_resume(self):
+        """Reconnecting streams resume after the last event."""
+        self.fly(OUTSIDE)
+        events = live_alert_events(self.mission.pk, duration_sec=10)
+        next(events)
+        event_id, alerts = self.parse_event(next(events))
+        self.assertEqual(1, len(alerts))
+        first_id = int(alerts[0]['id'])
+        self.assertEqual('%d:%d' % (self.user.pk, first_id), event_id)
+        events.close()
+
+        self.fly(INSIDE)
+        events = live_alert_events(self.mission.pk,
+                                   decode_seen(event_id),
+                                   duration_sec=10)
+        next(events)
+        event_id, alerts = self.parse_event(next(events))
+        self.assertEqual('%d:%d' % (self.user.pk, first_id + 1), event_id)
+        self.assertEqual(['ENTER'], [a['event'] for a in alerts])
+        events.close()
+
+    def test_decode_seen(self):
+        """Event IDs decode to the alerts seen."""
+        self.assertEqual({}, decode_seen(''))
+        self.assertEqual({1: 2, 3: 4}, decode_seen(encode_seen({1: 2, 3: 4})))
+        with self.assertRaises(ValueError):
+            decode_seen('invalid')
+
+    def test_duration(self):
+        """Stream ends after its duration."""
+        events = list(live_alert_events(duration_sec=0.5))
+        self.assertEqual(2, len(events))
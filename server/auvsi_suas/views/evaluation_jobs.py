@@ -0,0 +1,453 @@
+"""Evaluation of teams as jobs run in the background.
+
+Jobs are run by a pool of threads in the server process which submitted them.
+The status and resulting zip file of each job are stored in MEDIA_ROOT, so any
+server process can report the progress of a job and serve its result.
+"""
+
+import base64
+import csv
+import io
+import json
+import logging
+import math
+import os
+import socket
+import tempfile
+import textwrap
+import threading
+import uuid
+import zipfile
+from auvsi_suas.models import mission_evaluation
+from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.proto import interop_admin_api_pb2
+from auvsi_suas.views.json import pretty_json
+from concurrent.futures import ThreadPoolExecutor
+from django import db
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.template.loader import get_template
+from django.utils import dateparse
+from django.utils import timezone
+from django.utils.html import escape
+from google.protobuf import json_format
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal import type_checkers
+
+logger = logging.getLogger(__name__)
+
+# Directory within MEDIA_ROOT to store job status and results.
+RESULTS_DIR = 'evaluations'
+# Extension of job status files.
+STATUS_EXT = '.json'
+# Extension of job result files.
+RESULT_EXT = '.zip'
+# Time after which a running job which hasn't written its status is failed.
+HEARTBEAT_TIMEOUT_SEC = 60 * 60
+
+
+def _json_double(value):
+    """Converts a double to its JSON format value."""
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if math.isnan(value):
+        return 'NaN'
+    return value
+
+
+def _json_float(value):
+    """Converts a float to its JSON format value."""
+    value = _json_double(value)
+    if isinstance(value, float):
+        return type_checkers.ToShortestFloat(value)
+    return value
+
+
+# Converters of scalar values to their JSON format value, by C++ type. Other
+# scalar values are unchanged.
+_JSON_CONVERTERS = {
+    FieldDescriptor.CPPTYPE_INT64: str,
+    FieldDescriptor.CPPTYPE_UINT64: str,
+    FieldDescriptor.CPPTYPE_DOUBLE: _json_double,
+    FieldDescriptor.CPPTYPE_FLOAT: _json_float,
+}
+
+# Column schema of each message type, keyed by full name.
+_column_schemas = {}
+
+
+def column_schema(descriptor):
+    """Gets the column schema of the message type.
+
+    Args:
+        descriptor: The Descriptor of the message type.
+    Returns:
+        Dict from field name to a tuple of the field's column name, whether
+        it is repeated, and a function converting a value of the field to its
+        column value, or None if the field is a message.
+    """
+    schema = _column_schemas.get(descriptor.full_name)
+    if schema is not None:
+        return schema
+
+    schema = {}
+    for field in descriptor.fields:
+        if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+            convert = None
+        elif field.cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+            names = {v.number: v.name for v in field.enum_type.values}
+            convert = lambda value, names=names: names.get(value, value)
+        elif field.type == FieldDescriptor.TYPE_BYTES:
+            convert = lambda value: base64.b64encode(value).decode('utf-8')
+        else:
+            convert = _JSON_CONVERTERS.get(field.cpp_type, lambda v: v)
+        schema[field.name] = (field.json_name,
+                              field.label == FieldDescriptor.LABEL_REPEATED,
+                              convert)
+    _column_schemas[descriptor.full_name] = schema
+    return schema
+
+
+def flatten_proto(proto, row=None, prefix=''):
+    """Flattens a proto to a dict from dotted path to value.
+
+    Paths and values are those of the proto's JSON format, with the index of
+    repeated values as a path component.
+
+    Args:
+        proto: The proto to flatten.
+        row: Optional dict to add the values to.
+        prefix: Prefix of the paths of the values.
+    Returns:
+        The dict of values.
+    """
+    if row is None:
+        row = {}
+    schema = column_schema(proto.DESCRIPTOR)
+    for field, value in proto.ListFields():
+        column, repeated, convert = schema[field.name]
+        column = prefix + column
+        if repeated:
+            items = [('%s.%d' % (column, ix), v) for ix, v in enumerate(value)]
+        else:
+            items = [(column, value)]
+        for column, value in items:
+            if convert is None:
+                flatten_proto(value, row, column + '.')
+            else:
+                row[column] = convert(value)
+    return row
+
+
+def write_csv(rows, col_headers, f):
+    """Writes CSV of the flattened rows to the text file object."""
+    writer = csv.DictWriter(f, fieldnames=sorted(col_headers))
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def csv_from_protos(protos):
+    """Generates a CSV string with a row for each proto."""
+    rows = [flatten_proto(proto) for proto in protos]
+    col_headers = set()
+    for row in rows:
+        col_headers.update(row.keys())
+
+    csv_io = io.StringIO()
+    write_csv(rows, col_headers, csv_io)
+    csv_output = csv_io.getvalue()
+    csv_io.close()
+
+    return csv_output
+
+
+def feedback_html_parts():
+    """Splits the feedback page around the feedback of each team.
+
+    Returns:
+        A tuple of the page before the first team's feedback, between the
+        feedback of teams, and after the last team's feedback. The feedback
+        must be HTML escaped.
+    """
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    page = get_template('feedback.html').render({'feedbacks': [first, second]})
+    head, rest = page.split(first)
+    between, tail = rest.split(second)
+    return head, between, tail
+
+
+class ChunkWriter(object):
+    """Unseekable file object which collects writes, to stream them."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        """Gets and clears the data written so far."""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(team_evals):
+    """Generates the zip file with CSV & JSON data of the evaluation.
+
+    Zip file contains a master CSV, HTML and JSON file with all evaluation
+    data. It also contains per-team JSON files for individual team feedback.
+    Team files are generated as each team's evaluation is reached, and the
+    master files at the end from team data spooled to disk, so only one team
+    is held in memory.
+
+    Args:
+        team_evals: Iterable of the MissionEvaluation of each team.
+    Yields:
+        The bytes of the zip file, in chunks.
+    """
+    out = ChunkWriter()
+    spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+    with spool, zipfile.ZipFile(out, 'w') as zip_file:
+        teams = 0
+        col_headers = set()
+        for team_eval in team_evals:
+            team_json = pretty_json(json_format.MessageToJson(team_eval))
+            zip_file.writestr(
+                '/evaluate_teams/teams/%s.json' % team_eval.team.username,
+                team_json)
+            yield out.take()
+            # Spool each team as a line of JSON, with its CSV row.
+            row = flatten_proto(team_eval)
+            spool.write(json.dumps([team_json, row]) + '\n')
+            col_headers.update(row.keys())
+            teams += 1
+
+        def spooled(ix):
+            """Generates the spooled team JSON (ix 0) or CSV rows (ix 1)."""
+            spool.seek(0)
+            for line in spool:
+                yield json.loads(line)[ix]
+
+        # Write the master JSON as pretty_json would format all teams.
+        with zip_file.open('/evaluate_teams/all.json', 'w') as f:
+            if teams:
+                f.write(b'{\n    "teams": [\n')
+                for ix, team_json in enumerate(spooled(0)):
+                    if ix:
+                        f.write(b',\n')
+                    f.write(textwrap.indent(team_json, ' ' * 8).encode())
+                f.write(b'\n    ]\n}')
+            else:
+                f.write(b'{}')
+        yield out.take()
+
+        with zip_file.open('/evaluate_teams/all.html', 'w') as f:
+            if teams:
+                head, between, tail = feedback_html_parts()
+                f.write(head.encode())
+                for ix, team_json in enumerate(spooled(0)):
+                    if ix:
+                        f.write(between.encode())
+                    f.write(escape(team_json).encode())
+                f.write(tail.encode())
+            else:
+                f.write(
+                    get_template('feedback.html').render({
+                        'feedbacks': []
+                    }).encode())
+        yield out.take()
+
+        with zip_file.open('/evaluate_teams/all.csv', 'w') as f:
+            with io.TextIOWrapper(f, encoding='utf-8', newline='') as text:
+                write_csv(spooled(1), col_headers, text)
+    yield out.take()
+
+
+def job_stopped(job):
+    """Whether the unfinished job is no longer run by any process.
+
+    A job is stopped if its process on this host is no longer running, or if
+    it's running and hasn't written its status within HEARTBEAT_TIMEOUT_SEC.
+    """
+    if job.state not in (interop_admin_api_pb2.EvaluationJob.QUEUED,
+                         interop_admin_api_pb2.EvaluationJob.RUNNING):
+        return False
+    if job.HasField('pid') and job.host == socket.gethostname():
+        try:
+            os.kill(job.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+    if (job.state == interop_admin_api_pb2.EvaluationJob.RUNNING
+            and job.HasField('heartbeat_time')):
+        heartbeat = dateparse.parse_datetime(job.heartbeat_time)
+        return ((timezone.now() - heartbeat).total_seconds() >
+                HEARTBEAT_TIMEOUT_SEC)
+    return False
+
+
+class EvaluationJobs(object):
+    """Runs evaluation jobs, and stores their status and results."""
+    def __init__(self, results_dir, workers):
+        """Creates the jobs without starting any threads.
+
+        Args:
+            results_dir: Directory to store job status and results.
+            workers: Max number of jobs run at once. If 0, jobs are run by
+                the thread which submits them.
+        """
+        self.results_dir = results_dir
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='EvaluationJobs') if workers else None
+
+    def status_path(self, job_id):
+        """Gets the path of the status file of the job."""
+        return os.path.join(self.results_dir, job_id + STATUS_EXT)
+
+    def result_path(self, job_id):
+        """Gets the path of the result zip file of the job."""
+        return os.path.join(self.results_dir, job_id + RESULT_EXT)
+
+    def write_status(self, job):
+        """Writes the status of the job, replacing any previous status.
+
+        Running jobs record the time as their heartbeat.
+        """
+        if job.state == interop_admin_api_pb2.EvaluationJob.RUNNING:
+            job.heartbeat_time = timezone.now().isoformat()
+        path = self.status_path(job.id)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            f.write(json_format.MessageToJson(job))
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """Gets the status of the job.
+
+        Jobs whose process stopped before finishing them are marked failed.
+
+        Args:
+            job_id: The ID of the job.
+        Returns:
+            The EvaluationJob, or None if there is no such job.
+        """
+        try:
+            with open(self.status_path(job_id)) as f:
+                job = json_format.Parse(f.read(),
+                                        interop_admin_api_pb2.EvaluationJob())
+        except FileNotFoundError:
+            return None
+
+        if job_stopped(job):
+            logger.error('Evaluation job %s stopped in process %d on %s.',
+                         job.id, job.pid, job.host)
+            job.state = interop_admin_api_pb2.EvaluationJob.FAILED
+            job.error = 'Job stopped before finishing, server process may have exited.'
+            self.write_status(job)
+        return job
+
+    def submit(self, mission_pk, user_pks=None, background=True):
+        """Submits a job to evaluate teams against the mission.
+
+        Args:
+            mission_pk: The ID of the mission to evaluate against.
+            user_pks: Optional list of IDs of the users to eval. If None will
+                evaluate all.
+            background: Whether to run the job in the background. If False, or
+                there are no background workers, the job is run before
+                returning.
+        Returns:
+            The EvaluationJob as submitted, or as finished if run before
+            returning.
+        """
+        job = interop_admin_api_pb2.EvaluationJob()
+        job.id = str(uuid.uuid4())
+        job.mission = mission_pk
+        job.state = interop_admin_api_pb2.EvaluationJob.QUEUED
+        job.host = socket.gethostname()
+        job.pid = os.getpid()
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.write_status(job)
+
+        if not background or self.executor is None:
+            self.run(job, user_pks)
+        else:
+            # The background thread updates its own copy of the job.
+            background_job = interop_admin_api_pb2.EvaluationJob()
+            background_job.CopyFrom(job)
+            self.executor.submit(self.run_background, background_job, user_pks)
+        return job
+
+    def run_background(self, job, user_pks):
+        """Runs the job in a background thread. See run."""
+        # Recover from connections broken since the thread's last job.
+        db.close_old_connections()
+        try:
+            self.run(job, user_pks)
+        finally:
+            db.connection.close()
+
+    def run(self, job, user_pks):
+        """Runs the job, updating its status as teams are evaluated.
+
+        Args:
+            job: The EvaluationJob to run, which is updated.
+            user_pks: Optional list of IDs of the users to eval. If None will
+                evaluate all.
+        """
+        job.state = interop_admin_api_pb2.EvaluationJob.RUNNING
+        self.write_status(job)
+
+        def progress(usernames, evaluated):
+            del job.teams[:]
+            for username in usernames:
+                team = job.teams.add()
+                team.username = username
+                team.evaluated = username in evaluated
+            self.write_status(job)
+
+        try:
+            mission = MissionConfig.objects.get(pk=job.mission)
+            users = None
+            if user_pks is not None:
+                users = list(User.objects.filter(pk__in=user_pks))
+            team_evals = mission_evaluation.iter_team_evaluations(
+                mission, users, progress=progress)
+
+            path = self.result_path(job.id)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for chunk in zip_chunks(team_evals):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.exception('Evaluation job %s failed.', job.id)
+            job.state = interop_admin_api_pb2.EvaluationJob.FAILED
+            job.error = str(e)
+            self.write_status(job)
+            return
+
+        job.state = interop_admin_api_pb2.EvaluationJob.DONE
+        self.write_status(job)
+
+
+# The jobs of this process, created on first use.
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs():
+    """Gets the evaluation jobs of this process."""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = EvaluationJobs(
+                os.path.join(settings.MEDIA_ROOT, RESULTS_DIR),
+                settings.EVALUATION_JOB_WORKERS)
+        return _jobs
@@ -0,0 +1,231 @@
+"""Tests for the evaluation_jobs module."""
+
+import io
+import json
+import os
+import datetime
+import shutil
+import socket
+import subprocess
+import tempfile
+import zipfile
+from auvsi_suas.models import mission_evaluation
+from auvsi_suas.models import test_utils
+from auvsi_suas.proto import interop_admin_api_pb2
+from auvsi_suas.views.evaluation_jobs import EvaluationJobs
+from auvsi_suas.views.evaluation_jobs import csv_from_protos
+from auvsi_suas.views.evaluation_jobs import flatten_proto
+from auvsi_suas.views.evaluation_jobs import zip_chunks
+from auvsi_suas.views.json import pretty_json
+from django.contrib.auth.models import User
+from django.template.loader import get_template
+from django.utils import timezone
+from google.protobuf import json_format
+from django.test import TestCase
+from django.test import TransactionTestCase
+
+
+class TestFlattenProto(TestCase):
+    """Tests the flatten_proto function."""
+    def test_flatten_proto(self):
+        """Tests values are flattened as in the JSON format."""
+        job = interop_admin_api_pb2.EvaluationJob()
+        job.id = 'x'
+        job.state = interop_admin_api_pb2.EvaluationJob.DONE
+        job.teams.add(username='a', evaluated=True)
+        job.teams.add(username='b')
+        self.assertEqual(
+            {
+                'id': 'x',
+                'state': 'DONE',
+                'teams.0.username': 'a',
+                'teams.0.evaluated': True,
+                'teams.1.username': 'b',
+            }, flatten_proto(job))
+
+    def test_scalar_types(self):
+        """Tests 64 bit ints and non-finite doubles are as in JSON format."""
+        odlc = interop_admin_api_pb2.OdlcEvaluation()
+        odlc.real_odlc = 1
+        odlc.score_ratio = 0.5
+        odlc.geolocation_accuracy_ft = float('inf')
+        self.assertEqual(
+            {
+                'realOdlc': '1',
+                'scoreRatio': 0.5,
+                'geolocationAccuracyFt': 'Infinity',
+            }, flatten_proto(odlc))
+
+
+class TestCsvFromProtos(TestCase):
+    """Tests the csv_from_protos function."""
+    def test_csv_from_protos(self):
+        """Tests nested protos are flattened to sorted columns."""
+        first = interop_admin_api_pb2.EvaluationJob()
+        first.mission = 1
+        first.teams.add(username='a')
+        first.teams.add(username='b')
+        second = interop_admin_api_pb2.EvaluationJob()
+        second.error = 'x'
+        self.assertEqual(
+            'error,mission,teams.0.username,teams.1.username\r\n'
+            ',1,a,b\r\n'
+            'x,,,\r\n', csv_from_protos([first, second]))
+
+
+class TestZipChunks(TestCase):
+    """Tests the zip_chunks function."""
+    def setUp(self):
+        superuser = User.objects.create_superuser(username='superuser',
+                                                  password='testpass',
+                                                  email='test@test.com')
+        self.mission = test_utils.create_sample_mission(superuser)
+        for username in ['user0', 'user1']:
+            user = User.objects.create_user(username=username,
+                                            password='testpass',
+                                            email='test@test.com')
+            test_utils.simulate_team_mission(self, self.mission, superuser,
+                                             user)
+
+    def assertZipMatches(self, mission_eval):
+        """Asserts the zip of the teams matches the whole evaluation."""
+        chunks = list(zip_chunks(mission_eval.teams))
+        # First chunk is written before evaluating the second team.
+        self.assertGreater(len(chunks), len(mission_eval.teams))
+
+        team_jsons = [
+            pretty_json(json_format.MessageToJson(t))
+            for t in mission_eval.teams
+        ]
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zip_file:
+            self.assertEqual(
+                pretty_json(json_format.MessageToJson(mission_eval)),
+                zip_file.read('/evaluate_teams/all.json').decode())
+            self.assertEqual(
+                get_template('feedback.html').render({'feedbacks':
+                                                      team_jsons}),
+                zip_file.read('/evaluate_teams/all.html').decode())
+            self.assertEqual(csv_from_protos(mission_eval.teams),
+                             zip_file.read('/evaluate_teams/all.csv').decode())
+            for team_eval, team_json in zip(mission_eval.teams, team_jsons):
+                self.assertEqual(
+                    team_json,
+                    zip_file.read('/evaluate_teams/teams/%s.json' %
+                                  team_eval.team.username).decode())
+
+    def test_zip_chunks(self):
+        """Tests the streamed zip matches the evaluation of all teams."""
+        self.assertZipMatches(mission_evaluation.evaluate_teams(self.mission))
+
+    def test_zip_chunks_no_teams(self):
+        """Tests the streamed zip without teams."""
+        self.assertZipMatches(
+            interop_admin_api_pb2.MultiUserMissionEvaluation())
+
+
+class TestEvaluationJobs(TestCase):
+    """Tests jobs run by the submitting thread."""
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(username='superuser',
+                                                       password='testpass',
+                                                       email='test@test.com')
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        self.user = User.objects.create_user(username='user0',
+                                             password='testpass',
+                                             email='test@test.com')
+        test_utils.simulate_team_mission(self, self.mission, self.superuser,
+                                         self.user)
+
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir)
+        self.jobs = EvaluationJobs(self.results_dir, 0)
+
+    def test_run(self):
+        """Tests a job stores its status and result."""
+        job = self.jobs.submit(self.mission.pk)
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.DONE, job.state)
+        self.assertEqual(job, self.jobs.get(job.id))
+        self.assertEqual(['user0'], [t.username for t in job.teams])
+        self.assertTrue(all(t.evaluated for t in job.teams))
+
+        with zipfile.ZipFile(self.jobs.result_path(job.id)) as zip_file:
+            data = json.loads(zip_file.read('/evaluate_teams/all.json'))
+            self.assertIn(
+                'user0',
+                zip_file.read('/evaluate_teams/all.html').decode('utf-8'))
+        self.assertEqual('user0', data['teams'][0]['team']['username'])
+
+    def test_failed(self):
+        """Tests a failed job stores the error."""
+        job = self.jobs.submit(1000)
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.FAILED, job.state)
+        self.assertIn('does not exist', job.error)
+        self.assertEqual(job, self.jobs.get(job.id))
+        self.assertFalse(os.path.exists(self.jobs.result_path(job.id)))
+
+    def test_get_missing(self):
+        """Tests getting a job which doesn't exist."""
+        self.assertIsNone(self.jobs.get('missing'))
+
+    def write_job(self, state, **fields):
+        job = interop_admin_api_pb2.EvaluationJob(id='job',
+                                                  mission=self.mission.pk,
+                                                  state=state,
+                                                  host=socket.gethostname(),
+                                                  pid=os.getpid())
+        for field, value in fields.items():
+            setattr(job, field, value)
+        with open(self.jobs.status_path(job.id), 'w') as f:
+            f.write(json_format.MessageToJson(job))
+        return job
+
+    def test_process_exited(self):
+        """Tests unfinished jobs of exited processes are failed."""
+        job = self.write_job(interop_admin_api_pb2.EvaluationJob.QUEUED)
+        self.assertEqual(job, self.jobs.get(job.id))
+
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        self.write_job(interop_admin_api_pb2.EvaluationJob.QUEUED,
+                       pid=exited.pid)
+        job = self.jobs.get(job.id)
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.FAILED, job.state)
+        self.assertIn('stopped', job.error)
+        self.assertEqual(job, self.jobs.get(job.id))
+
+    def test_heartbeat_timeout(self):
+        """Tests running jobs which stop writing their status are failed."""
+        now = timezone.now()
+        job = self.write_job(interop_admin_api_pb2.EvaluationJob.RUNNING,
+                             host='other',
+                             heartbeat_time=now.isoformat())
+        self.assertEqual(job, self.jobs.get(job.id))
+
+        self.write_job(
+            interop_admin_api_pb2.EvaluationJob.RUNNING,
+            host='other',
+            heartbeat_time=(now - datetime.timedelta(hours=2)).isoformat())
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.FAILED,
+                         self.jobs.get(job.id).state)
+
+
+class TestEvaluationJobsBackground(TransactionTestCase):
+    """Tests jobs run by background threads."""
+    def test_run_background(self):
+        """Tests a job is run in the background."""
+        superuser = User.objects.create_superuser(username='superuser',
+                                                  password='testpass',
+                                                  email='test@test.com')
+        mission = test_utils.create_sample_mission(superuser)
+
+        results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, results_dir)
+        jobs = EvaluationJobs(results_dir, 1)
+        job = jobs.submit(mission.pk)
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.QUEUED, job.state)
+
+        # Wait for the job to finish.
+        jobs.executor.shutdown(wait=True)
+        job = jobs.get(job.id)
+        self.assertEqual(interop_admin_api_pb2.EvaluationJob.DONE, job.state)
+        self.assertTrue(os.path.exists(jobs.result_path(job.id)))
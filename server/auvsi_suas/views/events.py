@@ -0,0 +1,52 @@
+"""Utilities for streaming server-sent events."""
+
+import threading
+from django import db
+from django.http import StreamingHttpResponse
+
+# Max number of streams a process serves at once. Streams hold their thread,
+# so this leaves threads of each process (see uwsgi.ini) for other requests.
+STREAMS_PER_PROCESS = 2
+# Time the client waits to reconnect when the process has max streams.
+STREAMS_BUSY_RETRY_MS = 1000
+
+# Permits for the streams served by the process.
+_streams = threading.BoundedSemaphore(STREAMS_PER_PROCESS)
+
+
+def limit_streams(events):
+    """Generates the events if the process isn't serving max streams.
+
+    Otherwise the stream ends after telling the client to reconnect later,
+    when it may connect to a process with a free thread.
+    """
+    if not _streams.acquire(blocking=False):
+        yield 'retry: %d\n\n' % STREAMS_BUSY_RETRY_MS
+        return
+    try:
+        yield from events
+    finally:
+        _streams.release()
+
+
+def event_stream_response(events):
+    """Builds a response streaming the server-sent events generated."""
+    response = StreamingHttpResponse(limit_streams(events),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Events must be sent as generated, so disable buffering by nginx and
+    # compression by the gzip middleware.
+    response['X-Accel-Buffering'] = 'no'
+    response['Content-Encoding'] = 'identity'
+    return response
+
+
+def release_connection():
+    """Closes the thread's database connection while a stream is idle.
+
+    Streams occupy their thread for minutes, so keeping the persistent
+    connection open would hold a database connection per stream. Connections
+    within a transaction, as in tests, are kept open.
+    """
+    if not db.connection.in_atomic_block:
+        db.connection.close()
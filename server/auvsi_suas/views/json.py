@@ -5,6 +5,11 @@ from google.protobuf import json_format
 from google.protobuf import message
 
 
+def pretty_json(json_str):
+    """Generates a pretty-print json from any json."""
+    return json.dumps(json.loads(json_str), indent=4)
+
+
 class ProtoJsonEncoder(json.JSONEncoder):
     """Custom encoder which can serialize protobuf objects."""
     def default(self, obj):
@@ -1,15 +1,12 @@
 """Missions view."""
 
-import copy
-import csv
-import io
-import json
 import logging
 import math
 import numpy as np
 import pyproj
-import zipfile
 from auvsi_suas.models import distance
+from auvsi_suas.models import live_alerts
+from auvsi_suas.models import live_evaluation
 from auvsi_suas.models import mission_evaluation
 from auvsi_suas.models import units
 from auvsi_suas.models.mission_config import MissionConfig
@@ -19,10 +16,15 @@ from auvsi_suas.patches.simplekml_patch import AltitudeMode
 from auvsi_suas.patches.simplekml_patch import Color
 from auvsi_suas.patches.simplekml_patch import Kml
 from auvsi_suas.patches.simplekml_patch import RefreshMode
+from auvsi_suas.proto import interop_admin_api_pb2
 from auvsi_suas.proto import interop_api_pb2
+from auvsi_suas.views import evaluation_jobs
 from auvsi_suas.views.decorators import require_login
 from auvsi_suas.views.decorators import require_superuser
-from auvsi_suas.views.json import ProtoJsonEncoder
+from auvsi_suas.views.json import pretty_json
+from auvsi_suas.views.protobuf import proto_etag
+from auvsi_suas.views.protobuf import proto_list_response
+from auvsi_suas.views.protobuf import proto_response
 from datetime import timedelta
 from django.contrib.auth.models import User
 from django.contrib.sessions.models import Session
@@ -31,16 +33,19 @@ from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
 from django.http import HttpResponseForbidden
 from django.http import HttpResponseNotFound
-from django.http import HttpResponseServerError
-from django.template.loader import get_template
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import TemplateView
 from django.views.generic import View
 from google.protobuf import json_format
+from sendfile import sendfile
 
 logger = logging.getLogger(__name__)
 
+KML_ALERT_ICON = 'http://maps.google.com/mapfiles/kml/shapes/caution.png'
 KML_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 KML_DROP_ICON = 'http://maps.google.com/mapfiles/kml/shapes/target.png'
 KML_HOME_ICON = 'http://maps.google.com/mapfiles/kml/paddle/grn-circle.png'
@@ -111,20 +116,31 @@ def mission_proto(mission):
     return mission_proto
 
 
+def missions_etag(request, *args, **kwargs):
+    """ETag for missions, which changes when any mission is edited."""
+    return proto_etag(request, 'missions-%d' % MissionConfig.version())
+
+
+def mission_etag(request, pk):
+    """ETag for a mission, which changes when the mission is edited."""
+    return proto_etag(request,
+                      'missions-%d-%d' % (pk, MissionConfig.version(pk)))
+
+
 class Missions(View):
     """Handles requests for all missions."""
     @method_decorator(require_superuser)
     def dispatch(self, *args, **kwargs):
         return super(Missions, self).dispatch(*args, **kwargs)
 
+    @method_decorator(condition(etag_func=missions_etag))
     def get(self, request):
         missions = MissionConfig.objects.select_related().all()
         out = []
         for mission in missions:
             out.append(mission_proto(mission))
 
-        return HttpResponse(json.dumps(out, cls=ProtoJsonEncoder),
-                            content_type="application/json")
+        return proto_list_response(request, out)
 
 
 class MissionsId(View):
@@ -133,14 +149,14 @@ class MissionsId(View):
     def dispatch(self, *args, **kwargs):
         return super(MissionsId, self).dispatch(*args, **kwargs)
 
+    @method_decorator(condition(etag_func=mission_etag))
     def get(self, request, pk):
         try:
             mission = MissionConfig.objects.select_related().get(pk=pk)
         except MissionConfig.DoesNotExist:
             return HttpResponseNotFound('Mission %s not found.' % pk)
 
-        return HttpResponse(json_format.MessageToJson(mission_proto(mission)),
-                            content_type="application/json")
+        return proto_response(request, mission_proto(mission))
 
 
 def fly_zone_kml(fly_zone, kml):
@@ -182,13 +198,9 @@ def mission_kml(mission, kml, kml_doc):
     kml_folder = kml.newfolder(name=mission_name)
 
     # Transform from WGS84 to UTM at home position.
-    wgs_to_utm = pyproj.transformer.Transformer.from_proj(
-        distance.proj_wgs84,
-        distance.proj_utm(mission.home_pos.latitude,
-                          mission.home_pos.longitude))
+    wgs_to_utm = mission.utm_frame().transformer
     # Transform from WGS84 to Web Mercator.
-    wgs_to_web_mercator = pyproj.transformer.Transformer.from_proj(
-        distance.proj_wgs84, distance.proj_web_mercator)
+    wgs_to_web_mercator = distance.wgs_to_web_mercator()
 
     # Flight boundaries.
     fly_zone_folder = kml_folder.newfolder(name='Fly Zones')
@@ -311,7 +323,8 @@ def uas_telemetry_kml(user, flight_logs, kml, kml_doc):
 
     Args:
         user: A Django User to get username from
-        flight_logs: A sequence of UasTelemetry logs per flight period.
+        flight_logs: A sequence of UasTelemetry logs, or telemetry arrays,
+            per flight period.
         kml: A simpleKML Container to which the flight data will be added
         kml_doc: The simpleKML Document to which schemas will be added
     Returns:
@@ -323,23 +336,24 @@ def uas_telemetry_kml(user, flight_logs, kml, kml_doc):
     for i, logs in enumerate(flight_logs):
         name = '%s Flight %d' % (user.username, i + 1)
 
-        logs = UasTelemetry.dedupe(UasTelemetry.filter_bad(logs))
+        logs = UasTelemetry.dedupe_array(
+            UasTelemetry.filter_bad_array(UasTelemetry.as_array(logs)))
 
         coords = []
         angles = []
         when = []
-        for entry in logs:
+        for (timestamp, latitude, longitude, altitude_msl,
+             uas_heading) in logs.tolist():
             # Spatial Coordinates
-            coord = (entry.longitude, entry.latitude,
-                     units.feet_to_meters(entry.altitude_msl))
+            coord = (longitude, latitude, units.feet_to_meters(altitude_msl))
             coords.append(coord)
 
-            # Time Elements
-            time = entry.timestamp.strftime(KML_DATETIME_FORMAT)
+            # Time Elements, as UTC.
+            time = timestamp.strftime(KML_DATETIME_FORMAT)
             when.append(time)
 
             # Degrees heading, tilt, and roll
-            angle = (entry.uas_heading, 0.0, 0.0)
+            angle = (uas_heading, 0.0, 0.0)
             angles.append(angle)
 
         # Ignore tracks with no data.
@@ -386,6 +400,40 @@ def uas_telemetry_live_kml(kml, timespan):
         point.altitudemode = AltitudeMode.absolute
 
 
+def live_alerts_kml(kml, timespan):
+    """Appends kml nodes describing the recent alerts of teams.
+
+    Args:
+        kml: A simpleKML Container to which the alerts will be added.
+        timespan: The timedelta of the alerts to add, before now.
+    """
+    users = User.objects.filter(is_superuser=False).order_by('username')
+    since = timezone.now() - timespan
+    kml_folder = None
+    for alert in live_alerts.get_many(list(users)):
+        if parse_datetime(alert.timestamp) < since:
+            continue
+        if not kml_folder:
+            kml_folder = kml.newfolder(name='Alerts')
+        name = '%s %s %s' % (alert.team.username,
+                             interop_admin_api_pb2.LiveAlert.Event.Name(
+                                 alert.event).lower(),
+                             interop_admin_api_pb2.LiveAlert.Boundary.Name(
+                                 alert.boundary).lower())
+        if alert.HasField('stationary_obstacle'):
+            name += ' %d' % alert.stationary_obstacle
+        telemetry = alert.telemetry
+        point = kml_folder.newpoint(
+            name=name,
+            description='%.1f ft from boundary at %s' %
+            (alert.distance_ft, alert.timestamp),
+            coords=[(telemetry.longitude, telemetry.latitude,
+                     units.feet_to_meters(telemetry.altitude))])
+        point.iconstyle.icon.href = KML_ALERT_ICON
+        point.iconstyle.color = Color.red
+        point.altitudemode = AltitudeMode.absolute
+
+
 class ExportKml(View):
     """ Generates a KML file HttpResponse"""
     @method_decorator(require_superuser)
@@ -405,11 +453,12 @@ class ExportKml(View):
                 flights = TakeoffOrLandingEvent.flights(mission, user)
                 if not flights:
                     continue
-                uas_telemetry_kml(user=user,
-                                  flight_logs=UasTelemetry.by_time_period(
-                                      user, flights),
-                                  kml=kml_flights,
-                                  kml_doc=kml.document)
+                uas_telemetry_kml(
+                    user=user,
+                    flight_logs=UasTelemetry.array_by_time_period(
+                        user, flights),
+                    kml=kml_flights,
+                    kml_doc=kml.document)
 
         response = HttpResponse(kml.kml())
         response['Content-Type'] = 'application/vnd.google-earth.kml+xml'
@@ -480,6 +529,7 @@ class LiveKmlUpdate(View):
     def get(self, request):
         kml = Kml(name='LIVE Data')
         uas_telemetry_live_kml(kml, timedelta(seconds=5))
+        live_alerts_kml(kml, timedelta(minutes=1))
 
         response = HttpResponse(kml.kml())
         response['Content-Type'] = 'application/vnd.google-earth.kml+xml'
@@ -488,9 +538,19 @@ class LiveKmlUpdate(View):
         return response
 
 
-def pretty_json(json_str):
-    """Generates a pretty-print json from any json."""
-    return json.dumps(json.loads(json_str), indent=4)
+def evaluation_users(request):
+    """Gets the users to evaluate from the optional team of the request.
+
+    Returns:
+        The list of user IDs to evaluate, or None to evaluate all.
+    Raises:
+        ValueError: The team isn't an ID.
+        User.DoesNotExist: The team doesn't exist.
+    """
+    if 'team' not in request.GET:
+        return None
+    team = int(request.GET['team'])
+    return [User.objects.get(pk=team).pk]
 
 
 class Evaluate(View):
@@ -499,98 +559,127 @@ class Evaluate(View):
     Zip file contains a master CSV and JSON file with all evaluation data.
     It also contains per-team JSON files for individual team feedback.
     """
-
-    feedback_template = get_template('feedback.html')
-
     @method_decorator(require_superuser)
     def dispatch(self, *args, **kwargs):
         return super(Evaluate, self).dispatch(*args, **kwargs)
 
-    def csv_from_json(self, json_list):
-        """Generates a CSV string from a list of rows as JSON strings."""
-        csv_list = []
-        for json_row in json_list:
-            csv_dict = {}
-            work_queue = [([], json.loads(json_row))]
-            while len(work_queue) > 0:
-                (cur_prefixes, cur_val) = work_queue.pop()
-                if isinstance(cur_val, dict):
-                    for (key, val) in cur_val.items():
-                        new_prefixes = copy.copy(cur_prefixes)
-                        new_prefixes.append(str(key))
-                        work_queue.append((new_prefixes, val))
-                elif isinstance(cur_val, list):
-                    for ix, val in enumerate(cur_val):
-                        new_prefixes = copy.copy(cur_prefixes)
-                        new_prefixes.append(str(ix))
-                        work_queue.append((new_prefixes, val))
-                else:
-                    column_key = '.'.join(cur_prefixes)
-                    csv_dict[column_key] = cur_val
-            csv_list.append(csv_dict)
-
-        col_headers = set()
-        for csv_dict in csv_list:
-            col_headers.update(csv_dict.keys())
-        col_headers = sorted(col_headers)
-
-        csv_io = io.StringIO()
-        writer = csv.DictWriter(csv_io, fieldnames=col_headers)
-        writer.writeheader()
-        for csv_dict in csv_list:
-            writer.writerow(csv_dict)
-        csv_output = csv_io.getvalue()
-        csv_io.close()
-
-        return csv_output
-
     def get(self, request, pk):
         try:
-            mission = MissionConfig.objects.select_related().get(pk=pk)
+            mission = MissionConfig.objects.get(pk=pk)
         except MissionConfig.DoesNotExist:
             return HttpResponseBadRequest('Mission not found.')
 
         # Get the optional team to eval.
+        try:
+            user_pks = evaluation_users(request)
+        except ValueError:
+            return HttpResponseBadRequest('Team not an ID.')
+        except User.DoesNotExist:
+            return HttpResponseNotFound('Team not found.')
+
         users = None
-        if 'team' in request.GET:
-            try:
-                team = int(request.GET['team'])
-                users = [User.objects.get(pk=team)]
-            except TypeError:
-                return HttpResponseBadRequest('Team not an ID.')
-            except User.DoesNotExist:
-                return HttpResponseNotFound('Team not found.')
-
-        # Get the eval data for the teams.
-        mission_eval = mission_evaluation.evaluate_teams(mission, users)
-        if not mission_eval:
-            return HttpResponseServerError(
-                'Could not get user evaluation data.')
-
-        # Form Zip file.
-        zip_io = io.BytesIO()
-        with zipfile.ZipFile(zip_io, 'w') as zip_file:
-            zip_file.writestr(
-                '/evaluate_teams/all.json',
-                pretty_json(json_format.MessageToJson(mission_eval)))
-            team_jsons = []
-            for team_eval in mission_eval.teams:
-                team_json = pretty_json(json_format.MessageToJson(team_eval))
-                zip_file.writestr(
-                    '/evaluate_teams/teams/%s.json' % team_eval.team.username,
-                    team_json)
-                team_jsons.append(team_json)
-
-            zip_file.writestr(
-                '/evaluate_teams/all.html',
-                self.feedback_template.render({'feedbacks': team_jsons}))
-
-            zip_file.writestr('/evaluate_teams/all.csv',
-                              self.csv_from_json(team_jsons))
-        zip_output = zip_io.getvalue()
-        zip_io.close()
-
-        return HttpResponse(zip_output, content_type='application/zip')
+        if user_pks is not None:
+            users = list(User.objects.filter(pk__in=user_pks))
+
+        # Stream the zip file as each team is evaluated.
+        team_evals = mission_evaluation.iter_team_evaluations(mission, users)
+        return StreamingHttpResponse(evaluation_jobs.zip_chunks(team_evals),
+                                     content_type='application/zip')
+
+
+class EvaluationJobs(View):
+    """Submits jobs to evaluate the teams in the background."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(EvaluationJobs, self).dispatch(*args, **kwargs)
+
+    def post(self, request, pk):
+        try:
+            mission = MissionConfig.objects.get(pk=pk)
+        except MissionConfig.DoesNotExist:
+            return HttpResponseNotFound('Mission not found.')
+
+        # Get the optional team to eval.
+        try:
+            user_pks = evaluation_users(request)
+        except ValueError:
+            return HttpResponseBadRequest('Team not an ID.')
+        except User.DoesNotExist:
+            return HttpResponseNotFound('Team not found.')
+
+        job = evaluation_jobs.get_jobs().submit(mission.pk, user_pks)
+        return proto_response(request, job)
+
+
+def find_evaluation_job(pk, job_id):
+    """Gets the evaluation job of the mission, or None if not found."""
+    job = evaluation_jobs.get_jobs().get(str(job_id))
+    if job is None or job.mission != pk:
+        return None
+    return job
+
+
+class EvaluationJobsId(View):
+    """Gets the status of an evaluation job."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(EvaluationJobsId, self).dispatch(*args, **kwargs)
+
+    def get(self, request, pk, job_id):
+        job = find_evaluation_job(pk, job_id)
+        if job is None:
+            return HttpResponseNotFound('Evaluation job not found.')
+        return proto_response(request, job)
+
+
+class EvaluationJobsIdResult(View):
+    """Gets the zip file resulting from an evaluation job."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(EvaluationJobsIdResult, self).dispatch(*args, **kwargs)
+
+    def get(self, request, pk, job_id):
+        job = find_evaluation_job(pk, job_id)
+        if job is None:
+            return HttpResponseNotFound('Evaluation job not found.')
+        if job.state != interop_admin_api_pb2.EvaluationJob.DONE:
+            return HttpResponseBadRequest('Evaluation job not done.')
+        # Tell sendfile to serve the zip file.
+        return sendfile(request,
+                        evaluation_jobs.get_jobs().result_path(job.id),
+                        attachment=True,
+                        attachment_filename='evaluate.zip')
+
+
+class LiveEvaluations(View):
+    """Gets the live evaluation of the telemetry of teams in the mission."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(LiveEvaluations, self).dispatch(*args, **kwargs)
+
+    def get(self, request, pk):
+        try:
+            mission = MissionConfig.objects.get(pk=pk)
+        except MissionConfig.DoesNotExist:
+            return HttpResponseNotFound('Mission not found.')
+
+        # Teams which have flown the mission.
+        users = User.objects.filter(
+            is_superuser=False,
+            takeofforlandingevent__mission=mission).distinct().order_by(
+                'username')
+        team_evals = []
+        for user in users:
+            team_eval = interop_admin_api_pb2.MissionEvaluation()
+            team_eval.mission = mission.pk
+            team_eval.team.id = user.pk
+            team_eval.team.username = user.username
+            team_eval.team.name = user.first_name
+            team_eval.team.university = user.last_name
+            team_eval.feedback.CopyFrom(
+                live_evaluation.get_feedback(mission, user))
+            team_evals.append(team_eval)
+        return proto_list_response(request, team_evals)
 
 
 class MissionDetails(TemplateView):
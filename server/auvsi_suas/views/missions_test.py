@@ -3,10 +3,16 @@
 import functools
 import io
 import json
+import os
+import socket
 import zipfile
 from auvsi_suas.models import test_utils
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.mission_config import MissionConfig
+from auvsi_suas.models.odlc import Odlc
+from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
+from auvsi_suas.models.uas_telemetry import UasTelemetry
+from auvsi_suas.proto import interop_api_pb2
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.test.client import Client
@@ -19,6 +25,13 @@ export_url = reverse('auvsi_suas:export_kml')
 live_url = reverse('auvsi_suas:live_kml')
 update_url = update_url = reverse('auvsi_suas:update_kml')
 evaluate_url = functools.partial(reverse, 'auvsi_suas:evaluate')
+evaluation_jobs_url = functools.partial(reverse, 'auvsi_suas:evaluation_jobs')
+evaluation_jobs_id_url = functools.partial(reverse,
+                                           'auvsi_suas:evaluation_jobs_id')
+evaluation_jobs_id_result_url = functools.partial(
+    reverse, 'auvsi_suas:evaluation_jobs_id_result')
+live_evaluations_url = functools.partial(reverse,
+                                         'auvsi_suas:live_evaluations')
 details_url = functools.partial(reverse, 'auvsi_suas:details')
 
 
@@ -166,6 +179,42 @@ class TestMissionsViewSampleMission(TestMissionsViewCommon):
         data = json.loads(response.content)
         self.assert_data(data)
 
+    def test_etag(self):
+        """Unchanged missions aren't rebuilt, edits change the ETag."""
+        self.Login()
+        url = missions_id_url(args=[self.mission.pk])
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        etag = response['ETag']
+        # Session, user.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        # Team ODLCs aren't part of the mission.
+        location = GpsPosition(latitude=38, longitude=-76)
+        location.save()
+        odlc = Odlc(mission=self.mission,
+                    user=self.user0,
+                    odlc_type=interop_api_pb2.Odlc.STANDARD,
+                    location=location)
+        odlc.save()
+        odlc.location.latitude += 0.0001
+        odlc.location.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        waypoint = self.mission.mission_waypoints.first()
+        waypoint.altitude_msl += 10
+        waypoint.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        etag = response['ETag']
+
+        self.mission.mission_waypoints.remove(waypoint)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
 
 class TestGenerateKMLCommon(TestMissionsViewCommon):
     """Tests the generateKML view."""
@@ -330,6 +379,24 @@ class TestGenerateLiveKMLWithSimulation(TestMissionsViewCommon):
         response = self.client.get(update_url)
         self.assertEqual(200, response.status_code)
 
+    def test_live_kml_update_alerts(self):
+        """Tests the live KML update has recent alerts."""
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        TakeoffOrLandingEvent(user=self.user0,
+                              mission=self.mission,
+                              uas_in_air=True).save()
+        UasTelemetry(user=self.user0,
+                     latitude=38.1480,
+                     longitude=-76.4255,
+                     altitude_msl=300,
+                     uas_heading=90).save()
+
+        self.LoginSuperuser()
+        response = self.client.get(update_url)
+        self.assertEqual(200, response.status_code)
+        self.assertIn(b'<name>Alerts</name>', response.content)
+        self.assertIn(b'<name>user0 exit fly_zone</name>', response.content)
+
 
 class TestEvaluateTeams(TestMissionsViewCommon):
     """Tests the evaluate_teams view."""
@@ -353,19 +420,19 @@ class TestEvaluateTeams(TestMissionsViewCommon):
 
     def load_json(self, response):
         """Gets the json data out of the response's zip archive."""
-        zip_io = io.BytesIO(response.content)
+        zip_io = io.BytesIO(b''.join(response.streaming_content))
         with zipfile.ZipFile(zip_io, 'r') as zip_file:
             return json.loads(zip_file.read('/evaluate_teams/all.json'))
 
     def load_html(self, response):
         """Gets the HTML data out of the response's zip archive."""
-        zip_io = io.BytesIO(response.content)
+        zip_io = io.BytesIO(b''.join(response.streaming_content))
         with zipfile.ZipFile(zip_io, 'r') as zip_file:
             return zip_file.read('/evaluate_teams/all.html').decode('utf-8')
 
     def load_csv(self, response):
         """Gets the CSV data out of the response's zip archive."""
-        zip_io = io.BytesIO(response.content)
+        zip_io = io.BytesIO(b''.join(response.streaming_content))
         with zipfile.ZipFile(zip_io, 'r') as zip_file:
             return zip_file.read('/evaluate_teams/all.csv').decode('utf-8')
 
@@ -413,6 +480,115 @@ class TestEvaluateTeams(TestMissionsViewCommon):
         self.assertIn('user0', csv_data)
 
 
+class TestEvaluationJobs(TestMissionsViewCommon):
+    """Tests the evaluation job views."""
+    def setUp(self):
+        super(TestEvaluationJobs, self).setUp()
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        test_utils.simulate_team_mission(self, self.mission, self.superuser,
+                                         self.user0)
+
+    def test_nonadmin(self):
+        """Tests that you can only submit jobs as admin."""
+        self.Login()
+        response = self.client.post(
+            evaluation_jobs_url(args=[self.mission.pk]))
+        self.assertEqual(403, response.status_code)
+
+    def test_invalid_mission(self):
+        """Tests that an invalid mission ID results in error."""
+        self.LoginSuperuser()
+        response = self.client.post(evaluation_jobs_url(args=[1000]))
+        self.assertEqual(404, response.status_code)
+
+    def test_invalid_job(self):
+        """Tests that an invalid job ID results in error."""
+        self.LoginSuperuser()
+        job_id = '00000000-0000-0000-0000-000000000000'
+        response = self.client.get(
+            evaluation_jobs_id_url(args=[self.mission.pk, job_id]))
+        self.assertEqual(404, response.status_code)
+        response = self.client.get(
+            evaluation_jobs_id_result_url(args=[self.mission.pk, job_id]))
+        self.assertEqual(404, response.status_code)
+
+    def test_evaluation_job(self):
+        """Tests submitting a job, getting its status and result."""
+        self.LoginSuperuser()
+        response = self.client.post(
+            evaluation_jobs_url(args=[self.mission.pk]) +
+            '?team=%d' % self.user0.pk)
+        self.assertEqual(200, response.status_code)
+        job = json.loads(response.content)
+        self.assertEqual(self.mission.pk, job['mission'])
+
+        response = self.client.get(
+            evaluation_jobs_id_url(args=[self.mission.pk, job['id']]))
+        self.assertEqual(200, response.status_code)
+        status = json.loads(response.content)
+        self.assertEqual(socket.gethostname(), status.pop('host'))
+        self.assertEqual(os.getpid(), status.pop('pid'))
+        self.assertTrue(status.pop('heartbeatTime'))
+        self.assertEqual(
+            {
+                'id': job['id'],
+                'mission': self.mission.pk,
+                'state': 'DONE',
+                'teams': [{
+                    'username': 'user0',
+                    'evaluated': True
+                }],
+            }, status)
+
+        # Job is only found for its mission.
+        response = self.client.get(
+            evaluation_jobs_id_url(args=[self.mission.pk + 1, job['id']]))
+        self.assertEqual(404, response.status_code)
+
+        response = self.client.get(
+            evaluation_jobs_id_result_url(args=[self.mission.pk, job['id']]))
+        self.assertEqual(200, response.status_code)
+        zip_io = io.BytesIO(b''.join(response.streaming_content))
+        with zipfile.ZipFile(zip_io, 'r') as zip_file:
+            data = json.loads(zip_file.read('/evaluate_teams/all.json'))
+        self.assertEqual('user0', data['teams'][0]['team']['username'])
+
+
+class TestLiveEvaluations(TestMissionsViewCommon):
+    """Tests the live evaluations view."""
+    def setUp(self):
+        super(TestLiveEvaluations, self).setUp()
+        self.mission = test_utils.create_sample_mission(self.superuser)
+        test_utils.simulate_team_mission(self, self.mission, self.superuser,
+                                         self.user0)
+
+    def test_nonadmin(self):
+        """Tests that you can only get live evaluations as admin."""
+        self.Login()
+        response = self.client.get(
+            live_evaluations_url(args=[self.mission.pk]))
+        self.assertEqual(403, response.status_code)
+
+    def test_invalid_mission(self):
+        """Tests that an invalid mission ID results in error."""
+        self.LoginSuperuser()
+        response = self.client.get(live_evaluations_url(args=[1000]))
+        self.assertEqual(404, response.status_code)
+
+    def test_get(self):
+        """Tests getting the live evaluations of the teams which flew."""
+        self.LoginSuperuser()
+        response = self.client.get(
+            live_evaluations_url(args=[self.mission.pk]))
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.content)
+        self.assertEqual(1, len(data))
+        self.assertEqual(self.mission.pk, data[0]['mission'])
+        self.assertEqual('user0', data[0]['team']['username'])
+        self.assertIn('waypoints', data[0]['feedback'])
+        self.assertIn('stationaryObstacles', data[0]['feedback'])
+
+
 class TestMissionDetailsView(TestMissionsViewCommon):
     """Tests the mission details template view."""
     def setUp(self, *args, **kwargs):
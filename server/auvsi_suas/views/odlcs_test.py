@@ -269,6 +269,26 @@ class TestPostOdlc(TestOdlcsCommon):
         self.assertNotIn('description', created)
         self.assertEqual(False, created['autonomous'])
 
+    def test_binary(self):
+        """Send and receive odlc in the binary protobuf format."""
+        odlc = interop_api_pb2.Odlc()
+        odlc.mission = self.mission.pk
+        odlc.type = interop_api_pb2.Odlc.STANDARD
+        odlc.shape = interop_api_pb2.Odlc.CIRCLE
+
+        response = self.client.post(odlcs_url,
+                                    data=odlc.SerializeToString(),
+                                    content_type='application/x-protobuf',
+                                    HTTP_ACCEPT='application/x-protobuf')
+        self.assertEqual(200, response.status_code)
+
+        created = interop_api_pb2.Odlc()
+        created.ParseFromString(response.content)
+        self.assertTrue(created.HasField('id'))
+        self.assertEqual(interop_api_pb2.Odlc.STANDARD, created.type)
+        self.assertEqual(interop_api_pb2.Odlc.CIRCLE, created.shape)
+        self.assertFalse(created.autonomous)
+
     def test_missing_type(self):
         """Odlc type required."""
         odlc = {
@@ -0,0 +1,82 @@
+"""Utilities for protobuf content negotiation.
+
+Requests and responses default to the JSON format of the protos. Clients may
+instead use the binary protobuf wire format by setting the Content-Type of
+request bodies and the Accept of responses to application/x-protobuf.
+"""
+
+import json
+from auvsi_suas.views.json import ProtoJsonEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from google.protobuf import json_format
+from google.protobuf.internal import encoder
+
+# Content type of the binary protobuf wire format.
+PROTOBUF_CONTENT_TYPE = 'application/x-protobuf'
+
+
+def is_protobuf_request(request):
+    """Whether the request body is in the binary protobuf format."""
+    return request.content_type == PROTOBUF_CONTENT_TYPE
+
+
+def accepts_protobuf(request):
+    """Whether the request accepts a binary protobuf response."""
+    return PROTOBUF_CONTENT_TYPE in request.META.get('HTTP_ACCEPT', '')
+
+
+def proto_etag(request, tag):
+    """Builds an ETag for a response identified by tag.
+
+    The ETag is weak, and distinguishes the format of the response.
+    """
+    return 'W/"%s-%s"' % (tag, 'pb' if accepts_protobuf(request) else 'json')
+
+
+def parse_request(request, proto):
+    """Parses the request body into the proto.
+
+    Args:
+        request: The request with a JSON or binary protobuf body.
+        proto: The proto to parse into.
+    Raises:
+        Exception: Failed to parse the body.
+    """
+    if is_protobuf_request(request):
+        proto.ParseFromString(request.body)
+    else:
+        json_format.Parse(request.body, proto)
+
+
+def proto_response(request, proto):
+    """Builds a response for the proto in the format accepted by request."""
+    if accepts_protobuf(request):
+        response = HttpResponse(proto.SerializeToString(),
+                                content_type=PROTOBUF_CONTENT_TYPE)
+    else:
+        response = HttpResponse(json_format.MessageToJson(proto),
+                                content_type='application/json')
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def proto_list_response(request, protos):
+    """Builds a response for a list of protos in the accepted format.
+
+    Binary responses are the concatenation of the protos, each prefixed by
+    its varint encoded length.
+    """
+    if accepts_protobuf(request):
+        chunks = []
+        for proto in protos:
+            data = proto.SerializeToString()
+            chunks.append(encoder._VarintBytes(len(data)))
+            chunks.append(data)
+        response = HttpResponse(b''.join(chunks),
+                                content_type=PROTOBUF_CONTENT_TYPE)
+    else:
+        response = HttpResponse(json.dumps(protos, cls=ProtoJsonEncoder),
+                                content_type='application/json')
+    patch_vary_headers(response, ['Accept'])
+    return response
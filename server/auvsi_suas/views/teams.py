@@ -2,32 +2,53 @@
 
 import json
 import logging
-from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
-from auvsi_suas.models.uas_telemetry import UasTelemetry
+import time
+from auvsi_suas.models import team_status
 from auvsi_suas.proto import interop_api_pb2
 from auvsi_suas.views.decorators import require_login
+from auvsi_suas.views.decorators import require_superuser
+from auvsi_suas.views.events import event_stream_response
+from auvsi_suas.views.events import release_connection
 from auvsi_suas.views.json import ProtoJsonEncoder
+from auvsi_suas.views.protobuf import proto_etag
+from auvsi_suas.views.protobuf import proto_list_response
+from auvsi_suas.views.protobuf import proto_response
 from django.contrib.auth.models import User
-from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import View
-from google.protobuf import json_format
 
 logger = logging.getLogger(__name__)
 
+# Duration of a team status stream, after which the client reconnects.
+TEAMS_STREAM_DURATION_SEC = 60
+# Interval at which a stream checks for changes to team status.
+TEAMS_STREAM_POLL_SEC = 0.1
+# Interval at which a stream reloads teams and rechecks all team status.
+TEAMS_STREAM_RELOAD_SEC = 10
+# Max time a stream is idle before sending a keepalive.
+TEAMS_STREAM_KEEPALIVE_SEC = 5
+# Time the client waits to reconnect after a stream ends.
+TEAMS_STREAM_RETRY_MS = 500
 
-def team_proto(user):
-    """Generate TeamStatus proto for team."""
+
+def team_proto(user, in_air, telemetry):
+    """Generate TeamStatus proto for team.
+
+    Args:
+        user: The team's user.
+        in_air: Whether the team is in air.
+        telemetry: The team's latest telemetry, or None.
+    """
     team_status_proto = interop_api_pb2.TeamStatus()
     team_status_proto.team.id = user.pk
     team_status_proto.team.username = user.username
     team_status_proto.team.name = user.first_name
     team_status_proto.team.university = user.last_name
-    team_status_proto.in_air = TakeoffOrLandingEvent.user_in_air(user)
+    team_status_proto.in_air = in_air
 
-    telemetry = UasTelemetry.last_for_user(user)
     if telemetry is not None:
         telemetry_proto = team_status_proto.telemetry
         telemetry_proto.latitude = telemetry.latitude
@@ -42,23 +63,116 @@ def team_proto(user):
     return team_status_proto
 
 
+def team_protos(users=None):
+    """Generate TeamStatus protos for the users, or all standard users."""
+    if users is None:
+        # Only standard users are exported
+        users = list(User.objects.filter(is_superuser=False))
+    status = team_status.get_many(users)
+    return [team_proto(user, *status[user.pk]) for user in users]
+
+
+def teams_etag(request, *args, **kwargs):
+    """ETag for the status of teams, which changes with the snapshot.
+
+    The ETag doesn't change with the age of telemetry, which clients can
+    compute from the telemetry timestamp.
+    """
+    return proto_etag(request, 'teams-%d' % team_status.version())
+
+
+def team_status_events(duration_sec=TEAMS_STREAM_DURATION_SEC):
+    """Generates server-sent events with changes to team status.
+
+    The first event contains the status of all teams. Subsequent events
+    contain the status of teams which changed since the previous event. Each
+    event's data is a list of TeamStatus JSON formatted protos. Only the
+    status of teams whose version changed in team_status is reloaded.
+
+    Args:
+        duration_sec: Duration of the stream.
+    """
+    yield 'retry: %d\n\n' % TEAMS_STREAM_RETRY_MS
+
+    start = time.monotonic()
+    sent = None
+    users = None
+    version = None
+    users_version = None
+    user_versions = None
+    reload_time = None
+    event_time = start
+    while time.monotonic() - start < duration_sec:
+        now = time.monotonic()
+        if reload_time is None or now - reload_time >= TEAMS_STREAM_RELOAD_SEC:
+            reload_time = now
+            version = None
+
+        current_version = team_status.version()
+        if current_version != version:
+            # Versions are read before status, so later changes to status
+            # are seen by the next check.
+            reload = version is None
+            version = current_version
+            current_users_version = team_status.users_version()
+            if current_users_version != users_version:
+                users_version = current_users_version
+                reload = True
+            if reload:
+                users = list(User.objects.filter(is_superuser=False))
+            current_user_versions = team_status.user_versions(
+                [u.pk for u in users])
+            if reload:
+                changed_users = users
+            else:
+                changed_users = [
+                    u for u in users
+                    if current_user_versions[u.pk] != user_versions.get(u.pk)
+                ]
+            user_versions = current_user_versions
+            first = sent is None
+            sent = sent or {}
+            changed = []
+            for proto in team_protos(changed_users):
+                # Age changes continuously, so it isn't a change in status.
+                status = interop_api_pb2.TeamStatus()
+                status.CopyFrom(proto)
+                status.ClearField('telemetry_age_sec')
+                status = status.SerializeToString()
+                if sent.get(proto.team.id) != status:
+                    sent[proto.team.id] = status
+                    changed.append(proto)
+            if changed or first:
+                event_time = now
+                yield 'data: %s\n\n' % json.dumps(changed,
+                                                  cls=ProtoJsonEncoder)
+
+        if now - event_time >= TEAMS_STREAM_KEEPALIVE_SEC:
+            event_time = now
+            yield ': keepalive\n\n'
+        release_connection()
+        time.sleep(TEAMS_STREAM_POLL_SEC)
+
+
 class Teams(View):
     """Gets a list of all teams."""
     @method_decorator(require_login)
     def dispatch(self, *args, **kwargs):
         return super(Teams, self).dispatch(*args, **kwargs)
 
+    @method_decorator(condition(etag_func=teams_etag))
     def get(self, request):
-        users = User.objects.all()
-        teams = []
+        return proto_list_response(request, team_protos())
+
 
-        for user in users:
-            # Only standard users are exported
-            if not user.is_superuser:
-                teams.append(team_proto(user))
+class TeamsStream(View):
+    """Streams changes to the status of teams as server-sent events."""
+    @method_decorator(require_superuser)
+    def dispatch(self, *args, **kwargs):
+        return super(TeamsStream, self).dispatch(*args, **kwargs)
 
-        return HttpResponse(json.dumps(teams, cls=ProtoJsonEncoder),
-                            content_type="application/json")
+    def get(self, request):
+        return event_stream_response(team_status_events())
 
 
 class Team(View):
@@ -67,11 +181,12 @@ class Team(View):
     def dispatch(self, *args, **kwargs):
         return super(Team, self).dispatch(*args, **kwargs)
 
+    @method_decorator(condition(etag_func=teams_etag))
     def get(self, request, username):
         try:
             user = User.objects.get(username=username)
         except User.DoesNotExist:
             return HttpResponseBadRequest('Unknown team %s' % username)
 
-        return HttpResponse(json_format.MessageToJson(team_proto(user)),
-                            content_type="application/json")
+        return proto_response(request, team_proto(user,
+                                                  *team_status.get(user)))
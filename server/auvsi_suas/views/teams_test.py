@@ -3,19 +3,25 @@
 import dateutil.parser
 import functools
 import json
+from auvsi_suas.models import shared_cache
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.gps_position import GpsPosition
 from auvsi_suas.models.mission_config import MissionConfig
 from auvsi_suas.models.takeoff_or_landing_event import TakeoffOrLandingEvent
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.models.waypoint import Waypoint
+from auvsi_suas.proto.interop_api_pb2 import TeamStatus
+from auvsi_suas.views import events
+from auvsi_suas.views.teams import team_status_events
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
+from google.protobuf.internal import decoder
 
 teams_url = reverse('auvsi_suas:teams')
 team_url = functools.partial(reverse, 'auvsi_suas:team')
+teams_stream_url = reverse('auvsi_suas:teams_stream')
 
 
 class TestTeamsViewLoggedOut(TestCase):
@@ -142,6 +148,86 @@ class TestTeamsView(TestCase):
                 self.assertIn('telemetryAgeSec', user)
                 self.assertIn('telemetryTimestamp', user)
 
+    def test_binary(self):
+        """Response is length delimited protos if accepted."""
+        self.create_data()
+
+        response = self.client.get(teams_url,
+                                   HTTP_ACCEPT='application/x-protobuf')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/x-protobuf', response['Content-Type'])
+        self.assertIn('Accept', response['Vary'])
+
+        teams = []
+        data = response.content
+        pos = 0
+        while pos < len(data):
+            size, pos = decoder._DecodeVarint(data, pos)
+            team = TeamStatus()
+            team.ParseFromString(data[pos:pos + size])
+            teams.append(team)
+            pos += size
+        self.assertEqual(['user1', 'user2'],
+                         sorted(t.team.username for t in teams))
+
+    def create_teams(self, num):
+        """Create teams which are flying with telemetry."""
+        for _ in range(num):
+            user = User.objects.create_user('team%d' % User.objects.count(),
+                                            'email@example.com', 'testpass')
+            TakeoffOrLandingEvent(user=user,
+                                  mission=self.mission,
+                                  uas_in_air=True).save()
+            UasTelemetry(user=user,
+                         latitude=38,
+                         longitude=-76,
+                         altitude_msl=100,
+                         uas_heading=90).save()
+
+    def test_query_count(self):
+        """Number of queries is independent of the number of teams."""
+        self.create_data()
+
+        for num in [0, 10]:
+            self.create_teams(num)
+            shared_cache.cache().clear()
+            # Session, user, teams, events, telemetry.
+            with self.assertNumQueries(5):
+                response = self.client.get(teams_url)
+            self.assertEqual(200, response.status_code)
+            # Session, user, teams.
+            with self.assertNumQueries(3):
+                response = self.client.get(teams_url)
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(2 + num, len(json.loads(response.content)))
+
+    def test_etag(self):
+        """Unchanged status isn't rebuilt, and changes change the ETag."""
+        self.create_data()
+
+        response = self.client.get(teams_url)
+        self.assertEqual(200, response.status_code)
+        etag = response['ETag']
+        # Session, user.
+        with self.assertNumQueries(2):
+            response = self.client.get(teams_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        response = self.client.get(teams_url,
+                                   HTTP_ACCEPT='application/x-protobuf',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+        UasTelemetry(user=self.user2,
+                     latitude=38,
+                     longitude=-76,
+                     altitude_msl=100,
+                     uas_heading=90).save()
+        response = self.client.get(teams_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
     def test_users_correct(self):
         """User names and status correct."""
         self.create_data()
@@ -212,7 +298,125 @@ class TestTeamView(TestCase):
         self.assertEqual(False, data['inAir'])
         self.assertNotIn('telemetry', data)
 
+    def test_binary(self):
+        """User is serialized as binary proto if accepted."""
+        response = self.client.get(team_url(args=[self.user1.username]),
+                                   HTTP_ACCEPT='application/x-protobuf')
+        self.assertEqual(200, response.status_code)
+        team = TeamStatus()
+        team.ParseFromString(response.content)
+        self.assertEqual('user1', team.team.username)
+        self.assertFalse(team.in_air)
+
     def test_post(self):
         """POST not allowed"""
         response = self.client.post(team_url(args=[self.user1.username]))
         self.assertEqual(405, response.status_code)
+
+
+class TestTeamsStreamViewLoggedOut(TestCase):
+    def test_not_authenticated(self):
+        """Tests requests that have not yet been authenticated."""
+        response = self.client.get(teams_stream_url)
+        self.assertEqual(403, response.status_code)
+
+
+class TestTeamsStreamView(TestCase):
+    """Tests the team status stream."""
+    def setUp(self):
+        self.user1 = User.objects.create_user('user1', 'email@example.com',
+                                              'testpass')
+        self.user2 = User.objects.create_user('user2', 'email@example.com',
+                                              'testpass')
+        self.superuser = User.objects.create_superuser('superuser',
+                                                       'email@example.com',
+                                                       'superpass')
+        self.client.force_login(self.superuser)
+
+    def create_mission(self):
+        pos = GpsPosition(latitude=10, longitude=100)
+        pos.save()
+        mission = MissionConfig()
+        mission.home_pos = pos
+        mission.lost_comms_pos = pos
+        mission.emergent_last_known_pos = pos
+        mission.off_axis_odlc_pos = pos
+        mission.map_center_pos = pos
+        mission.map_height_ft = 1
+        mission.air_drop_pos = pos
+        mission.ugv_drive_pos = pos
+        mission.save()
+        return mission
+
+    def parse_event(self, event):
+        self.assertTrue(event.startswith('data: '))
+        self.assertTrue(event.endswith('\n\n'))
+        return json.loads(event[len('data: '):])
+
+    def test_not_superuser(self):
+        """Only superusers may stream team status."""
+        self.client.force_login(self.user1)
+        response = self.client.get(teams_stream_url)
+        self.assertEqual(403, response.status_code)
+
+    def test_busy(self):
+        """Streams beyond the max for the process end with a retry."""
+        for _ in range(events.STREAMS_PER_PROCESS):
+            events._streams.acquire()
+        try:
+            response = self.client.get(teams_stream_url)
+            self.assertEqual([b'retry: %d\n\n' % events.STREAMS_BUSY_RETRY_MS],
+                             list(response.streaming_content))
+        finally:
+            for _ in range(events.STREAMS_PER_PROCESS):
+                events._streams.release()
+
+    def test_response(self):
+        """Response is an unbuffered event stream."""
+        response = self.client.get(teams_stream_url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        self.assertEqual('no', response['X-Accel-Buffering'])
+        self.assertNotIn('gzip', response.get('Content-Encoding', ''))
+
+        events = iter(response.streaming_content)
+        self.assertTrue(next(events).startswith(b'retry: '))
+        teams = json.loads(next(events)[len(b'data: '):])
+        self.assertEqual(['user1', 'user2'],
+                         sorted(t['team']['username'] for t in teams))
+        response.close()
+
+    def test_changes(self):
+        """Events contain only changed teams."""
+        events = team_status_events(duration_sec=10)
+        self.assertTrue(next(events).startswith('retry: '))
+        teams = self.parse_event(next(events))
+        self.assertEqual(2, len(teams))
+
+        UasTelemetry(user=self.user2,
+                     latitude=38,
+                     longitude=-76,
+                     altitude_msl=100,
+                     uas_heading=90).save()
+        # Only the changed team's status is reloaded, from the cache.
+        with self.assertNumQueries(0):
+            teams = self.parse_event(next(events))
+        self.assertEqual(1, len(teams))
+        self.assertEqual('user2', teams[0]['team']['username'])
+        self.assertEqual(38, teams[0]['telemetry']['latitude'])
+
+        user3 = User.objects.create_user('user3', 'email@example.com',
+                                         'testpass')
+        TakeoffOrLandingEvent(user=user3,
+                              mission=self.create_mission(),
+                              uas_in_air=True).save()
+        teams = self.parse_event(next(events))
+        self.assertEqual(1, len(teams))
+        self.assertEqual('user3', teams[0]['team']['username'])
+        self.assertTrue(teams[0]['inAir'])
+        events.close()
+
+    def test_duration(self):
+        """Stream ends after its duration."""
+        events = list(team_status_events(duration_sec=0.5))
+        self.assertEqual(2, len(events))
@@ -1,18 +1,79 @@
 """Telemetry view."""
 
+import datetime
 import logging
+from auvsi_suas.models import live_alerts
+from auvsi_suas.models import live_evaluation
+from auvsi_suas.models import team_status
+from auvsi_suas.models import telemetry_buffer
 from auvsi_suas.models.aerial_position import AerialPosition
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.proto import interop_api_pb2
 from auvsi_suas.views.decorators import require_login
+from auvsi_suas.views.protobuf import parse_request
+from auvsi_suas.views.protobuf import proto_response
+from django.conf import settings
 from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.generic import View
-from google.protobuf import json_format
 
 logger = logging.getLogger(__name__)
 
+# Max number of telemetry which can be uploaded in a single batch.
+TELEMETRY_BATCH_MAX = 100
+# Max age of telemetry uploaded in a batch.
+TELEMETRY_BATCH_AGE_MAX_SEC = 10
+
+
+def validate_telemetry_proto(telemetry_proto):
+    """Validates telemetry proto, raising ValueError if invalid."""
+    if (not telemetry_proto.HasField('latitude')
+            or not telemetry_proto.HasField('longitude')
+            or not telemetry_proto.HasField('altitude')
+            or not telemetry_proto.HasField('heading')):
+        raise ValueError('Request missing fields.')
+
+    # Check the values make sense.
+    if telemetry_proto.latitude < -90 or telemetry_proto.latitude > 90:
+        raise ValueError('Latitude out of range [-90, 90]: %f' %
+                         telemetry_proto.latitude)
+    if telemetry_proto.longitude < -180 or telemetry_proto.longitude > 180:
+        raise ValueError('Longitude out of range [-180, 180]: %f' %
+                         telemetry_proto.longitude)
+    if telemetry_proto.altitude < -1500 or telemetry_proto.altitude > 330000:
+        raise ValueError('Altitude out of range [-1500, 330000]: %f' %
+                         telemetry_proto.altitude)
+    if telemetry_proto.heading < 0 or telemetry_proto.heading > 360:
+        raise ValueError('Heading out of range [0, 360]: %f' %
+                         telemetry_proto.heading)
+
+
+def telemetry_from_proto(user, telemetry_proto, timestamp=None):
+    """Creates an unsaved UasTelemetry from the proto format."""
+    return UasTelemetry(user=user,
+                        timestamp=timestamp,
+                        latitude=telemetry_proto.latitude,
+                        longitude=telemetry_proto.longitude,
+                        altitude_msl=telemetry_proto.altitude,
+                        uas_heading=telemetry_proto.heading)
+
+
+def store_telemetry(telemetry):
+    """Stores the unsaved telemetry.
+
+    If enabled, telemetry is queued in the write-behind buffer rather than
+    being inserted before returning.
+    """
+    if settings.TELEMETRY_WRITE_BEHIND:
+        telemetry_buffer.get_buffer().add(telemetry)
+    else:
+        UasTelemetry.objects.bulk_create(telemetry)
+        team_status.update_telemetry(telemetry)
+        live_evaluation.update_telemetry(telemetry)
+        live_alerts.update_telemetry(telemetry)
+
 
 class Telemetry(View):
     """GET/POST telemetry."""
@@ -21,40 +82,69 @@ class Telemetry(View):
         """Posts the UAS position with a POST request."""
         telemetry_proto = interop_api_pb2.Telemetry()
         try:
-            json_format.Parse(request.body, telemetry_proto)
+            parse_request(request, telemetry_proto)
         except Exception as e:
             return HttpResponseBadRequest(
                 'Failed to parse request. Error: %s' % str(e))
 
-        if (not telemetry_proto.HasField('latitude')
-                or not telemetry_proto.HasField('longitude')
-                or not telemetry_proto.HasField('altitude')
-                or not telemetry_proto.HasField('heading')):
-            return HttpResponseBadRequest('Request missing fields.')
+        try:
+            validate_telemetry_proto(telemetry_proto)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        # Store telemetry.
+        telemetry = telemetry_from_proto(request.user, telemetry_proto)
+        store_telemetry([telemetry])
 
-        # Check the values make sense.
-        if telemetry_proto.latitude < -90 or telemetry_proto.latitude > 90:
+        return HttpResponse('UAS Telemetry Successfully Posted.')
+
+
+class TelemetryBatch(View):
+    """POST a batch of telemetry."""
+    @method_decorator(require_login)
+    def post(self, request):
+        """Posts a batch of UAS positions with a single POST request.
+
+        Each telemetry is validated independently. Valid telemetry is stored
+        with a single bulk insert, and the acceptance of each telemetry is
+        returned in the response.
+        """
+        batch_proto = interop_api_pb2.TelemetryBatch()
+        try:
+            parse_request(request, batch_proto)
+        except Exception as e:
             return HttpResponseBadRequest(
-                'Latitude out of range [-90, 90]: %f' %
-                telemetry_proto.latitude)
-        if telemetry_proto.longitude < -180 or telemetry_proto.longitude > 180:
+                'Failed to parse request. Error: %s' % str(e))
+
+        if len(batch_proto.telemetry) > TELEMETRY_BATCH_MAX:
             return HttpResponseBadRequest(
-                'Longitude out of range [-180, 180]: %f' %
-                telemetry_proto.longitude)
-        if telemetry_proto.altitude < -1500 or telemetry_proto.altitude > 330000:
+                'Batch larger than max of %d telemetry.' % TELEMETRY_BATCH_MAX)
+        if len(batch_proto.telemetry_age_sec) != len(batch_proto.telemetry):
             return HttpResponseBadRequest(
-                'Altitude out of range [-1500, 330000]: %f' %
-                telemetry_proto.altitude)
-        if telemetry_proto.heading < 0 or telemetry_proto.heading > 360:
-            return HttpResponseBadRequest('Heading out of range [0, 360]: %f' %
-                                          telemetry_proto.heading)
+                'Must specify age for each telemetry.')
+
+        now = timezone.now()
+        result_proto = interop_api_pb2.TelemetryBatchResult()
+        telemetry = []
+        for telemetry_proto, age_sec in zip(batch_proto.telemetry,
+                                            batch_proto.telemetry_age_sec):
+            try:
+                validate_telemetry_proto(telemetry_proto)
+                if age_sec < 0 or age_sec > TELEMETRY_BATCH_AGE_MAX_SEC:
+                    raise ValueError('Age out of range [0, %d]: %f' %
+                                     (TELEMETRY_BATCH_AGE_MAX_SEC, age_sec))
+            except ValueError as e:
+                result_proto.accepted.append(False)
+                result_proto.errors.append(str(e))
+                continue
+
+            timestamp = now - datetime.timedelta(seconds=age_sec)
+            telemetry.append(
+                telemetry_from_proto(request.user, telemetry_proto, timestamp))
+            result_proto.accepted.append(True)
+            result_proto.errors.append('')
 
         # Store telemetry.
-        telemetry = UasTelemetry(user=request.user,
-                                 latitude=telemetry_proto.latitude,
-                                 longitude=telemetry_proto.longitude,
-                                 altitude_msl=telemetry_proto.altitude,
-                                 uas_heading=telemetry_proto.heading)
-        telemetry.save()
+        store_telemetry(telemetry)
 
-        return HttpResponse('UAS Telemetry Successfully Posted.')
+        return proto_response(request, result_proto)
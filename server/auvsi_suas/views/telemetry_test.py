@@ -1,14 +1,18 @@
 """Tests for the telemetry module."""
 
+import json
 import time
 from auvsi_suas.models.uas_telemetry import UasTelemetry
 from auvsi_suas.proto.interop_api_pb2 import Telemetry
+from auvsi_suas.proto.interop_api_pb2 import TelemetryBatch
+from auvsi_suas.proto.interop_api_pb2 import TelemetryBatchResult
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
 from google.protobuf import json_format
 
 telemetry_url = reverse('auvsi_suas:telemetry')
+telemetry_batch_url = reverse('auvsi_suas:telemetry_batch')
 
 
 class TestTelemetryViewLoggedOut(TestCase):
@@ -17,6 +21,9 @@ class TestTelemetryViewLoggedOut(TestCase):
         response = self.client.post(telemetry_url)
         self.assertEqual(403, response.status_code)
 
+        response = self.client.post(telemetry_batch_url)
+        self.assertEqual(403, response.status_code)
+
 
 class TestTelemetryPost(TestCase):
     """Tests the Telemetry view POST."""
@@ -87,6 +94,29 @@ class TestTelemetryPost(TestCase):
         self.assertEqual(obj.altitude_msl, 30)
         self.assertEqual(obj.uas_heading, 40)
 
+    def test_upload_binary(self):
+        """Tests upload of data in the binary protobuf format."""
+        proto = Telemetry()
+        proto.latitude = 10
+        proto.longitude = 20
+        proto.altitude = 30
+        proto.heading = 40
+        response = self.client.post(telemetry_url,
+                                    data=proto.SerializeToString(),
+                                    content_type='application/x-protobuf')
+        self.assertEqual(200, response.status_code, response.content)
+        obj = UasTelemetry.objects.get()
+        self.assertEqual(obj.latitude, 10)
+        self.assertEqual(obj.longitude, 20)
+        self.assertEqual(obj.altitude_msl, 30)
+        self.assertEqual(obj.uas_heading, 40)
+
+        # Binary which isn't a telemetry proto is rejected.
+        response = self.client.post(telemetry_url,
+                                    data=b'\xff\xff',
+                                    content_type='application/x-protobuf')
+        self.assertEqual(400, response.status_code)
+
     def test_loadtest(self):
         """Tests the max load the view can handle."""
         total_ops = 100
@@ -97,3 +127,142 @@ class TestTelemetryPost(TestCase):
         end_t = time.perf_counter()
         op_rate = total_ops / (end_t - start_t)
         self.assertGreaterEqual(op_rate, 20)
+
+
+class TestTelemetryBatchPost(TestCase):
+    """Tests the TelemetryBatch view POST."""
+    def setUp(self):
+        """Sets up the client, server info URL, and user."""
+        self.user = User.objects.create_user('testuser', 'testemail@x.com',
+                                             'testpass')
+        self.user.save()
+        self.client.force_login(self.user)
+
+    def batch_request(self, entries):
+        """Posts a batch of (lat, lon, alt, head, age) entries."""
+        proto = TelemetryBatch()
+        for (lat, lon, alt, head, age) in entries:
+            telem = proto.telemetry.add()
+            telem.latitude = lat
+            telem.longitude = lon
+            telem.altitude = alt
+            telem.heading = head
+            proto.telemetry_age_sec.append(age)
+
+        return self.client.post(telemetry_batch_url,
+                                data=json_format.MessageToJson(proto),
+                                content_type='application/json')
+
+    def parse_result(self, response):
+        result = TelemetryBatchResult()
+        json_format.Parse(response.content, result)
+        return result
+
+    def test_invalid_request(self):
+        """Tests an invalid request."""
+        response = self.client.post(telemetry_batch_url,
+                                    data='{"telemetry": 1}',
+                                    content_type='application/json')
+        self.assertEqual(400, response.status_code)
+
+        # Missing ages.
+        response = self.client.post(telemetry_batch_url,
+                                    data=json.dumps({
+                                        'telemetry': [{
+                                            'latitude': 10,
+                                            'longitude': 20,
+                                            'altitude': 30,
+                                            'heading': 40,
+                                        }],
+                                    }),
+                                    content_type='application/json')
+        self.assertEqual(400, response.status_code)
+
+        # Too large.
+        response = self.batch_request([(10, 20, 30, 40, 0)] * 101)
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(0, UasTelemetry.objects.count())
+
+    def test_upload_and_store(self):
+        """Tests correct upload and storage of a batch."""
+        response = self.batch_request([
+            (10, 20, 30, 40, 0.2),
+            (11, 21, 31, 41, 0.1),
+            (12, 22, 32, 42, 0.0),
+        ])
+        self.assertEqual(200, response.status_code, response.content)
+        result = self.parse_result(response)
+        self.assertEqual([True, True, True], list(result.accepted))
+        self.assertEqual(['', '', ''], list(result.errors))
+
+        logs = UasTelemetry.by_user(self.user)
+        self.assertEqual(3, len(logs))
+        for ix, log in enumerate(logs):
+            self.assertEqual(self.user, log.user)
+            self.assertEqual(10 + ix, log.latitude)
+            self.assertEqual(20 + ix, log.longitude)
+            self.assertEqual(30 + ix, log.altitude_msl)
+            self.assertEqual(40 + ix, log.uas_heading)
+        self.assertAlmostEqual(0.1, (logs[1].timestamp -
+                                     logs[0].timestamp).total_seconds())
+        self.assertAlmostEqual(0.1, (logs[2].timestamp -
+                                     logs[1].timestamp).total_seconds())
+
+    def test_partial_accept(self):
+        """Tests that invalid telemetry doesn't reject the batch."""
+        response = self.batch_request([
+            (10, 20, 30, 40, 0.3),
+            (100, 20, 30, 40, 0.2),
+            (10, 20, 30, 370, 0.1),
+            (10, 20, 30, 40, 20),
+            (11, 21, 31, 41, 0.0),
+        ])
+        self.assertEqual(200, response.status_code, response.content)
+        result = self.parse_result(response)
+        self.assertEqual([True, False, False, False, True],
+                         list(result.accepted))
+        self.assertEqual('', result.errors[0])
+        self.assertIn('Latitude', result.errors[1])
+        self.assertIn('Heading', result.errors[2])
+        self.assertIn('Age', result.errors[3])
+        self.assertEqual('', result.errors[4])
+
+        logs = UasTelemetry.by_user(self.user)
+        self.assertEqual(2, len(logs))
+        self.assertEqual(10, logs[0].latitude)
+        self.assertEqual(11, logs[1].latitude)
+
+    def test_upload_binary(self):
+        """Tests a batch in the binary protobuf format."""
+        proto = TelemetryBatch()
+        for head in [40, 370]:
+            telem = proto.telemetry.add()
+            telem.latitude = 10
+            telem.longitude = 20
+            telem.altitude = 30
+            telem.heading = head
+            proto.telemetry_age_sec.append(0)
+
+        response = self.client.post(telemetry_batch_url,
+                                    data=proto.SerializeToString(),
+                                    content_type='application/x-protobuf',
+                                    HTTP_ACCEPT='application/x-protobuf')
+        self.assertEqual(200, response.status_code, response.content)
+        self.assertEqual('application/x-protobuf', response['Content-Type'])
+        result = TelemetryBatchResult()
+        result.ParseFromString(response.content)
+        self.assertEqual([True, False], list(result.accepted))
+        self.assertEqual(1, UasTelemetry.objects.count())
+
+    def test_loadtest(self):
+        """Tests the max load the view can handle."""
+        total_ops = 100
+        batch_size = 10
+        start_t = time.perf_counter()
+        for _ in range(total_ops):
+            response = self.batch_request([(10, 20, 30, 40, 0)] * batch_size)
+            self.assertEqual(200, response.status_code)
+        end_t = time.perf_counter()
+        telem_rate = total_ops * batch_size / (end_t - start_t)
+        self.assertGreaterEqual(telem_rate, 200)
+        self.assertEqual(total_ops * batch_size, UasTelemetry.objects.count())
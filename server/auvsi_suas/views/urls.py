@@ -1,9 +1,15 @@
+from auvsi_suas.views.alerts import Alerts
+from auvsi_suas.views.alerts import AlertsStream
 from auvsi_suas.views.login import Login
 from auvsi_suas.views.index import Index
 from auvsi_suas.views.map import MapImage
 from auvsi_suas.views.missions import Evaluate
+from auvsi_suas.views.missions import EvaluationJobs
+from auvsi_suas.views.missions import EvaluationJobsId
+from auvsi_suas.views.missions import EvaluationJobsIdResult
 from auvsi_suas.views.missions import ExportKml
 from auvsi_suas.views.missions import LiveKml
+from auvsi_suas.views.missions import LiveEvaluations
 from auvsi_suas.views.missions import LiveKmlUpdate
 from auvsi_suas.views.missions import MissionDetails
 from auvsi_suas.views.missions import Missions
@@ -14,7 +20,9 @@ from auvsi_suas.views.odlcs import OdlcsId
 from auvsi_suas.views.odlcs import OdlcsIdImage
 from auvsi_suas.views.teams import Teams
 from auvsi_suas.views.teams import Team
+from auvsi_suas.views.teams import TeamsStream
 from auvsi_suas.views.telemetry import Telemetry
+from auvsi_suas.views.telemetry import TelemetryBatch
 from auvsi_suas.views.utils import BulkCreateTeams
 from auvsi_suas.views.utils import GpsConversion
 from django.urls import path
@@ -26,10 +34,15 @@ app_name = 'auvsi_suas'
 # yapf: disable
 urlpatterns = [
     path('', Index.as_view(), name='index'),
+    path('api/alerts', Alerts.as_view(), name='alerts'),
     path('api/login', Login.as_view(), name='login'),
     path('api/missions', Missions.as_view(), name='missions'),
     path('api/missions/<int:pk>', MissionsId.as_view(), name='missions_id'),
     path('api/missions/<int:pk>/evaluate.zip', Evaluate.as_view(), name='evaluate'),
+    path('api/missions/<int:pk>/evaluations', EvaluationJobs.as_view(), name='evaluation_jobs'),
+    path('api/missions/<int:pk>/evaluations/<uuid:job_id>', EvaluationJobsId.as_view(), name='evaluation_jobs_id'),
+    path('api/missions/<int:pk>/evaluations/<uuid:job_id>/evaluate.zip', EvaluationJobsIdResult.as_view(), name='evaluation_jobs_id_result'),
+    path('api/missions/<int:pk>/live_evaluations', LiveEvaluations.as_view(), name='live_evaluations'),
     path('api/missions/<int:pk>/mission.html', MissionDetails.as_view(), name='details'),
     path('api/missions/export.kml', ExportKml.as_view(), name='export_kml'),
     path('api/missions/live.kml', LiveKml.as_view(), name='live_kml'),
@@ -42,7 +55,10 @@ urlpatterns = [
     path('api/maps/<int:mission_pk>/<str:username>', MapImage.as_view(), name='map'),
     path('api/teams', Teams.as_view(), name='teams'),
     path('api/teams/<str:username>', Team.as_view(), name='team'),
+    path('api/stream/alerts', AlertsStream.as_view(), name='alerts_stream'),
+    path('api/stream/teams', TeamsStream.as_view(), name='teams_stream'),
     path('api/telemetry', Telemetry.as_view(), name='telemetry'),
+    path('api/telemetry/batch', TelemetryBatch.as_view(), name='telemetry_batch'),
     path('api/utils/gps_conversion', GpsConversion.as_view(), name='gps_conversion'),
     path('api/utils/bulk_create_teams', BulkCreateTeams.as_view(), name='bulk_create_teams'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
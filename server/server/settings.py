@@ -29,7 +29,7 @@ INTERNAL_IPS = ['127.0.0.1']
 
 # Application definition
 INSTALLED_APPS = (
-    'auvsi_suas',
+    'auvsi_suas.apps.AuvsiSuasConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -96,7 +96,26 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'TIMEOUT': 10,
         'KEY_PREFIX': 'suas',
-    }
+    },
+    # Cache shared by all server processes. Memcached increments and adds
+    # atomically, and writes don't scan or cull the existing entries.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': 'interop-cache:11211',
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'suas',
+    },
+    # Cache of team evaluations, which are costly to recompute. Stored in the
+    # database, so it persists across restarts and isn't filled by telemetry.
+    'evaluations': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'auvsi_suas_evaluation_cache',
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'suas',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
 
 # Logging
@@ -218,6 +237,25 @@ SENDFILE_URL = MEDIA_URL
 # Login URL
 LOGIN_URL = '/admin/login/?next=/'
 
+# Telemetry write-behind buffer. If enabled, uploaded telemetry is queued in
+# each process and inserted by a background thread in batches, rather than
+# being inserted before the upload request returns. Requires threads to be
+# enabled in uwsgi.
+TELEMETRY_WRITE_BEHIND = False
+
+# Waypoint evaluation mode. If enabled, waypoints are scored by the closest
+# approach of each straight segment of flight between telemetry, rather than
+# by sampling the interpolated telemetry.
+WAYPOINT_CLOSEST_APPROACH = False
+
+# Number of processes used to evaluate teams. Each team's inputs are loaded
+# serially, then teams are evaluated concurrently if more than 1.
+MISSION_EVALUATION_WORKERS = 1
+
+# Number of evaluation jobs each process runs at once in background threads.
+# If 0, jobs are run within the request which submits them.
+EVALUATION_JOB_WORKERS = 1
+
 # Migrations
 MIGRATION_MODULES = {
     'auvsi_suas.models': 'auvsi_suas.models.migrations',